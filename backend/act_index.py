@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+
+import numpy as np  # type: ignore
+
+from citation_index import act_aliases, find_acts
+
+# The acts in the knowledge base, so search_documents can search only the chunks of the act a
+# question is about. Built at ingestion from the "act" metadata of every chunk:
+#   acts.json      act key -> official name and chunk count, and every alias naming an act
+#   centroids.npy  float32[acts, dim], the normalized mean vector of each act's chunks
+# A question that names an act ("under the Hindu Marriage Act", "IPC") is routed by keyword; one
+# that does not can be routed by comparing its query vector with the centroids. Aliases that are
+# also ordinary words ("it") only route as a title ("IT Act") or next to a section word.
+
+
+class ActIndex:
+    """The acts' names, aliases and centroids, and the routing of questions to acts."""
+
+    def __init__(self, acts, aliases, centroids=None):
+        self.acts = acts  # act key -> {"name", "chunks"}
+        self.keys = list(acts)
+        self.aliases = {alias: key for alias, key in aliases.items() if key in acts}
+        self.centroids = centroids
+
+    @classmethod
+    def build(cls, chunks):
+        """chunks: iterable of (metadata, vector or None) with "act" and "law" metadata."""
+        acts, sums = {}, {}
+        for metadata, vector in chunks:
+            act = (metadata or {}).get("act")
+            if not act:
+                continue
+            entry = acts.setdefault(act, {"name": metadata.get("law") or act, "chunks": 0})
+            entry["chunks"] += 1
+            if vector is not None:
+                vector = np.asarray(vector, dtype=np.float32)
+                sums[act] = sums[act] + vector if act in sums else vector.copy()
+        centroids = None
+        if sums and len(sums) == len(acts):
+            matrix = np.stack([sums[act] for act in acts])
+            centroids = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return cls(acts, act_aliases(entry["name"] for entry in acts.values()), centroids)
+
+    def save(self, index_dir):
+        tmp_dir = index_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        with open(os.path.join(tmp_dir, "acts.json"), "w", encoding="utf-8") as f:
+            json.dump({"acts": self.acts, "aliases": self.aliases}, f)
+        if self.centroids is not None:
+            np.save(os.path.join(tmp_dir, "centroids.npy"), self.centroids)
+        shutil.rmtree(index_dir, ignore_errors=True)
+        os.replace(tmp_dir, index_dir)
+
+    @classmethod
+    def load(cls, index_dir):
+        with open(os.path.join(index_dir, "acts.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        path = os.path.join(index_dir, "centroids.npy")
+        return cls(data["acts"], data["aliases"], np.load(path) if os.path.exists(path) else None)
+
+    def resolve(self, names):
+        """
+        Act keys for names in any spelling ("IPC", "The Indian Penal Code, 1860"); unknown names are
+        dropped.
+        """
+        keys = []
+        for name in names:
+            for key in self._named(name, explicit=True):
+                if key not in keys:
+                    keys.append(key)
+        return keys
+
+    def mentioned(self, query):
+        """Act keys of the acts the text names, in order of appearance."""
+        return self._named(query, explicit=False)
+
+    def _named(self, text, explicit):
+        """Act keys named in text, in order of appearance (see citation_index.find_acts)."""
+        return list(dict.fromkeys(act for act, _ in find_acts(text, self.aliases, explicit)))
+
+    def nearest(self, vector, max_acts=2, margin=0.05, min_score=0.3):
+        """
+        The acts whose centroid is closest to vector: the best one and any within margin of it, at
+        most max_acts. [] when there are no centroids or even the best is below min_score, i.e. the
+        question does not clearly belong to any act.
+        """
+        if self.centroids is None:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        scores = self.centroids @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        order = np.argsort(-scores)[:max_acts]
+        best = scores[order[0]]
+        if best < min_score:
+            return []
+        return [self.keys[i] for i in order if scores[i] >= best - margin]
@@ -0,0 +1,219 @@
+import asyncio
+import contextvars
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from metrics import ADMISSION_REJECTED
+
+# Admission control for /ask: at most max_active requests are answered at once and at most
+# MAX_QUEUED_REQUESTS more wait for a slot; anything beyond that is turned away at once with a
+# 429 and a Retry-After estimated from recent service times, instead of queueing behind Ollama.
+# Every request also gets a deadline (REQUEST_TIMEOUT, or less with an X-Request-Timeout header)
+# that bounds its wait here, in the embedding batcher and in the LLM call; once it has passed the
+# upstream generation is dropped and the client gets a 504.
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", "16"))
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "90"))
+DEADLINE_HEADER = "X-Request-Timeout"
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class Rejected(Exception):
+    """
+    Not admitted: status is 429 (queue full) or 503 (no slot freed up in time); retry_after is in
+    seconds.
+    """
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's deadline passed before it was answered."""
+
+
+def parse_timeout(value):
+    """Seconds from an X-Request-Timeout header value, or None if it is missing or invalid."""
+    try:
+        timeout = float(value)
+    except (TypeError, ValueError):
+        return None
+    return timeout if timeout > 0 else None
+
+
+def set_deadline(timeout=None):
+    """Starts the current request's deadline, timeout seconds from now (at most REQUEST_TIMEOUT)."""
+    if REQUEST_TIMEOUT > 0:
+        timeout = REQUEST_TIMEOUT if timeout is None else min(timeout, REQUEST_TIMEOUT)
+    deadline = time.monotonic() + timeout if timeout else None
+    _deadline.set(deadline)
+    return deadline
+
+
+def use_deadline(deadline):
+    """Makes deadline the current one (e.g. in a response generator run after the view returned)."""
+    _deadline.set(deadline)
+
+
+def remaining():
+    """
+    Seconds left before the current request's deadline (None if it has none); raises
+    DeadlineExceeded if it has passed.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+    return left
+
+
+def bounded(timeout):
+    """timeout, cut to what is left of the current request's deadline."""
+    left = remaining()
+    return timeout if left is None else min(timeout, left)
+
+
+def expired():
+    deadline = _deadline.get()
+    return deadline is not None and time.monotonic() >= deadline
+
+
+class AdmissionController:
+    """
+    A concurrency limit with a bounded wait queue, usable from threads (enter/leave, admit) and
+    from the event loop (enter_async, admit_async).
+    """
+
+    def __init__(self, max_active, max_queued=MAX_QUEUED_REQUESTS):
+        self.max_active = max(max_active, 1)
+        self.max_queued = max_queued
+        self._condition = threading.Condition()
+        self._async_waiters = []  # (loop, future)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._service_time = None  # moving average of the seconds a request holds its slot
+
+    def retry_after(self):
+        """Seconds until a new request would probably get a slot."""
+        service_time = self._service_time or 1.0
+        return max(1, math.ceil((self.waiting + 1) * service_time / self.max_active))
+
+    def _reject(self, reason, status):
+        self.rejected += 1
+        ADMISSION_REJECTED.inc(reason=reason)
+        return Rejected(f"too many requests ({reason})", status, self.retry_after())
+
+    def _queue_or_reject(self):
+        """Called with the lock held and no free slot: joins the queue, unless it is full."""
+        if self.waiting >= self.max_queued:
+            raise self._reject("queue_full", 429)
+        self.waiting += 1
+
+    def _wait_time(self):
+        """The wait the deadline allows; a request whose deadline passes in the queue gets a 503."""
+        try:
+            return remaining()
+        except DeadlineExceeded:
+            self.timed_out += 1
+            raise self._reject("queue_timeout", 503) from None
+
+    def _admit(self):
+        self.active += 1
+        self.admitted += 1
+        return time.monotonic()
+
+    def enter(self):
+        """Blocks until the request has a slot; returns a ticket for leave(). Raises Rejected."""
+        with self._condition:
+            if self.active >= self.max_active:
+                self._queue_or_reject()
+                try:
+                    while self.active >= self.max_active:
+                        self._condition.wait(self._wait_time())
+                finally:
+                    self.waiting -= 1
+            return self._admit()
+
+    async def enter_async(self):
+        """enter() for the event loop."""
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            if self.active < self.max_active:
+                return self._admit()
+            self._queue_or_reject()
+        try:
+            while True:
+                with self._condition:
+                    if self.active < self.max_active:
+                        return self._admit()
+                    timeout = self._wait_time()
+                    waiter = (loop, loop.create_future())
+                    self._async_waiters.append(waiter)
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter[1]), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    with self._condition:
+                        if waiter in self._async_waiters:
+                            self._async_waiters.remove(waiter)
+        finally:
+            with self._condition:
+                self.waiting -= 1
+
+    def leave(self, ticket):
+        """Frees the slot taken by enter() (ticket is what it returned)."""
+        service_time = time.monotonic() - ticket
+        with self._condition:
+            self.active -= 1
+            self._service_time = service_time if self._service_time is None else (
+                0.9 * self._service_time + 0.1 * service_time
+            )
+            self._condition.notify()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    @contextmanager
+    def admit(self):
+        ticket = self.enter()
+        try:
+            yield
+        finally:
+            self.leave(ticket)
+
+    @asynccontextmanager
+    async def admit_async(self):
+        ticket = await self.enter_async()
+        try:
+            yield
+        finally:
+            self.leave(ticket)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "active": self.active,
+                "waiting": self.waiting,
+                "max_active": self.max_active,
+                "max_queued": self.max_queued,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out_in_queue": self.timed_out,
+                "avg_service_s": round(self._service_time or 0.0, 3),
+            }
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,121 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Cache of LLM answers for history-free queries, keyed on the normalized query plus a fingerprint
+# of the chunks retrieved for it. Entries expire after a TTL, the least recently used entries are
+# evicted beyond a size / memory cap, and everything is dropped when the vector index is rebuilt.
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))  # 0 disables the cache
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # seconds
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+def normalize_query(query):
+    """Lowercases, collapses whitespace and strips trailing punctuation: trivial variants match."""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?.! ")
+
+
+def chunk_fingerprint(chunks):
+    """Hashes the content IDs of the retrieved chunks, in rank order."""
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(hashlib.sha256(chunk.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+def make_key(query, chunks):
+    return normalize_query(query) + "|" + chunk_fingerprint(chunks)
+
+
+class AnswerCache:
+    """Thread-safe LRU + TTL cache with an approximate memory cap and hit/miss counters."""
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL,
+                 max_bytes=ANSWER_CACHE_MAX_BYTES, version_fn=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # Called on every lookup; when its value changes (index rebuilt) the cache is cleared
+        self.version_fn = version_fn
+        self._version = version_fn() if version_fn else None
+        self._entries = OrderedDict()  # key -> (expires_at, size, answer)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _check_version(self):
+        if self.version_fn is None:
+            return
+        version = self.version_fn()
+        if version != self._version:
+            self._version = version
+            self._entries.clear()
+            self._bytes = 0
+            self.invalidations += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, _, answer = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return answer
+
+    def put(self, key, answer):
+        if not self.enabled:
+            return
+        size = len(key) + len(answer.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._check_version()
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, answer)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -1,17 +1,21 @@
 import logging
-from flask import Flask, request, jsonify
+import time
+from contextlib import ExitStack
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from chatbot import ask_llm_with_context  # Updated import
+from chatbot import (  # Updated import
+    ask_llm_with_context, stream_llm_with_context, search_documents_shared, answer_cache,
+    conversations, conversation_turn, coalescing_stats, compressor, readiness, start_warm_up,
+    admission, admin_authorized, switch_index, LOG_LEVEL, LOG_PROMPTS
+)
+from admission import DEADLINE_HEADER, Rejected, parse_timeout, set_deadline, use_deadline
+from llm_pool import EndpointUnavailable, UpstreamError
+import metrics
+import json
 import os
 
-isProd = os.getenv("ISPROD", "False").lower() == "true"
-if isProd:
-    from vector_database import search_documents
-else:
-    from dataset.vector_database import search_documents
-
 # Configure Logging
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -41,36 +45,192 @@ CORS(app, resources={
 
 
 
+@app.before_request
+def start_timing():
+    g.started = time.perf_counter()
+    g.timings = metrics.start_request()
+    # Worker threads are reused: drop the deadline a previous request on this thread set
+    use_deadline(None)
+
+def _endpoint():
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+@app.after_request
+def add_server_timing(response):
+    # Streamed responses send their headers before any work is done; they report in the last line
+    if response.is_streamed or "started" not in g:
+        return response
+    elapsed = time.perf_counter() - g.started
+    metrics.REQUEST_SECONDS.observe(elapsed, endpoint=_endpoint())
+    response.headers["Server-Timing"] = metrics.server_timing(dict(g.timings, total=elapsed))
+    return response
+
+def _busy(status, retry_after, error="Server is busy, please retry later."):
+    # 429 / 502 / 503 with Retry-After, so clients and load balancers back off
+    response = jsonify({"error": error})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, status
+
+UPSTREAM_ERROR = "The language model failed to answer, please retry later."
+
+def _timed_out():
+    return jsonify({"error": "Request timed out."}), 504
+
 @app.route('/ask', methods=['POST'])
 def ask_question():
     data = request.get_json()
-    logger.debug(f"Received data: {data}")
+    if LOG_PROMPTS:
+        logger.debug(f"Received data: {data}")
     
     # Extract data from request
     query = data["query"]
-    conversation_id = data.get("conversationId", "default")  # Get conversation ID
+    conversation_id = data.get("conversationId")  # Get conversation ID (None: no history)
     is_new_conversation = data.get("isNewConversation", False)  # Check if new conversation
     
     logger.debug(f"Processing query: '{query}' for conversation: {conversation_id} (new: {is_new_conversation})")
 
+    # The deadline bounds the wait for a slot, the embedding and the LLM call
+    deadline = set_deadline(parse_timeout(request.headers.get(DEADLINE_HEADER)))
+    turn = ExitStack()
+    try:
+        # The conversation's turn first, so that a turn waiting for the previous one holds no slot
+        turn.enter_context(conversation_turn(conversation_id))
+        ticket = admission.enter()
+    except TimeoutError as e:
+        turn.close()
+        logger.warning(f"Request timed out waiting for its conversation: {e}")
+        return _timed_out()
+    except Rejected as e:
+        turn.close()
+        logger.warning(f"Request rejected: {e}")
+        return _busy(e.status, e.retry_after)
+
+    def finish():
+        admission.leave(ticket)
+        turn.close()
+
+    # Stream tokens as newline-delimited JSON when the client asks for it
+    if data.get("stream", False):
+        response = Response(
+            stream_with_context(_stream_answer(query, conversation_id, is_new_conversation,
+                                               g.started, g.timings, deadline)),
+            mimetype="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+        # The slot and the turn are held until the stream is done (or the client went away)
+        response.call_on_close(finish)
+        return response
+
     try:
         # Pass conversation context parameters to the chatbot function
         response = ask_llm_with_context(query, conversation_id, is_new_conversation)
-        logger.debug(f"LLM Response: {response}")
+        if LOG_PROMPTS:
+            logger.debug(f"LLM Response: {response}")
         data = {"response": response}
         return jsonify(data)
+    except TimeoutError as e:
+        logger.warning(f"Request timed out: {e}")
+        return _timed_out()
+    except EndpointUnavailable as e:
+        logger.warning(f"No LLM endpoint available: {e}")
+        return _busy(503, admission.retry_after())
+    except UpstreamError as e:
+        logger.error(f"LLM failed: {e}")
+        return _busy(502, admission.retry_after(), UPSTREAM_ERROR)
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}", exc_info=True)
-        return jsonify({"error": "Internal server error. Check logs for details."})
+        return jsonify({"error": "Internal server error. Check logs for details."}), 500
+    finally:
+        finish()
+
+def _stream_answer(query, conversation_id, is_new_conversation, started, timings, deadline):
+    """
+    Yields one NDJSON line per LLM token, followed by a final done (or error) line. The done line
+    carries the stage timings in milliseconds, as the Server-Timing header does for other responses;
+    an error line carries the status the request would have had without streaming.
+    """
+    use_deadline(deadline)
+    tokens = stream_llm_with_context(query, conversation_id, is_new_conversation)
+    try:
+        for token in tokens:
+            yield json.dumps({"token": token}) + "\n"
+        elapsed = time.perf_counter() - started
+        metrics.REQUEST_SECONDS.observe(elapsed, endpoint="/ask (stream)")
+        timings = {stage: round(seconds * 1000, 1)
+                   for stage, seconds in dict(timings, total=elapsed).items()}
+        yield json.dumps({"done": True, "timings": timings}) + "\n"
+    except GeneratorExit:
+        logger.debug(f"Client disconnected from stream for conversation: {conversation_id}")
+        raise
+    except TimeoutError as e:
+        logger.warning(f"Stream timed out: {e}")
+        yield json.dumps({"error": "Request timed out.", "status": 504}) + "\n"
+    except EndpointUnavailable as e:
+        logger.warning(f"No LLM endpoint available: {e}")
+        yield json.dumps({"error": "Server is busy, please retry later.", "status": 503}) + "\n"
+    except UpstreamError as e:
+        logger.error(f"LLM failed: {e}")
+        yield json.dumps({"error": UPSTREAM_ERROR, "status": 502}) + "\n"
+    except Exception as e:
+        logger.error(f"Error streaming response: {str(e)}", exc_info=True)
+        yield json.dumps({"error": "Internal server error. Check logs for details.",
+                          "status": 500}) + "\n"
+    finally:
+        # Closing the inner generator drops the upstream generation if the client went away
+        tokens.close()
 
 @app.route('/debug_search', methods=['POST'])
 def debug_search():
     data = request.get_json()
     query = data.get("query", "")
-    
-    retrieved_knowledge = search_documents(query)
+
+    set_deadline(parse_timeout(request.headers.get(DEADLINE_HEADER)))
+    try:
+        retrieved_knowledge = search_documents_shared(query)
+    except TimeoutError as e:
+        logger.warning(f"Search timed out: {e}")
+        return _timed_out()
     return jsonify({"retrieved": retrieved_knowledge})
 
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        "answer_cache": answer_cache.stats(),
+        "conversations": conversations.stats(),
+        "coalescing": coalescing_stats(),
+        "context_compression": compressor.stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    # Stage latency histograms and LLM token counters, in the Prometheus text format
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    # 503 until the embedding model, the vector store and the LLM have been loaded
+    is_ready, report = readiness()
+    return jsonify(report), (200 if is_ready else 503)
+
+@app.route('/admin/reload_index', methods=['POST'])
+def reload_index():
+    # Switches to the activated index snapshot, or to {"snapshot": name}, once it is warm.
+    # Hidden unless ADMIN_TOKEN is set and sent as a bearer token.
+    if not admin_authorized(request.headers.get("Authorization")):
+        return jsonify({"error": "Not found"}), 404
+    data = request.get_json(silent=True) or {}
+    try:
+        return jsonify(switch_index(data.get("snapshot")))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Index reload failed: {e}", exc_info=True)
+        return jsonify({"error": f"Reload failed, still serving the previous index: {e}"}), 500
+
 if __name__ == '__main__':
     print("hello")
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    debug = os.getenv("FLASK_DEBUG", "True").lower() == "true"
+    # With the reloader on, only the child process that actually serves requests warms up
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_warm_up()
+    app.run(host="0.0.0.0", port=5000, debug=debug)
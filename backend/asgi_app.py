@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import json
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from chatbot import (
+    ask_llm_with_context_async,
+    stream_llm_with_context_async,
+    search_documents_async,
+    close_async_client,
+    answer_cache,
+    conversations,
+    conversation_turn_async,
+    coalescing_stats,
+    compressor,
+    readiness,
+    start_warm_up,
+    admission,
+    admin_authorized,
+    switch_index,
+    LOG_LEVEL,
+    LOG_PROMPTS,
+)
+from admission import (
+    DEADLINE_HEADER, Rejected, parse_timeout, remaining, set_deadline, use_deadline
+)
+from llm_pool import EndpointUnavailable, UpstreamError
+import metrics
+
+# Async serving path: run with
+#   uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+# One process holds many in-flight LLM calls on the event loop instead of a thread each.
+
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+UPSTREAM_ERROR = "The language model failed to answer, please retry later."
+
+
+def _busy(status, retry_after, error="Server is busy, please retry later."):
+    # 429 / 502 / 503 with Retry-After, so clients and load balancers back off
+    return JSONResponse({"error": error}, status_code=status,
+                        headers={"Retry-After": str(retry_after)})
+
+
+class _AdmittedStream(StreamingResponse):
+    """A streamed answer that gives its admission slot and conversation turn back when it ends."""
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.release()
+
+
+async def ask_question(request):
+    data = await request.json()
+    if LOG_PROMPTS:
+        logger.debug(f"Received data: {data}")
+
+    query = data["query"]
+    conversation_id = data.get("conversationId")
+    is_new_conversation = data.get("isNewConversation", False)
+
+    logger.debug(f"Processing query: '{query}' for conversation: {conversation_id} "
+                 f"(new: {is_new_conversation})")
+
+    # The deadline bounds the wait for a slot, the embedding and the LLM call
+    deadline = set_deadline(parse_timeout(request.headers.get(DEADLINE_HEADER)))
+    turn = AsyncExitStack()
+    try:
+        # The conversation's turn first, so that a turn waiting for the previous one holds no slot
+        await turn.enter_async_context(conversation_turn_async(conversation_id))
+        ticket = await admission.enter_async()
+    except TimeoutError as e:
+        await turn.aclose()
+        logger.warning(f"Request timed out waiting for its conversation: {e}")
+        return JSONResponse({"error": "Request timed out."}, status_code=504)
+    except Rejected as e:
+        await turn.aclose()
+        logger.warning(f"Request rejected: {e}")
+        return _busy(e.status, e.retry_after)
+
+    async def finish():
+        admission.leave(ticket)
+        await turn.aclose()
+
+    if data.get("stream", False):
+        return _AdmittedStream(
+            _stream_answer(query, conversation_id, is_new_conversation, request.state.started,
+                           metrics.current_timings(), deadline),
+            release=finish,
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    try:
+        # At the deadline the LLM call is cancelled, which drops the generation in Ollama
+        response = await asyncio.wait_for(
+            ask_llm_with_context_async(query, conversation_id, is_new_conversation), remaining()
+        )
+        if LOG_PROMPTS:
+            logger.debug(f"LLM Response: {response}")
+        return JSONResponse({"response": response})
+    except (TimeoutError, asyncio.TimeoutError) as e:  # the same class only from Python 3.11
+        logger.warning(f"Request timed out: {e}")
+        return JSONResponse({"error": "Request timed out."}, status_code=504)
+    except EndpointUnavailable as e:
+        logger.warning(f"No LLM endpoint available: {e}")
+        return _busy(503, admission.retry_after())
+    except UpstreamError as e:
+        logger.error(f"LLM failed: {e}")
+        return _busy(502, admission.retry_after(), UPSTREAM_ERROR)
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        return JSONResponse({"error": "Internal server error. Check logs for details."},
+                            status_code=500)
+    finally:
+        await finish()
+
+
+async def _stream_answer(query, conversation_id, is_new_conversation, started, timings, deadline):
+    """
+    Yields one NDJSON line per LLM token, followed by a final done (with the stage timings) or error
+    line; an error line carries the status the request would have had without streaming.
+    """
+    use_deadline(deadline)
+    # On client disconnect Starlette cancels this generator, which closes the upstream stream
+    tokens = stream_llm_with_context_async(query, conversation_id, is_new_conversation)
+    try:
+        while True:
+            # Past the deadline the pending read is cancelled, which drops the generation in Ollama
+            try:
+                token = await asyncio.wait_for(tokens.__anext__(), remaining())
+            except StopAsyncIteration:
+                break
+            yield json.dumps({"token": token}) + "\n"
+        timings = dict(timings, total=time.perf_counter() - started)
+        timings = {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()}
+        yield json.dumps({"done": True, "timings": timings}) + "\n"
+    except (TimeoutError, asyncio.TimeoutError) as e:
+        logger.warning(f"Stream timed out: {e}")
+        yield json.dumps({"error": "Request timed out.", "status": 504}) + "\n"
+    except EndpointUnavailable as e:
+        logger.warning(f"No LLM endpoint available: {e}")
+        yield json.dumps({"error": "Server is busy, please retry later.", "status": 503}) + "\n"
+    except UpstreamError as e:
+        logger.error(f"LLM failed: {e}")
+        yield json.dumps({"error": UPSTREAM_ERROR, "status": 502}) + "\n"
+    except Exception as e:
+        logger.error(f"Error streaming response: {str(e)}", exc_info=True)
+        yield json.dumps({"error": "Internal server error. Check logs for details.",
+                          "status": 500}) + "\n"
+    finally:
+        await tokens.aclose()
+
+
+async def debug_search(request):
+    data = await request.json()
+    query = data.get("query", "")
+
+    set_deadline(parse_timeout(request.headers.get(DEADLINE_HEADER)))
+    try:
+        retrieved_knowledge = await search_documents_async(query)
+    except TimeoutError as e:
+        logger.warning(f"Search timed out: {e}")
+        return JSONResponse({"error": "Request timed out."}, status_code=504)
+    return JSONResponse({"retrieved": retrieved_knowledge})
+
+
+async def cache_stats(request):
+    return JSONResponse({
+        "answer_cache": answer_cache.stats(),
+        "conversations": conversations.stats(),
+        "coalescing": coalescing_stats(),
+        "context_compression": compressor.stats(),
+    })
+
+
+async def prometheus_metrics(request):
+    # Stage latency histograms and LLM token counters, in the Prometheus text format
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+async def ready(request):
+    # 503 until the embedding model, the vector store and the LLM have been loaded
+    is_ready, report = readiness()
+    return JSONResponse(report, status_code=200 if is_ready else 503)
+
+
+async def reload_index(request):
+    # Switches to the activated index snapshot, or to {"snapshot": name}, once it is warm.
+    # Hidden unless ADMIN_TOKEN is set and sent as a bearer token.
+    if not admin_authorized(request.headers.get("authorization")):
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    try:
+        # Opening and warming the new index blocks, so it runs off the event loop
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, switch_index, (data or {}).get("snapshot"))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"Index reload failed: {e}", exc_info=True)
+        return JSONResponse({"error": f"Reload failed, still serving the previous index: {e}"},
+                            status_code=500)
+    return JSONResponse(result)
+
+
+class TimingMiddleware:
+    """
+    Collects each request's stage timings, sends them in a Server-Timing header and records the
+    request duration. Streamed responses (no Content-Length) have sent their headers before any
+    work is done, so their timings go in the last NDJSON line instead.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        scope.setdefault("state", {})["started"] = started
+        timings = metrics.start_request()
+        endpoint = scope["path"] if scope["path"] in ROUTE_PATHS else "unmatched"
+
+        async def send_with_timing(message):
+            nonlocal endpoint
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if "content-length" in headers:
+                    timing = dict(timings, total=time.perf_counter() - started)
+                    headers.append("Server-Timing", metrics.server_timing(timing))
+                else:
+                    endpoint += " (stream)"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Warm up in the background so the server can answer /ready (with 503) meanwhile
+    start_warm_up()
+    yield
+    await close_async_client()
+
+
+ROUTE_PATHS = {"/ask", "/debug_search", "/cache_stats", "/metrics", "/ready", "/admin/reload_index"}
+
+app = Starlette(
+    routes=[
+        Route("/ask", ask_question, methods=["POST"]),
+        Route("/debug_search", debug_search, methods=["POST"]),
+        Route("/cache_stats", cache_stats, methods=["GET"]),
+        Route("/metrics", prometheus_metrics, methods=["GET"]),
+        Route("/ready", ready, methods=["GET"]),
+        Route("/admin/reload_index", reload_index, methods=["POST"]),
+    ],
+    middleware=[
+        Middleware(TimingMiddleware),
+        Middleware(
+            CORSMiddleware,
+            allow_origins=["http://localhost:5173", "https://legal-ai-advisor-mu.vercel.app"],
+            allow_origin_regex=r"https://.*\.ngrok-free\.app",
+            allow_methods=["*"],
+            allow_headers=["*"],
+        )
+    ],
+    lifespan=lifespan,
+)
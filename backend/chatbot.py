@@ -1,114 +1,721 @@
+import time
+_import_started = time.perf_counter()
+
 from flask import jsonify
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
 import logging
 import requests
+from requests.adapters import HTTPAdapter
+import httpx
 import os
 import sys
 import json
+import threading
+import atexit
+import hmac
+from contextlib import asynccontextmanager, contextmanager
 
 prod_ollama_url = "http://host.docker.internal:11434"
 local_host_url = "http://localhost:11434"
-url = "/api/generate"
+# "chat" sends each turn as messages to /api/chat so Ollama can reuse the cached prefix of the
+# conversation; "generate" sends one self-contained prompt per turn to /api/generate
+OLLAMA_API = os.getenv("OLLAMA_API", "chat")
 
 isProd = os.getenv("ISPROD", "False").lower() == "true"
-# ollamaURL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+# Base URL of the Ollama server (the benchmarks point it at benchmarks/fake_ollama.py)
+OLLAMA_URL = os.getenv("OLLAMA_URL", prod_ollama_url if isProd else local_host_url)
+# Several Ollama servers with the same model, comma-separated; requests are spread over them
+# (see llm_pool.py)
+OLLAMA_URLS = [u.strip() for u in os.getenv("OLLAMA_URLS", OLLAMA_URL).split(",") if u.strip()]
+API_PATH = "/api/chat" if OLLAMA_API == "chat" else "/api/generate"
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 if isProd:
-    from vector_database import search_documents
-    url = prod_ollama_url + url
+    from vector_database import (
+        search_documents, index_version, warm_up as warm_up_retrieval, preload as preload_retrieval,
+        component_status, startup_timings, set_timing_hook, set_deadline_hook, embed_query,
+        embed_texts, is_citation_query, reload_index, activate_snapshot, index_status
+    )
 else:
-    from dataset.vector_database import search_documents
-    url = local_host_url + url
+    from dataset.vector_database import (
+        search_documents, index_version, warm_up as warm_up_retrieval, preload as preload_retrieval,
+        component_status, startup_timings, set_timing_hook, set_deadline_hook, embed_query,
+        embed_texts, is_citation_query, reload_index, activate_snapshot, index_status
+    )
+
+from admission import AdmissionController, DeadlineExceeded, bounded, expired, remaining
+from answer_cache import AnswerCache, make_key, normalize_query
+from context_compressor import ContextCompressor
+from conversation_store import MAX_EXCHANGES, create_conversation_store
+from prompt_builder import (
+    build_chat_messages, build_prompt, build_turn_message, condense_query, count_tokens,
+    fold_into_summary
+)
+from glossary import load_glossary
+from llm_pool import LLM_QUEUE_TIMEOUT, LLMPool, UpstreamError
+from metrics import observe_ollama, observe_stage, span
+from single_flight import (
+    AsyncSingleFlight, AsyncStreamSingleFlight, SingleFlight, StreamSingleFlight
+)
 
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
+# DEBUG writes a line per request stage; production defaults to INFO
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO" if isProd else "DEBUG").upper()
+# Full prompts, questions and answers in the log: large, and user data, so off by default in
+# production
+LOG_PROMPTS = os.getenv("LOG_PROMPTS", "False" if isProd else "True").lower() == "true"
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-# Dictionary to store conversation histories
-conversation_contexts = {}
+# Embedding, vector search, lexical search and citation lookup times go to the stage histogram
+set_timing_hook(observe_stage)
+# A query embedding waits no longer than its request's deadline
+set_deadline_hook(remaining)
+
+# Upper bound on concurrent keep-alive connections to Ollama
+MAX_LLM_CONNECTIONS = int(os.getenv("MAX_LLM_CONNECTIONS", "200"))
+# Worker threads for the CPU-bound embedding + Chroma search on the async path
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "4"))
+LLM_TIMEOUT = 100
+LLM_MODEL = "llama3.2"
+# How long Ollama keeps the model loaded after a request (Ollama duration string, e.g. "30m", "-1")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Context window requested from Ollama (0 keeps the model's default); chat mode needs room for the
+# replayed turns
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "8192" if OLLAMA_API == "chat" else "0"))
+
+# Pooled keep-alive session for the sync (Flask) path, instead of a new TCP connection per request
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=len(OLLAMA_URLS),
+                                     pool_maxsize=MAX_LLM_CONNECTIONS))
+session.mount("https://", HTTPAdapter(pool_connections=len(OLLAMA_URLS),
+                                      pool_maxsize=MAX_LLM_CONNECTIONS))
+
+# Routes each generation to the least-loaded healthy Ollama server, failing over to another one
+llm_pool = LLMPool(OLLAMA_URLS)
+
+# /ask requests answered at once (default: what the Ollama servers take in parallel); more wait or
+# get a 429
+MAX_ACTIVE_REQUESTS = int(os.getenv("MAX_ACTIVE_REQUESTS", "0"))
+admission = AdmissionController(
+    MAX_ACTIVE_REQUESTS or sum(endpoint.limit for endpoint in llm_pool.endpoints)
+)
+
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+_async_client = None
+
+# Conversation histories, bounded and expiring (CONVERSATION_STORE=memory or sqlite)
+# In chat mode history is trimmed by half at a time, so its start (and Ollama's cached prefix)
+# rarely changes
+conversations = create_conversation_store(
+    summarize=fold_into_summary,
+    trim_to=max(MAX_EXCHANGES // 2, 1) if OLLAMA_API == "chat" else None
+)
+atexit.register(conversations.close)  # commits writes still queued by the SQLite store
+
+# Answers to history-free queries; cleared automatically when the vector index is rebuilt or swapped
+answer_cache = AnswerCache(version_fn=index_version)
+# Seconds between checks for a newly activated index snapshot (see reload_index); 0 turns it off
+INDEX_WATCH_INTERVAL = float(os.getenv("INDEX_WATCH_INTERVAL", "10"))
+# Bearer token of the /admin endpoints; they are disabled while it is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+_index_watch = None
+
+# Identical history-free requests in flight at the same time share one retrieval + generation
+answer_flights = SingleFlight()
+stream_flights = StreamSingleFlight()
+search_flights = SingleFlight()
+async_answer_flights = AsyncSingleFlight()
+async_stream_flights = AsyncStreamSingleFlight()
+async_search_flights = AsyncSingleFlight()
+
+def coalescing_stats():
+    return {
+        "answers": answer_flights.stats(),
+        "streams": stream_flights.stats(),
+        "searches": search_flights.stats(),
+        "async_answers": async_answer_flights.stats(),
+        "async_streams": async_stream_flights.stats(),
+        "async_searches": async_search_flights.stats(),
+    }
+
+# Optionally keep only the sentences of the retrieved chunks closest to the question
+# (see context_compressor.py)
+CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "False").lower() == "true"
+compressor = ContextCompressor(embed_texts)
+
+# Defined legal terms found in the query are added to the prompt verbatim
+GLOSSARY_DIR = os.getenv(
+    "GLOSSARY_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "dataset", "legal_definitions"))
+)
+GLOSSARY_MAX_TERMS = int(os.getenv("GLOSSARY_MAX_TERMS", "3"))
+_glossary_started = time.perf_counter()
+glossary = load_glossary(GLOSSARY_DIR, GLOSSARY_MAX_TERMS)
+startup_timings["load_glossary"] = round(time.perf_counter() - _glossary_started, 3)
+
+# "not_loaded", "loading", "ready" or "error: ..." for the components warmed up by warm_up()
+_warm_up_states = {"llm": "not_loaded"}
+
+def get_async_client():
+    """Returns the shared pooled httpx client used by the async path, creating it on first use."""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=5),
+            limits=httpx.Limits(max_connections=MAX_LLM_CONNECTIONS,
+                                max_keepalive_connections=MAX_LLM_CONNECTIONS)
+        )
+    return _async_client
+
+async def close_async_client():
+    """Closes the shared httpx client (call on application shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
 
-def ask_llm_with_context(query, conversation_id="default", is_new_conversation=False):
+def warm_up_llm():
     """
-    Retrieves relevant legal texts and queries Llama 3.2 with conversation context.
-    
-    Args:
-        query: The user's question
-        conversation_id: Unique identifier for this conversation
-        is_new_conversation: Boolean indicating if this is a new conversation
+    Asks every Ollama server to load the model (an empty prompt or message list only loads it) and
+    keep it resident; ready once at least one has.
+    """
+    _warm_up_states["llm"] = "loading"
+    start = time.perf_counter()
+    errors = []
+    for endpoint in llm_pool.endpoints:
+        try:
+            response = session.post(endpoint.url + API_PATH,
+                                    json=_payload([] if OLLAMA_API == "chat" else "", stream=False),
+                                    timeout=LLM_TIMEOUT)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            errors.append(f"{endpoint.url}: {e}")
+            logger.warning(f"LLM warm-up failed on {endpoint.url}: {e}")
+    startup_timings["warm_up_llm"] = round(time.perf_counter() - start, 3)
+    if len(errors) == len(llm_pool.endpoints):
+        _warm_up_states["llm"] = f"error: {'; '.join(errors)}"
+        return
+    _warm_up_states["llm"] = "ready"
+
+def preload():
     """
-    # Reset context if this is a new conversation
+    Loads the parts of the backend that forked worker processes share (see gunicorn.conf.py): the
+    embedding model and the memory-mapped indexes. The glossary is loaded at import.
+    """
+    preload_retrieval()
+    logger.info(f"Preloaded before forking workers (seconds): {startup_timings}")
+
+def warm_up():
+    """Loads the retrieval stack and the LLM so the first user request is served at full speed."""
+    try:
+        warm_up_retrieval()
+    except Exception as e:
+        logger.error(f"Retrieval warm-up failed: {e}", exc_info=True)
+    warm_up_llm()
+    logger.info(f"Startup profile (seconds): {startup_timings}")
+
+def start_warm_up():
+    """Runs warm_up() in a background thread; /ready reports 503 until it has finished."""
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    llm_pool.start_health_checks()
+    watch_index()
+    return thread
+
+def watch_index(interval=INDEX_WATCH_INTERVAL):
+    """
+    Checks every interval seconds in a daemon thread (once per process) whether another index
+    snapshot was activated or the index rebuilt, and switches to it. Every worker runs its own,
+    so all of them follow a switch made from the command line or through one worker's admin
+    endpoint.
+    """
+    global _index_watch
+    if _index_watch is not None or interval <= 0:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                if reload_index():
+                    logger.info(f"Switched to index {index_status()}")
+            except Exception as e:
+                logger.error(f"Index reload failed, still serving the previous index: {e}",
+                             exc_info=True)
+
+    _index_watch = threading.Thread(target=run, name="index-watch", daemon=True)
+    _index_watch.start()
+
+def admin_authorized(authorization):
+    """True when the Authorization header carries ADMIN_TOKEN (never while it is unset)."""
+    expected = f"Bearer {ADMIN_TOKEN}".encode()
+    return bool(ADMIN_TOKEN) and hmac.compare_digest((authorization or "").encode(), expected)
+
+def switch_index(snapshot=None):
+    """
+    Activates the named snapshot, if any, and switches this worker to the served index now; the
+    other workers follow at their next watch_index check. Raises ValueError for an unknown snapshot.
+    """
+    if snapshot:
+        activate_snapshot(snapshot)
+    switched = reload_index()
+    return {"switched": switched, **index_status()}
+
+def readiness():
+    """Returns (ready, report) with the state of every component and the startup timings."""
+    components = dict(component_status(), **_warm_up_states)
+    ready = all(state in ("ready", "not_needed") for state in components.values())
+    return ready, {
+        "ready": ready,
+        "components": components,
+        "glossary_terms": len(glossary),
+        "llm_endpoints": llm_pool.stats(),
+        "admission": admission.stats(),
+        "index": index_status(),
+        "startup_timings": startup_timings
+    }
+
+@contextmanager
+def conversation_turn(conversation_id):
+    """
+    Holds the conversation's lock for a whole turn (load the history, answer, record the exchange),
+    so that a concurrent turn of the same conversation sees this one instead of being folded over
+    it. Take it before the admission slot, so waiting turns do not hold one; the wait is bounded by
+    the request's deadline (TimeoutError). Anonymous turns (no conversation ID) are not serialized.
+    """
+    if conversation_id is None:
+        yield
+    else:
+        with conversations.lock(conversation_id, timeout=remaining()):
+            yield
+
+@asynccontextmanager
+async def conversation_turn_async(conversation_id):
+    """Async version of conversation_turn, for turns answered on the event loop."""
+    if conversation_id is None:
+        yield
+    else:
+        async with conversations.lock_async(conversation_id, timeout=remaining()):
+            yield
+
+def _load_history(conversation_id=None, is_new_conversation=False):
+    """
+    Resets the history if this is a new conversation and returns a snapshot of it:
+    (summary, exchanges). An anonymous turn (conversation_id None) has no history.
+    """
+    if conversation_id is None:
+        return "", ()
     if is_new_conversation:
         logger.debug(f"Starting new conversation with ID: {conversation_id}")
-        conversation_contexts[conversation_id] = []
+        conversations.reset(conversation_id)
+    return conversations.load(conversation_id)
+
+def _coalesce_key(query, summary, history):
+    """
+    Key under which identical concurrent requests share one answer (None when it depends on
+    earlier turns).
+    """
+    if summary or history:
+        return None
+    return normalize_query(condense_query(query))
+
+def _build_prompt(query, summary="", history=()):
+    """
+    Retrieves the context for query and builds the LLM input for the next turn.
     
-    # Get or initialize the conversation history
-    if conversation_id not in conversation_contexts:
-        logger.debug(f"Initializing context for conversation ID: {conversation_id}")
-        conversation_contexts[conversation_id] = []
+    Returns:
+        (llm_input, cache_key, message): the prompt, or in chat mode the message list; cache_key
+        is None when the answer depends on earlier turns; message is the new chat message to record
+        (else None)
+    """
+    # Oversized questions are condensed before retrieval as well as in the prompt
+    query = condense_query(query)
     
     # Search for relevant documents
-    relevant_docs = search_documents(query)
-    context = "\n".join(relevant_docs)
+    with span("retrieval"):
+        relevant_docs = search_documents(query)
+
+    # A cited provision is what was asked for, so it is kept whole
+    if CONTEXT_COMPRESSION and relevant_docs and not is_citation_query(query):
+        with span("context_compression"):
+            # The query vector comes from the cache filled by the search
+            relevant_docs = compressor.compress(embed_query(query), relevant_docs)
     
-    # Build conversation history string
-    conversation_history = ""
-    if conversation_contexts[conversation_id]:
-        conversation_history = "Previous conversation:\n"
-        for exchange in conversation_contexts[conversation_id]:
-            conversation_history += f"User: {exchange['user']}\n"
-            conversation_history += f"Assistant: {exchange['assistant']}\n"
+    with span("prompt_assembly"):
+        return _assemble_prompt(query, relevant_docs, summary, history)
+
+def _assemble_prompt(query, relevant_docs, summary, history):
+    """The prompt-building half of _build_prompt, once the documents are retrieved."""
+    # Exact definitions for legal terms used in the question
+    defined_terms = glossary.find(query)
+
+    # Only history-free answers are reusable across conversations
+    cache_key = None
+    if not history and not summary:
+        cache_key = make_key(query, relevant_docs)
+
+    if OLLAMA_API == "chat":
+        # Earlier turns are replayed verbatim, so Ollama only has to prefill the new message
+        message = build_turn_message(query, relevant_docs, defined_terms)
+        messages = build_chat_messages(message, summary, history)
+        logger.debug(f"Sending {len(messages)} messages (new turn ~{count_tokens(message)} tokens)")
+        if LOG_PROMPTS:
+            logger.debug(f"Messages: {messages}")
+        return messages, cache_key, message
+
+    # Context, definitions, history summary + recent turns and the question, within the token budget
+    prompt = build_prompt(query, relevant_docs, defined_terms, summary, history)
+
+    logger.debug(f"Sending prompt (~{count_tokens(prompt)} tokens) "
+                 f"with {len(history)} previous exchanges")
+    if LOG_PROMPTS:
+        logger.debug(f"Prompt: {prompt}")
+    return prompt, cache_key, None
+
+def _cached_answer(cache_key):
+    """Returns the cached answer for a history-free prompt, or None."""
+    if cache_key is None:
+        return None
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        logger.debug("Answer cache hit")
+    return cached
+
+def _record_exchange(conversation_id, query, assistant_response, message=None):
+    """Stores a completed exchange in the conversation history (it keeps the last MAX_EXCHANGES)."""
+    if conversation_id is None:
+        return
+    conversations.append(conversation_id, query, assistant_response, message)
+    logger.debug(f"Updated conversation history for ID: {conversation_id}")
+
+def _payload(llm_input, stream):
+    """Body for the configured Ollama API; llm_input is a prompt, or a message list in chat mode."""
+    payload = {
+        "model": LLM_MODEL,
+        "stream": stream,
+        "keep_alive": OLLAMA_KEEP_ALIVE
+    }
+    payload["messages" if OLLAMA_API == "chat" else "prompt"] = llm_input
+    if OLLAMA_NUM_CTX:
+        payload["options"] = {"num_ctx": OLLAMA_NUM_CTX}
+    return payload
+
+def _response_text(data):
+    """The generated text in an Ollama response (either API), or None if there is none."""
+    if "message" in data:
+        return data["message"].get("content", "")
+    return data.get("response")
+
+def _parse_stream_line(line):
+    """Returns the token carried by a line of Ollama's streamed output and whether it was last."""
+    chunk = json.loads(line)
+    if "error" in chunk:
+        raise requests.exceptions.RequestException(chunk["error"])
+    if chunk.get("done"):
+        observe_ollama(chunk)  # the last line carries the token counts and durations
+    return _response_text(chunk) or "", chunk.get("done", False)
+
+class _GenerationTimer:
+    """Times one streamed generation: time to first token and total generation time."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = False
+
+    def token(self):
+        if not self.first_token:
+            self.first_token = True
+            observe_stage("llm_first_token", time.perf_counter() - self.start)
+
+    def finish(self):
+        observe_stage("llm_generation", time.perf_counter() - self.start)
+
+def _generate(query, summary, history):
+    """
+    Answers the next turn from the answer cache or Ollama.
     
-    # Create the prompt with context and conversation history
-    prompt = f"""You are an AI expert in Indian law. Use the legal documents provided to answer queries.
+    Returns:
+        (answer, message): answer is None when Ollama's response carried no text
+    Raises:
+        requests.exceptions.RequestException: if the LLM API cannot be reached
+    """
+    llm_input, cache_key, message = _build_prompt(query, summary, history)
+    cached = _cached_answer(cache_key)
+    if cached is not None:
+        return cached, message
 
-    Context:
-    {context}
+    payload = _payload(llm_input, stream=False)
+    headers = {"Content-Type": "application/json"}
+    with span("llm_generation"), llm_pool.request(
+        session, API_PATH, queue_timeout=bounded(LLM_QUEUE_TIMEOUT), data=json.dumps(payload),
+        headers=headers, timeout=bounded(LLM_TIMEOUT)
+    ) as response:
+        data = response.json()
+    observe_ollama(data)
+
+    assistant_response = _response_text(data)
+    if assistant_response is not None and cache_key is not None:
+        answer_cache.put(cache_key, assistant_response)
+    return assistant_response, message
+
+def ask_llm_with_context(query, conversation_id=None, is_new_conversation=False):
+    """
+    Retrieves relevant legal texts and queries Llama 3.2 with conversation context.
     
-    {conversation_history}
+    Concurrent requests for the same history-free question share one retrieval and generation.
+    Callers hold conversation_turn(conversation_id), so that turns of one conversation are answered
+    one at a time; without a conversation ID the question is answered without history.
     
-    Current Question: {query}
-    Answer:
+    Raises:
+        DeadlineExceeded: if the request's deadline (see admission.py) passed before the answer
+        EndpointUnavailable: if no Ollama server could take the request
+        UpstreamError: if the Ollama server failed or answered without text
+    
+    Args:
+        query: The user's question
+        conversation_id: Unique identifier for this conversation
+        is_new_conversation: Boolean indicating if this is a new conversation
     """
+    summary, history = _load_history(conversation_id, is_new_conversation)
+    key = _coalesce_key(query, summary, history)
 
-    logger.debug(f"Sending prompt with conversation history for ID: {conversation_id}")
-    
+    try:
+        if key is None:
+            assistant_response, message = _generate(query, summary, history)
+        else:
+            assistant_response, message = answer_flights.do(
+                key, _generate, query, summary, history, timeout=remaining()
+            )
+    except requests.exceptions.RequestException as e:
+        if expired():
+            raise DeadlineExceeded("request deadline exceeded waiting for the LLM") from e
+        raise UpstreamError(f"LLM request failed: {e}") from e
 
-    payload = {
-        "model": "llama3.2",  
-        "prompt": prompt,
-        "stream": False
-    }
+    if assistant_response is None:
+        raise UpstreamError("no generated text in the LLM response")
+
+    # Store this exchange in the conversation history
+    _record_exchange(conversation_id, query, assistant_response, message)
+    return assistant_response
+
+def _generate_stream(query, summary, history, result):
+    """
+    Streaming counterpart of _generate: yields the answer token by token (a cached one in one piece)
+    and sets result["message"]. The answer is cached only if the stream ran to completion.
+    """
+    llm_input, cache_key, message = _build_prompt(query, summary, history)
+    result["message"] = message
+    cached = _cached_answer(cache_key)
+    if cached is not None:
+        yield cached
+        return
 
+    payload = _payload(llm_input, stream=True)
     headers = {"Content-Type": "application/json"}
+    parts = []
+    timer = _GenerationTimer()
+
+    # Closing the response (also on GeneratorExit) drops the connection to Ollama
+    with llm_pool.request(
+        session, API_PATH, queue_timeout=bounded(LLM_QUEUE_TIMEOUT), data=json.dumps(payload),
+        headers=headers, stream=True, timeout=bounded(LLM_TIMEOUT)
+    ) as response:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            token, done = _parse_stream_line(line)
+            if token:
+                timer.token()
+                parts.append(token)
+                yield token
+            if done:
+                break
+    timer.finish()
+
+    if cache_key is not None and parts:
+        answer_cache.put(cache_key, "".join(parts))
+
+def stream_llm_with_context(query, conversation_id=None, is_new_conversation=False):
+    """
+    Same as ask_llm_with_context, but yields the answer token by token as Ollama produces it.
+    
+    The exchange is only stored in the conversation history once the stream has completed.
+    Concurrent requests for the same history-free question subscribe to one generation. If the
+    consumer stops iterating (e.g. the client disconnected), the generator is closed; once no
+    consumer is left the upstream connection is closed, so Ollama stops generating.
+    
+    Raises:
+        DeadlineExceeded: once the request's deadline has passed; the stream is closed
+        EndpointUnavailable: if no Ollama server could take the request
+        UpstreamError: if the Ollama server failed, also mid-stream
+    """
+    summary, history = _load_history(conversation_id, is_new_conversation)
+    key = _coalesce_key(query, summary, history)
+    if key is None:
+        result = {}
+        tokens = _generate_stream(query, summary, history, result)
+    else:
+        tokens, result = stream_flights.subscribe(
+            key, lambda result: _generate_stream(query, summary, history, result)
+        )
 
+    parts = []
     try:
-        response = requests.post(url, data=json.dumps(payload), headers=headers, timeout=100)
-        response.raise_for_status()
+        for token in tokens:
+            remaining()  # raises past the deadline, and closing the stream stops the generation
+            parts.append(token)
+            yield token
+    except requests.exceptions.RequestException as e:
+        if expired():
+            raise DeadlineExceeded("request deadline exceeded waiting for the LLM") from e
+        raise UpstreamError(f"LLM request failed: {e}") from e
+    finally:
+        tokens.close()
 
-        data = response.json()
-        
-        if "response" in data:
-            assistant_response = data["response"]
-            
-            # Store this exchange in the conversation history
-            conversation_contexts[conversation_id].append({
-                "user": query,
-                "assistant": assistant_response
-            })
-            
-            # Keep conversation history to a reasonable size (last 5 exchanges)
-            if len(conversation_contexts[conversation_id]) > 5:
-                conversation_contexts[conversation_id] = conversation_contexts[conversation_id][-5:]
-                
-            logger.debug(f"Updated conversation history for ID: {conversation_id}")
-            return assistant_response
+    _record_exchange(conversation_id, query, "".join(parts), result.get("message"))
+
+async def _generate_async(query, summary, history):
+    """Async version of _generate; raises httpx.HTTPError if the LLM API cannot be reached."""
+    loop = asyncio.get_running_loop()
+    llm_input, cache_key, message = await loop.run_in_executor(
+        search_executor, contextvars.copy_context().run, _build_prompt, query, summary, history
+    )
+    cached = _cached_answer(cache_key)
+    if cached is not None:
+        return cached, message
+
+    payload = _payload(llm_input, stream=False)
+    with span("llm_generation"):
+        async with llm_pool.request_async(
+            get_async_client(), API_PATH, queue_timeout=bounded(LLM_QUEUE_TIMEOUT), json=payload,
+            timeout=bounded(LLM_TIMEOUT)
+        ) as response:
+            data = response.json()
+    observe_ollama(data)
+
+    assistant_response = _response_text(data)
+    if assistant_response is not None and cache_key is not None:
+        answer_cache.put(cache_key, assistant_response)
+    return assistant_response, message
+
+async def ask_llm_with_context_async(query, conversation_id=None, is_new_conversation=False):
+    """
+    Async version of ask_llm_with_context for the ASGI app.
+    
+    Retrieval runs in the bounded search executor and the LLM call goes through the shared
+    pooled httpx client, so the event loop can hold many in-flight generations at once.
+    """
+    loop = asyncio.get_running_loop()
+    summary, history = await loop.run_in_executor(
+        search_executor, _load_history, conversation_id, is_new_conversation
+    )
+    key = _coalesce_key(query, summary, history)
+
+    try:
+        if key is None:
+            assistant_response, message = await _generate_async(query, summary, history)
         else:
-            logger.error("No 'response' key found in API response")
-            return "Error: No response received from LLM"
+            assistant_response, message = await async_answer_flights.do(
+                key, _generate_async, query, summary, history, timeout=remaining()
+            )
+    except httpx.HTTPError as e:
+        if expired():
+            raise DeadlineExceeded("request deadline exceeded waiting for the LLM") from e
+        raise UpstreamError(f"LLM request failed: {e}") from e
 
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request failed: {e}")
-        return f"Error: Unable to reach LLM API - {e}"
+    if assistant_response is None:
+        raise UpstreamError("no generated text in the LLM response")
+
+    _record_exchange(conversation_id, query, assistant_response, message)
+    return assistant_response
+
+async def _generate_stream_async(query, summary, history, result):
+    """Async version of _generate_stream."""
+    loop = asyncio.get_running_loop()
+    llm_input, cache_key, message = await loop.run_in_executor(
+        search_executor, contextvars.copy_context().run, _build_prompt, query, summary, history
+    )
+    result["message"] = message
+    cached = _cached_answer(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    payload = _payload(llm_input, stream=True)
+    parts = []
+    timer = _GenerationTimer()
+
+    async with llm_pool.request_async(
+        get_async_client(), API_PATH, stream=True, queue_timeout=bounded(LLM_QUEUE_TIMEOUT),
+        json=payload, timeout=bounded(LLM_TIMEOUT)
+    ) as response:
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            token, done = _parse_stream_line(line)
+            if token:
+                timer.token()
+                parts.append(token)
+                yield token
+            if done:
+                break
+    timer.finish()
+
+    if cache_key is not None and parts:
+        answer_cache.put(cache_key, "".join(parts))
+
+async def stream_llm_with_context_async(query, conversation_id=None, is_new_conversation=False):
+    """
+    Async version of stream_llm_with_context; cancelling the last consumer drops the upstream
+    generation.
+    """
+    loop = asyncio.get_running_loop()
+    summary, history = await loop.run_in_executor(
+        search_executor, _load_history, conversation_id, is_new_conversation
+    )
+    key = _coalesce_key(query, summary, history)
+    if key is None:
+        result = {}
+        tokens = _generate_stream_async(query, summary, history, result)
+    else:
+        tokens, result = async_stream_flights.subscribe(
+            key, lambda result: _generate_stream_async(query, summary, history, result)
+        )
+
+    parts = []
+    try:
+        async for token in tokens:
+            remaining()
+            parts.append(token)
+            yield token
+    except httpx.HTTPError as e:
+        if expired():
+            raise DeadlineExceeded("request deadline exceeded waiting for the LLM") from e
+        raise UpstreamError(f"LLM request failed: {e}") from e
+    finally:
+        await tokens.aclose()
+
+    _record_exchange(conversation_id, query, "".join(parts), result.get("message"))
+
+def search_documents_shared(query):
+    """search_documents, with concurrent identical queries sharing one search."""
+    return search_flights.do(normalize_query(query), search_documents, query, timeout=remaining())
+
+async def search_documents_async(query):
+    """Runs search_documents in the bounded search executor, sharing identical concurrent calls."""
+    loop = asyncio.get_running_loop()
+
+    async def search():
+        return await loop.run_in_executor(search_executor, contextvars.copy_context().run,
+                                          search_documents, query)
+
+    return await async_search_flights.do(normalize_query(query), search, timeout=remaining())
 
 # Keep the original function for backward compatibility
 def ask_llm(query):
     """Legacy function that calls the new context-aware function"""
-    return ask_llm_with_context(query)
\ No newline at end of file
+    return ask_llm_with_context(query)
+
+# Import cost of the backend itself; the model and store load later in warm_up() or on first use
+startup_timings["import_backend"] = round(time.perf_counter() - _import_started, 3)
@@ -0,0 +1,164 @@
+import os
+import re
+import threading
+
+import numpy as np  # type: ignore
+
+from prompt_builder import count_tokens, truncate
+from query_embedding import QueryEmbeddingCache
+
+# Sentence-level compression of the retrieved chunks: every sentence is scored against the query
+# vector and only the best ones, within a token budget, go into the prompt. Section headings are
+# kept in front of the sentences taken from their section, and kept sentences stay in their
+# original order, with "..." where something was left out.
+COMPRESSION_TOKEN_BUDGET = int(os.getenv("COMPRESSION_TOKEN_BUDGET", "384"))
+# Sentence vectors are reused across questions; chunks come back often
+SENTENCE_CACHE_SIZE = int(os.getenv("SENTENCE_CACHE_SIZE", "20000"))
+HEADER_MAX_TOKENS = 40
+
+# "### Indian Penal Code", "Section 144", "Sec. 144A ...", "Article 21", "CHAPTER IV",
+# "144. Power to ..."
+HEADER = re.compile(
+    r"^\s*(?:###\s+\S"
+    r"|(?:Section|Sec\.|Article|Art\.|Chapter|CHAPTER|Part|PART|Schedule|SCHEDULE)\s+[\dIVXLC]+"
+    r"|\d+[A-Z]*\.\s+[A-Z\[])"
+)
+# Abbreviations that end in a period without ending the sentence
+ABBREVIATIONS = re.compile(r"(?:\b(?:Sec|Secs|Art|Arts|No|Nos|Cl|cl|Ch|Sch|Ord|Reg|Rs|viz|vs|etc"
+                           r"|i\.e|e\.g|s|ss|r|rr)"
+                           r"|\b[A-Z])\.$")
+SENTENCE_END = re.compile(r"(?<=[.;?!])\s+(?=[A-Z(\[\"'])")
+# A heading's number on its own ("144.", "Section 12.") belongs with the title that follows
+LABEL = re.compile(r"^(?:(?:Section|Sec\.|Article|Art\.)\s+)?[\dIVXLC]+[A-Z]*\.$")
+
+
+def split_sentences(text):
+    """Splits a line of legal text into sentences, not breaking after "Sec.", "No.", "i.e." etc."""
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        candidate = text[start:match.start()]
+        if ABBREVIATIONS.search(candidate):
+            continue
+        sentences.append(candidate.strip())
+        start = match.end()
+    sentences.append(text[start:].strip())
+    return [sentence for sentence in sentences if sentence]
+
+
+def _parse(chunk):
+    """
+    Returns the chunk's sections as (header or None, [sentences]); the header is the heading's first
+    sentence.
+    """
+    sections = [(None, [])]
+    for line in chunk.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("###"):
+            sections.append((truncate(line, HEADER_MAX_TOKENS), []))
+            continue
+        sentences = split_sentences(line)
+        if HEADER.match(line):
+            count = 2 if len(sentences) > 1 and LABEL.match(sentences[0]) else 1
+            sections.append((truncate(" ".join(sentences[:count]), HEADER_MAX_TOKENS), []))
+            sentences = sentences[count:]
+        sections[-1][1].extend(sentences)
+    return [section for section in sections if section[0] or section[1]]
+
+
+class ContextCompressor:
+    """
+    Keeps the sentences of the retrieved chunks most similar to the query.
+
+    embed_fn(texts) returns one vector per text; it is called once per compression, for the
+    sentences whose vectors are not cached yet.
+    """
+
+    def __init__(self, embed_fn, budget=COMPRESSION_TOKEN_BUDGET, cache_size=SENTENCE_CACHE_SIZE):
+        self.embed_fn = embed_fn
+        self.budget = budget
+        self.cache = QueryEmbeddingCache(cache_size)
+        self._lock = threading.Lock()
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def _vectors(self, sentences):
+        vectors = [self.cache.get(sentence) for sentence in sentences]
+        missing = list(dict.fromkeys(s for s, v in zip(sentences, vectors) if v is None))
+        if missing:
+            embedded = dict(zip(missing, self.embed_fn(missing)))
+            for sentence, vector in embedded.items():
+                self.cache.put(sentence, vector)
+            vectors = [embedded[s] if v is None else v for s, v in zip(sentences, vectors)]
+        return np.asarray(vectors, dtype=np.float32)
+
+    def compress(self, query_vector, chunks, budget=None):
+        """
+        Returns the chunks cut down to their best sentences, in the same order; empty chunks are
+        dropped.
+        """
+        budget = self.budget if budget is None else budget
+        parsed = [_parse(chunk) for chunk in chunks]
+        # (chunk, section, sentence index) of every sentence, and the texts to score
+        positions = [(c, s, i) for c, sections in enumerate(parsed)
+                     for s, (_, sentences) in enumerate(sections) for i in range(len(sentences))]
+        if not positions:
+            return list(chunks)
+        texts = [parsed[c][s][1][i] for c, s, i in positions]
+        index_of = {position: index for index, position in enumerate(positions)}
+
+        vectors = self._vectors(texts)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+
+        kept = set()
+        used = 0
+        headed = set()
+        for index in np.argsort(-scores, kind="stable"):
+            c, s, _ = positions[index]
+            header = parsed[c][s][0]
+            cost = count_tokens(texts[index])
+            if header and (c, s) not in headed:
+                cost += count_tokens(header)
+            if used + cost > budget:
+                if kept:
+                    continue  # a shorter sentence further down may still fit
+                texts[index] = truncate(texts[index], budget)  # not even the best sentence fits
+                cost = budget
+            kept.add(index)
+            headed.add((c, s))
+            used += cost
+
+        compressed = []
+        for c, sections in enumerate(parsed):
+            lines = []
+            for s, (header, sentences) in enumerate(sections):
+                chosen = [i for i in range(len(sentences)) if index_of[c, s, i] in kept]
+                if not chosen:
+                    continue
+                if header:
+                    lines.append(header)
+                parts = []
+                for n, i in enumerate(chosen):
+                    if (n == 0 and i > 0) or (n > 0 and i != chosen[n - 1] + 1):
+                        parts.append("...")
+                    parts.append(texts[index_of[c, s, i]])
+                if chosen[-1] < len(sentences) - 1:
+                    parts.append("...")
+                lines.append(" ".join(parts))
+            if lines:
+                compressed.append("\n".join(lines))
+
+        with self._lock:
+            self.tokens_in += sum(count_tokens(chunk) for chunk in chunks)
+            self.tokens_out += sum(count_tokens(chunk) for chunk in compressed)
+        return compressed
+
+    def stats(self):
+        with self._lock:
+            stats = {"tokens_in": self.tokens_in, "tokens_out": self.tokens_out}
+        stats["sentence_cache"] = self.cache.stats()
+        return stats
@@ -0,0 +1,467 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Conversation histories: the last few (user, assistant) exchanges per conversation ID. Idle
+# conversations expire after a TTL and the least recently used are evicted beyond a count / memory
+# cap, so clients cannot grow the server without limit by inventing conversation IDs.
+# "memory" keeps them in this process; "sqlite" stores them in a file every worker process shares.
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "memory")
+CONVERSATION_DB_PATH = os.getenv(
+    "CONVERSATION_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "conversations.db")
+)
+MAX_CONVERSATIONS = int(os.getenv("MAX_CONVERSATIONS", "10000"))
+# Seconds since last activity
+CONVERSATION_TTL = float(os.getenv("CONVERSATION_TTL", str(24 * 3600)))
+# Memory store only
+CONVERSATION_MAX_BYTES = int(os.getenv("CONVERSATION_MAX_BYTES", str(64 * 1024 * 1024)))
+MAX_EXCHANGES = int(os.getenv("MAX_EXCHANGES", "5"))
+# The SQLite store commits queued writes in one transaction at most this often (seconds)
+CONVERSATION_FLUSH_INTERVAL = float(os.getenv("CONVERSATION_FLUSH_INTERVAL", "0.05"))
+# A failed commit is retried until it succeeds; once the store is closing, this many attempts in all
+WRITE_ATTEMPTS_ON_CLOSE = 3
+
+
+def _exchange_size(exchange):
+    return sum(len(value.encode("utf-8")) for value in exchange.values())
+
+
+def _exchange(user, assistant, message=None):
+    exchange = {"user": user, "assistant": assistant}
+    if message is not None:
+        exchange["message"] = message
+    return exchange
+
+
+class ConversationStore:
+    """
+    Interface shared by the stores. Exchanges are {"user": ..., "assistant": ...} dicts, oldest
+    first, plus "message" when the exact text sent to the LLM was recorded. Beyond max_exchanges,
+    the oldest are folded into the conversation's summary until trim_to remain.
+    """
+
+    def __init__(self, max_exchanges=MAX_EXCHANGES, summarize=None, trim_to=None):
+        self.max_exchanges = max_exchanges
+        # Trimming several exchanges at once keeps the start of the history unchanged for several
+        # turns, which lets the LLM server reuse its cached prefix (defaults to one at a time)
+        self.trim_to = max_exchanges if trim_to is None else min(trim_to, max_exchanges)
+        # (summary, exchange) -> summary, called for every exchange that leaves the window, so older
+        # turns are condensed one at a time instead of being forgotten (None just drops them)
+        self.summarize = summarize
+        self._locks = {}  # conversation ID -> [lock, number of holders and waiters]
+        self._locks_guard = threading.Lock()
+        self._async_locks = {}  # the same, with asyncio locks, for turns answered on the event loop
+
+    @contextmanager
+    def lock(self, conversation_id, timeout=None):
+        """
+        Serializes read-modify-write sequences on one conversation (e.g. a whole turn: load the
+        history, answer, append) without blocking the others. Not reentrant, and only within this
+        process. Raises TimeoutError if it is still held by someone else after timeout seconds.
+        The lock is dropped once nobody holds or waits for it.
+        """
+        with self._locks_guard:
+            entry = self._locks.setdefault(conversation_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            if not entry[0].acquire(timeout=-1 if timeout is None else timeout):
+                raise TimeoutError(f"conversation {conversation_id} is busy with another turn")
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[conversation_id]
+
+    @asynccontextmanager
+    async def lock_async(self, conversation_id, timeout=None):
+        """
+        lock() for coroutines: waits without blocking the event loop. Call it from the loop's
+        thread only.
+        """
+        entry = self._async_locks.setdefault(conversation_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            try:
+                await asyncio.wait_for(entry[0].acquire(), timeout)
+            except asyncio.TimeoutError as e:
+                raise TimeoutError(
+                    f"conversation {conversation_id} is busy with another turn") from e
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._async_locks[conversation_id]
+
+    def _push(self, summary, exchanges, exchange):
+        """Appends exchange, folding whatever leaves the window into the summary."""
+        exchanges = tuple(exchanges) + (exchange,)
+        overflow = len(exchanges) - self.trim_to if len(exchanges) > self.max_exchanges else 0
+        if self.summarize is not None:
+            for dropped in exchanges[:overflow]:
+                summary = self.summarize(summary, dropped)
+        return summary, exchanges[overflow:]
+
+    def load(self, conversation_id):
+        """Returns (summary, exchanges); ("", []) for an unknown or expired conversation."""
+        raise NotImplementedError
+
+    def get(self, conversation_id):
+        """Returns the stored exchanges ([] for an unknown or expired conversation)."""
+        return self.load(conversation_id)[1]
+
+    def append(self, conversation_id, user, assistant, message=None):
+        raise NotImplementedError
+
+    def reset(self, conversation_id):
+        """Forgets the history of a conversation."""
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryConversationStore(ConversationStore):
+    """In-process LRU + TTL store with an approximate memory cap."""
+
+    def __init__(self, max_conversations=MAX_CONVERSATIONS, ttl=CONVERSATION_TTL,
+                 max_bytes=CONVERSATION_MAX_BYTES, max_exchanges=MAX_EXCHANGES, summarize=None,
+                 trim_to=None):
+        super().__init__(max_exchanges, summarize, trim_to)
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # conversation ID -> (expires_at, size, summary, exchanges); exchanges are tuples, replaced
+        # on every write
+        self._conversations = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, conversation_id):
+        _, size, _, _ = self._conversations.pop(conversation_id)
+        self._bytes -= size
+
+    def _lookup(self, conversation_id):
+        entry = self._conversations.get(conversation_id)
+        if entry is None:
+            return "", ()
+        if entry[0] < time.monotonic():
+            self._remove(conversation_id)
+            self.expirations += 1
+            return "", ()
+        return entry[2], entry[3]
+
+    def load(self, conversation_id):
+        with self._lock:
+            summary, exchanges = self._lookup(conversation_id)
+            if conversation_id in self._conversations:
+                self._conversations.move_to_end(conversation_id)
+            return summary, [dict(exchange) for exchange in exchanges]
+
+    def append(self, conversation_id, user, assistant, message=None):
+        exchange = _exchange(user, assistant, message)
+        with self._lock:
+            summary, exchanges = self._push(*self._lookup(conversation_id), exchange)
+            if conversation_id in self._conversations:
+                self._remove(conversation_id)
+            size = (len(conversation_id) + len(summary.encode("utf-8"))
+                    + sum(_exchange_size(e) for e in exchanges))
+            self._conversations[conversation_id] = (time.monotonic() + self.ttl, size, summary,
+                                                    exchanges)
+            self._bytes += size
+            while len(self._conversations) > self.max_conversations or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._conversations)))
+                self.evictions += 1
+
+    def reset(self, conversation_id):
+        with self._lock:
+            if conversation_id in self._conversations:
+                self._remove(conversation_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "conversations": len(self._conversations),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    Store in a SQLite file (WAL mode) that several worker processes can share.
+
+    Writes are queued and committed by a background thread in one transaction per
+    flush_interval; reads in the same process see queued writes immediately, other processes
+    see them once committed.
+    """
+
+    def __init__(self, path=CONVERSATION_DB_PATH, max_conversations=MAX_CONVERSATIONS,
+                 ttl=CONVERSATION_TTL, max_exchanges=MAX_EXCHANGES,
+                 flush_interval=CONVERSATION_FLUSH_INTERVAL, summarize=None, trim_to=None):
+        super().__init__(max_exchanges, summarize, trim_to)
+        self.path = path
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        # ("append", conversation ID, exchange, time) or ("reset", conversation ID)
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._flushed = threading.Condition(self._pending_lock)
+        # Odd while the writer is committing; reads retry if it changed under them (a seqlock), so a
+        # queued write is seen exactly once, either in the database or in the pending list
+        self._generation = 0
+        self._closed = False
+        self._writer = None  # started by the first write
+        self.batches = 0
+        self.writes = 0
+
+        conn = self._connect()
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS exchanges (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL,
+                user TEXT NOT NULL,
+                assistant TEXT NOT NULL,
+                message TEXT)""")
+            conn.execute("""CREATE INDEX IF NOT EXISTS exchanges_by_conversation
+                            ON exchanges (conversation_id, seq)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS conversations (
+                conversation_id TEXT PRIMARY KEY,
+                last_active REAL NOT NULL,
+                summary TEXT NOT NULL DEFAULT '')""")
+            conn.execute("""CREATE INDEX IF NOT EXISTS conversations_by_activity
+                            ON conversations (last_active)""")
+        conn.close()
+        # A prefork server creates the store in the master, which never writes to it and so starts
+        # no thread before the fork; each worker needs its own locks, connections and writer
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_writer(self):
+        self._writer = threading.Thread(target=self._write_loop, name="conversation-writer",
+                                        daemon=True)
+        self._writer.start()
+
+    def _after_fork(self):
+        """
+        In a forked child: fresh locks, connections and writer; writes queued in the parent are the
+        parent's.
+        """
+        if self._closed:
+            return
+        self._local = threading.local()
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._flushed = threading.Condition(self._pending_lock)
+        self._generation = 0
+        self._writer = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def load(self, conversation_id):
+        conn = self._reader()
+        while True:
+            with self._pending_lock:
+                self._flushed.wait_for(lambda: self._generation % 2 == 0)
+                generation = self._generation
+            row = conn.execute(
+                "SELECT summary FROM conversations WHERE conversation_id = ? AND last_active >= ?",
+                (conversation_id, time.time() - self.ttl)
+            ).fetchone()
+            rows = conn.execute(
+                """SELECT user, assistant, message FROM exchanges WHERE conversation_id = ?
+                   ORDER BY seq DESC LIMIT ?""",
+                (conversation_id, self.max_exchanges)
+            ).fetchall() if row else []
+            with self._pending_lock:
+                if self._generation == generation:
+                    pending = [op for op in self._pending if op[1] == conversation_id]
+                    break
+
+        summary = row[0] if row else ""
+        exchanges = [_exchange(*row) for row in reversed(rows)]
+        # Apply this process's writes that are not committed yet, as the writer will
+        for op in pending:
+            if op[0] == "reset":
+                summary, exchanges = "", []
+            else:
+                summary, exchanges = self._push(summary, exchanges, dict(op[2]))
+        return summary, list(exchanges)
+
+    def append(self, conversation_id, user, assistant, message=None):
+        self._enqueue(("append", conversation_id, _exchange(user, assistant, message), time.time()))
+
+    def reset(self, conversation_id):
+        self._enqueue(("reset", conversation_id))
+
+    def _enqueue(self, op):
+        with self._pending_lock:
+            if self._closed:
+                raise RuntimeError("Conversation store is closed")
+            self._pending.append(op)
+            if self._writer is None:
+                self._start_writer()
+
+    def _write_loop(self):
+        conn = self._connect()
+        last_cleanup = 0.0
+        failures = 0  # consecutive failed commits of the pending batch
+        while True:
+            time.sleep(self.flush_interval)
+            with self._pending_lock:
+                batch, closed = self._pending[:], self._closed
+                if batch:
+                    self._generation += 1
+            if batch:
+                try:
+                    self._write(conn, batch)
+                    failures = 0
+                except sqlite3.Error as e:
+                    failures += 1
+                    if not closed or failures < WRITE_ATTEMPTS_ON_CLOSE:
+                        # The batch stays queued (and visible to reads) and is retried with more
+                        # writes, e.g. once another process no longer holds the database lock
+                        logger.warning(f"Failed to write {len(batch)} conversation updates "
+                                       f"(attempt {failures}), retrying: {e}")
+                        with self._pending_lock:
+                            self._generation += 1
+                            self._flushed.notify_all()
+                        time.sleep(min(self.flush_interval * 2 ** failures, 5.0))
+                        continue
+                    logger.error(f"Dropped {len(batch)} conversation updates after {failures} "
+                                 f"failed writes while closing: {e}")
+                    failures = 0
+                with self._pending_lock:
+                    # Reads merge pending ops, so drop them only once they are committed
+                    del self._pending[:len(batch)]
+                    self._generation += 1
+                    self._flushed.notify_all()
+            if time.monotonic() - last_cleanup > 60:
+                last_cleanup = time.monotonic()
+                try:
+                    self._cleanup(conn)
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to expire conversations: {e}")
+            if closed and not batch:
+                conn.close()
+                return
+
+    def _write(self, conn, batch):
+        touched = set()
+        with conn:
+            for op in batch:
+                conversation_id = op[1]
+                if op[0] == "reset":
+                    conn.execute("DELETE FROM exchanges WHERE conversation_id = ?",
+                                 (conversation_id,))
+                    conn.execute("DELETE FROM conversations WHERE conversation_id = ?",
+                                 (conversation_id,))
+                    touched.discard(conversation_id)
+                    continue
+                exchange, now = op[2], op[3]
+                conn.execute("""INSERT INTO exchanges (conversation_id, user, assistant, message)
+                                VALUES (?, ?, ?, ?)""",
+                             (conversation_id, exchange["user"], exchange["assistant"],
+                              exchange.get("message")))
+                conn.execute("""INSERT INTO conversations (conversation_id, last_active)
+                                VALUES (?, ?) ON CONFLICT (conversation_id)
+                                DO UPDATE SET last_active = excluded.last_active""",
+                             (conversation_id, now))
+                touched.add(conversation_id)
+            for conversation_id in touched:
+                count, = conn.execute("SELECT COUNT(*) FROM exchanges WHERE conversation_id = ?",
+                                      (conversation_id,)).fetchone()
+                if count <= self.max_exchanges:
+                    continue
+                dropped = conn.execute(
+                    """SELECT seq, user, assistant, message FROM exchanges WHERE conversation_id = ?
+                       ORDER BY seq DESC LIMIT -1 OFFSET ?""",
+                    (conversation_id, self.trim_to)
+                ).fetchall()
+                if self.summarize is not None:
+                    summary, = conn.execute(
+                        "SELECT summary FROM conversations WHERE conversation_id = ?",
+                        (conversation_id,)).fetchone()
+                    for row in reversed(dropped):
+                        summary = self.summarize(summary, _exchange(*row[1:]))
+                    conn.execute("UPDATE conversations SET summary = ? WHERE conversation_id = ?",
+                                 (summary, conversation_id))
+                conn.execute("DELETE FROM exchanges WHERE conversation_id = ? AND seq <= ?",
+                             (conversation_id, dropped[0][0]))
+        self.batches += 1
+        self.writes += len(batch)
+
+    def _cleanup(self, conn):
+        """Deletes expired conversations and the least recently active ones beyond the cap."""
+        with conn:
+            conn.execute("""DELETE FROM conversations WHERE last_active < ? OR conversation_id IN (
+                            SELECT conversation_id FROM conversations
+                            ORDER BY last_active DESC LIMIT -1 OFFSET ?)""",
+                         (time.time() - self.ttl, self.max_conversations))
+            conn.execute("""DELETE FROM exchanges WHERE conversation_id NOT IN (
+                            SELECT conversation_id FROM conversations)""")
+
+    def flush(self, timeout=None):
+        """Blocks until everything queued so far is committed."""
+        with self._pending_lock:
+            return self._flushed.wait_for(lambda: not self._pending, timeout)
+
+    def stats(self):
+        count, = self._reader().execute("SELECT COUNT(*) FROM conversations").fetchone()
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {
+            "backend": "sqlite",
+            "conversations": count,
+            "pending_writes": pending,
+            "write_batches": self.batches,
+            "writes": self.writes,
+        }
+
+    def close(self):
+        """Commits queued writes and stops the writer thread."""
+        with self._pending_lock:
+            self._closed = True
+            writer = self._writer
+        if writer is not None:
+            writer.join()
+
+
+def create_conversation_store(kind=CONVERSATION_STORE, summarize=None, trim_to=None):
+    if kind == "sqlite":
+        return SQLiteConversationStore(summarize=summarize, trim_to=trim_to)
+    if kind == "memory":
+        return MemoryConversationStore(summarize=summarize, trim_to=trim_to)
+    raise ValueError(f"Unknown conversation store: {kind}")
@@ -0,0 +1,212 @@
+import json
+import os
+import threading
+
+import numpy as np  # type: ignore
+
+# Embedding backends behind vector_database.get_embeddings(). Each has the LangChain embeddings
+# interface (embed_documents(texts), embed_query(text)), so Chroma, the micro-batcher and
+# store_documents take any of them:
+#   "torch"  HuggingFaceEmbeddings on full-precision torch, the model the corpus was embedded with
+#   "int8"   the same sentence-transformers model, its Linear layers dynamically quantized to int8
+#   "onnx"   an ONNX export of the model (see export_onnx) run by ONNX Runtime, without torch
+# A corpus embedded with one backend can be searched with another only if their vectors agree
+# closely enough; drift_report measures that, see vector_database.check_embedding_drift.
+EMBEDDING_BACKENDS = ("torch", "int8", "onnx")
+# Matches sentence-transformers' max_seq_length for all-MiniLM-L6-v2; longer inputs are truncated
+ONNX_MAX_LENGTH = 256
+
+
+def load_embedder(backend, model_name, threads=0, onnx_dir=None):
+    """
+    Loads model_name with the given backend; threads caps the intra-op threads (0 keeps the
+    default).
+    """
+    if backend == "torch":
+        import torch  # type: ignore
+        from langchain_huggingface import HuggingFaceEmbeddings  # type: ignore
+        if threads:
+            torch.set_num_threads(threads)
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        print(f"✅ Using device: {device}")
+        return HuggingFaceEmbeddings(model_name=model_name, model_kwargs={"device": device})
+    if backend == "int8":
+        return QuantizedEmbeddings(model_name, threads)
+    if backend == "onnx":
+        if not onnx_dir or not os.path.exists(os.path.join(onnx_dir, "model.onnx")):
+            raise FileNotFoundError(
+                f"No ONNX export in {onnx_dir}; run: python embedders.py {onnx_dir}")
+        return OnnxEmbeddings(onnx_dir, threads)
+    raise ValueError(f"Unknown embedding backend: {backend} "
+                     f"(expected one of {', '.join(EMBEDDING_BACKENDS)})")
+
+
+class QuantizedEmbeddings:
+    """
+    A sentence-transformers model on the CPU with torch dynamic int8 quantization of its Linear
+    layers: weights are stored as int8 and activations are quantized on the fly, which cuts the
+    model's memory to about a quarter and speeds up CPU inference, with no calibration data.
+    Tokenization, pooling and normalization are the model's own, as with HuggingFaceEmbeddings.
+    """
+
+    def __init__(self, model_name, threads=0, batch_size=32):
+        import torch  # type: ignore
+        from sentence_transformers import SentenceTransformer  # type: ignore
+        if threads:
+            torch.set_num_threads(threads)
+        model = SentenceTransformer(model_name, device="cpu")
+        self.model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear},
+                                                         dtype=torch.qint8)
+        self.model.eval()
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts):
+        return self.model.encode(list(texts), batch_size=self.batch_size,
+                                 convert_to_numpy=True).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class OnnxEmbeddings:
+    """
+    Runs an export written by export_onnx with ONNX Runtime and the Rust tokenizer: mean pooling
+    over the attention mask, then L2 normalization (all-MiniLM-L6-v2's pipeline). Needs neither
+    torch nor transformers at serving time.
+
+    The inference session is created on first use in each process: ONNX Runtime starts its thread
+    pool with the session, and threads do not survive the fork of a preloading server.
+    """
+
+    def __init__(self, model_dir, threads=0, batch_size=32, max_length=ONNX_MAX_LENGTH):
+        from tokenizers import Tokenizer  # type: ignore
+        self.model_path = os.path.join(model_dir, "model.onnx")
+        self.threads = threads
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        if self._session is None or self._session_pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    import onnxruntime  # type: ignore
+                    options = onnxruntime.SessionOptions()
+                    if self.threads:
+                        options.intra_op_num_threads = self.threads
+                    self._session = onnxruntime.InferenceSession(
+                        self.model_path, options, providers=["CPUExecutionProvider"]
+                    )
+                    self._input_names = {i.name for i in self._session.get_inputs()}
+                    self._session_pid = os.getpid()
+        return self._session
+
+    def _embed_batch(self, texts):
+        session = self._get_session()
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.asarray([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.asarray([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.asarray([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        feed = {name: value for name, value in inputs.items() if name in self._input_names}
+        hidden = session.run(None, feed)[0]
+        mask = inputs["attention_mask"][:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def export_onnx(model_name, out_dir, quantize=True):
+    """
+    Exports model_name's transformer to out_dir/model.onnx (dynamic int8 weights if quantize) with
+    its tokenizer.json. Needs torch and transformers, and onnxruntime to quantize; run once,
+    offline.
+    """
+    import torch  # type: ignore
+    from transformers import AutoModel, AutoTokenizer  # type: ignore
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["dimension probe"], return_tensors="pt")
+    names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    float_path = os.path.join(out_dir, "model_fp32.onnx" if quantize else "model.onnx")
+    outputs = ["last_hidden_state"]
+    axes = {name: {0: "batch", 1: "tokens"} for name in names + outputs}
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[name] for name in names), float_path, input_names=names,
+            output_names=outputs, dynamic_axes=axes, opset_version=14
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic  # type: ignore
+        quantize_dynamic(float_path, os.path.join(out_dir, "model.onnx"),
+                         weight_type=QuantType.QInt8)
+        os.remove(float_path)
+    tokenizer.backend_tokenizer.save(os.path.join(out_dir, "tokenizer.json"))
+    with open(os.path.join(out_dir, "export.json"), "w", encoding="utf-8") as f:
+        json.dump({"model": model_name, "quantized": quantize}, f)
+    print(f"✅ ONNX export of {model_name} written to {out_dir}")
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def _top_k(queries, vectors, k):
+    scores = queries @ vectors.T
+    k = min(k, vectors.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def drift_report(reference, candidate, k=10, min_cosine=0.99, min_overlap=0.9):
+    """
+    Compares candidate's vectors of a sample of texts with the reference model's vectors of the
+    same texts (row i of both is text i). Reports the cosine between each pair, and how many of each
+    text's k nearest neighbours among the reference vectors stay the same when it is looked up with
+    the candidate's vector instead, i.e. what a query embedded by the candidate would retrieve from
+    the corpus as embedded by the reference. reembed_required is set when the mean cosine is below
+    min_cosine or the mean overlap below min_overlap.
+    """
+    reference, candidate = _normalize(reference), _normalize(candidate)
+    cosines = np.sum(reference * candidate, axis=1)
+    overlap = [len(r & c) / len(r)
+               for r, c in zip(_top_k(reference, reference, k), _top_k(candidate, reference, k))]
+    report = {
+        "texts": len(cosines),
+        "cosine_mean": round(float(cosines.mean()), 5),
+        "cosine_p1": round(float(np.percentile(cosines, 1)), 5),
+        "cosine_min": round(float(cosines.min()), 5),
+        f"overlap@{k}": round(float(np.mean(overlap)), 4),
+    }
+    report["reembed_required"] = bool(report["cosine_mean"] < min_cosine
+                                      or report[f"overlap@{k}"] < min_overlap)
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX")
+    parser.add_argument("out_dir", help="directory for model.onnx and tokenizer.json")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL",
+                                                     "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--no-quantize", action="store_true", help="keep float32 weights")
+    args = parser.parse_args()
+    export_onnx(args.model, args.out_dir, quantize=not args.no_quantize)
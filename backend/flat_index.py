@@ -0,0 +1,196 @@
+import json
+import mmap
+import os
+import shutil
+
+import numpy as np  # type: ignore
+
+# Compact, memory-mapped alternative to the Chroma store for a fixed corpus:
+#   meta.json           count, dim and storage dtype
+#   vectors.npy         float16[N, dim], or int8[N, dim] with a per-row scale in scales.npy
+#   vectors_f32.npy     optional full-precision copy used to rescore the top candidates
+#   ids.json            chunk content IDs by row
+#   texts.bin           UTF-8 chunk texts back to back
+#   text_offsets.npy    int64[N + 1], byte range of each text in texts.bin
+#   row_acts.npy        optional int16[N], each chunk's act as an index into meta.json's "acts"
+# All vectors are L2-normalized, so the dot product is the cosine similarity.
+
+SEARCH_BLOCK_ROWS = 65536  # bounds the float32 temporaries during a scan
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def write_flat_index(records, count, dim, index_dir, dtype="int8", keep_full_precision=True):
+    """
+    Writes (chunk id, vector, text) records to index_dir, replacing any previous export.
+
+    Args:
+        records: iterable of (chunk id, embedding, text) or (chunk id, embedding, text, act),
+            exactly `count` of them; with acts, searches can be restricted to some of them
+        dtype: "float16" or "int8" (symmetric per-row quantization)
+        keep_full_precision: also store float32 vectors for the rescoring pass
+    """
+    if dtype not in ("float16", "int8"):
+        raise ValueError(f"Unsupported flat index dtype: {dtype}")
+
+    tmp_dir = index_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    vectors = np.lib.format.open_memmap(
+        os.path.join(tmp_dir, "vectors.npy"), mode="w+",
+        dtype=np.int8 if dtype == "int8" else np.float16, shape=(count, dim)
+    )
+    scales = np.ones(count, dtype=np.float32)
+    full = None
+    if keep_full_precision:
+        full = np.lib.format.open_memmap(
+            os.path.join(tmp_dir, "vectors_f32.npy"), mode="w+", dtype=np.float32,
+            shape=(count, dim)
+        )
+
+    ids = []
+    text_offsets = [0]
+    act_numbers = {}
+    row_acts = np.full(count, -1, dtype=np.int16)
+    with open(os.path.join(tmp_dir, "texts.bin"), "wb") as texts_file:
+        for row, (chunk_id, vector, text, *act) in enumerate(records):
+            if act and act[0]:
+                row_acts[row] = act_numbers.setdefault(act[0], len(act_numbers))
+            vector = _normalize(vector)
+            if dtype == "int8":
+                scales[row] = max(float(np.abs(vector).max()), 1e-12) / 127.0
+                vectors[row] = np.round(vector / scales[row]).astype(np.int8)
+            else:
+                vectors[row] = vector.astype(np.float16)
+            if full is not None:
+                full[row] = vector
+            ids.append(chunk_id)
+            encoded = text.encode("utf-8")
+            texts_file.write(encoded)
+            text_offsets.append(text_offsets[-1] + len(encoded))
+
+    if len(ids) != count:
+        raise ValueError(f"Expected {count} records, got {len(ids)}")
+
+    vectors.flush()
+    del vectors
+    if full is not None:
+        full.flush()
+        del full
+    if dtype == "int8":
+        np.save(os.path.join(tmp_dir, "scales.npy"), scales)
+    np.save(os.path.join(tmp_dir, "text_offsets.npy"), np.asarray(text_offsets, dtype=np.int64))
+    meta = {"count": count, "dim": dim, "dtype": dtype, "full_precision": keep_full_precision}
+    if act_numbers:
+        np.save(os.path.join(tmp_dir, "row_acts.npy"), row_acts)
+        meta["acts"] = list(act_numbers)
+    with open(os.path.join(tmp_dir, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    old_dir = index_dir + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(index_dir):
+        os.replace(index_dir, old_dir)
+    os.replace(tmp_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class FlatIndex:
+    """Exact top-k over a memory-mapped vector matrix, with optional full-precision rescoring."""
+
+    def __init__(self, index_dir, rescore_factor=4):
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(index_dir, "ids.json"), "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        self.rescore_factor = rescore_factor
+        self.vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode="r")
+        self.scales = None
+        if self.meta["dtype"] == "int8":
+            self.scales = np.load(os.path.join(index_dir, "scales.npy"))
+        self.full = None
+        if self.meta.get("full_precision"):
+            self.full = np.load(os.path.join(index_dir, "vectors_f32.npy"), mmap_mode="r")
+        self.text_offsets = np.load(os.path.join(index_dir, "text_offsets.npy"), mmap_mode="r")
+        self.acts = self.meta.get("acts", [])
+        self.row_acts = None
+        if self.acts:
+            self.row_acts = np.load(os.path.join(index_dir, "row_acts.npy"), mmap_mode="r")
+        self._texts_file = open(os.path.join(index_dir, "texts.bin"), "rb")
+        size = os.fstat(self._texts_file.fileno()).st_size
+        self._texts = (mmap.mmap(self._texts_file.fileno(), 0, access=mmap.ACCESS_READ)
+                       if size else b"")
+        self._rows_by_id = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def text(self, row):
+        return self._texts[self.text_offsets[row]:self.text_offsets[row + 1]].decode("utf-8")
+
+    def texts_for_ids(self, ids):
+        """Chunk texts by content ID (unknown IDs are skipped)."""
+        if self._rows_by_id is None:
+            self._rows_by_id = {id_: row for row, id_ in enumerate(self.ids)}
+        return [self.text(self._rows_by_id[id_]) for id_ in ids if id_ in self._rows_by_id]
+
+    def rows_for_acts(self, acts):
+        """Rows of the given acts' chunks, or None if the export has no acts (search every row)."""
+        if self.row_acts is None:
+            return None
+        numbers = [number for number, act in enumerate(self.acts) if act in acts]
+        return np.flatnonzero(np.isin(self.row_acts, numbers))
+
+    def _scores(self, query, rows=None):
+        """Approximate similarity of the query to every row (or the given rows), block by block."""
+        total = len(self.ids) if rows is None else len(rows)
+        scores = np.empty(total, dtype=np.float32)
+        for start in range(0, total, SEARCH_BLOCK_ROWS):
+            end = start + SEARCH_BLOCK_ROWS
+            block_rows = slice(start, end) if rows is None else rows[start:end]
+            block = np.asarray(self.vectors[block_rows], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query
+        if self.scales is not None:
+            scores *= self.scales if rows is None else self.scales[rows]
+        return scores
+
+    def _top(self, scores, k):
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def search(self, query_vector, k=3, rescore=True, acts=None):
+        """
+        Returns up to k (chunk id, text, cosine similarity) tuples, best first; acts limits the scan
+        to their chunks.
+        """
+        query = _normalize(query_vector)
+        rows = self.rows_for_acts(acts) if acts else None
+        scores = self._scores(query, rows)
+        if rescore and self.full is not None:
+            top = self._top(scores, k * self.rescore_factor)
+            # Sorted rows keep the reads from the full-precision file sequential
+            candidates = np.sort(top if rows is None else rows[top])
+            exact = np.asarray(self.full[candidates], dtype=np.float32) @ query
+            order = np.argsort(-exact)[:k]
+            return [(self.ids[candidates[i]], self.text(candidates[i]), float(exact[i]))
+                    for i in order]
+        top = self._top(scores, k)
+        found = top if rows is None else rows[top]
+        return [(self.ids[row], self.text(row), float(scores[i])) for i, row in zip(top, found)]
+
+    def close(self):
+        """Closes texts.bin and drops the memory-mapped arrays, which unmaps them."""
+        if isinstance(self._texts, mmap.mmap):
+            self._texts.close()
+        self._texts_file.close()
+        self.vectors = self.full = self.text_offsets = self.row_acts = None
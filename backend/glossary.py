@@ -0,0 +1,131 @@
+import glob
+import json
+import logging
+import os
+import re
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Compiled once at startup from dataset/legal_definitions/*.json. Defined terms are found in a
+# query with one linear Aho-Corasick pass over its words, no embedding or vector lookup needed.
+
+TOKEN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+# Dictionary entries phrased as questions, e.g. "What is a Deposition?"
+QUESTION_PREFIX = re.compile(r"^(?:what|who)\s+(?:is|are)\s+(?:an?\s+|the\s+)?", re.IGNORECASE)
+# Single-word entries that are everyday words and would match almost any question
+COMMON_WORDS = {
+    "back", "keep", "known", "use", "understand", "overcome", "wholly", "sober", "prudent",
+    "incidental", "diligent", "empower", "equalize", "spouse", "withdrawal", "cancellation",
+    "remedies", "qualifications", "veterans", "diction", "bait", "law", "act", "section", "right",
+    "court", "case", "rule", "order", "state", "person", "property", "contract",
+}
+
+
+def singularize(word):
+    """Crude plural folding; only has to map a term and its plural to the same key."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("sses", "xes", "ches", "shes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    return [singularize(token) for token in TOKEN.findall(text.lower())]
+
+
+def _term_variants(term):
+    """Yields the spellings an entry should match: "Anti-Lock Brake System (ABS)" -> both forms."""
+    term = QUESTION_PREFIX.sub("", term).strip(" ?")
+    alias = re.search(r"\(([^)]+)\)", term)
+    if alias:
+        yield alias.group(1)
+        term = re.sub(r"\s*\([^)]*\)", "", term)
+    yield term
+
+
+class GlossaryIndex:
+    """Aho-Corasick automaton over word tokens mapping defined terms to their definitions."""
+
+    def __init__(self, definitions, max_terms=3):
+        self.max_terms = max_terms
+        self.entries = []  # (display term, definition)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]  # per state: (entry index, term length in words)
+
+        for term, definition in definitions.items():
+            for variant in _term_variants(term):
+                tokens = tokenize(variant)
+                if not tokens or (len(tokens) == 1
+                                  and (tokens[0] in COMMON_WORDS or len(tokens[0]) < 3)):
+                    continue
+                self._add(tokens, len(self.entries))
+            self.entries.append((term, definition))
+        self._build_failure_links()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _add(self, tokens, entry):
+        state = 0
+        for token in tokens:
+            if token not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][token] = len(self._goto) - 1
+            state = self._goto[state][token]
+        self._output[state].append((entry, len(tokens)))
+
+    def _build_failure_links(self):
+        # Breadth-first, so a state's failure target is always finished before its children
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(token, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text):
+        """
+        Returns up to max_terms (term, definition) pairs for defined terms occurring in text.
+        Longer matches win over shorter ones they overlap with.
+        """
+        matches = []  # (start, end) word span and entry
+        state = 0
+        for position, token in enumerate(tokenize(text)):
+            while state and token not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(token, 0)
+            for entry, length in self._output[state]:
+                matches.append((position - length + 1, position + 1, entry))
+
+        chosen, taken, seen = [], set(), set()
+        for start, end, entry in sorted(matches, key=lambda m: (m[0] - m[1], m[0])):
+            span = set(range(start, end))
+            if entry in seen or span & taken:
+                continue
+            chosen.append((start, entry))
+            taken |= span
+            seen.add(entry)
+        chosen.sort()
+        return [self.entries[entry] for _, entry in chosen[:self.max_terms]]
+
+
+def load_glossary(definitions_dir, max_terms=3):
+    """Builds the index from every legal_definitions_*.json file in definitions_dir."""
+    definitions = {}
+    for path in sorted(glob.glob(os.path.join(definitions_dir, "legal_definitions_*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            definitions.update(json.load(f))
+    if not definitions:
+        logger.warning(f"No legal definitions found in {definitions_dir}; glossary disabled")
+    return GlossaryIndex(definitions, max_terms)
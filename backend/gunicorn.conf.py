@@ -0,0 +1,56 @@
+import gc
+import os
+
+# Production launch, from backend/:
+#   gunicorn -c gunicorn.conf.py
+# The app, the embedding model and the memory-mapped indexes are loaded once in the master and
+# shared copy-on-write by the forked workers. Nothing in the master starts a thread or opens a
+# connection before the fork (the SQLite conversation store only starts its writer on the first
+# write); each worker warms up and starts its own (embedding batcher, LLM health checks,
+# conversation writer). Settings below can be overridden in the environment.
+
+SERVER = os.getenv("SERVER", "flask")  # "flask" (threaded workers) or "asgi" (uvicorn workers)
+cpus = os.cpu_count() or 1
+workers = int(os.getenv("WEB_WORKERS", str(cpus)))
+
+# The cores are divided among the workers, so N workers embedding at once do not oversubscribe the
+# CPU. Set before torch is imported (in the master, by the preload), when OpenMP and MKL read them.
+torch_threads = int(os.getenv("TORCH_THREADS", "0")) or max(1, cpus // workers)
+os.environ["TORCH_THREADS"] = str(torch_threads)
+os.environ.setdefault("OMP_NUM_THREADS", str(torch_threads))
+os.environ.setdefault("MKL_NUM_THREADS", str(torch_threads))
+# The tokenizer's own thread pool does not survive a fork
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+# Every worker must see every conversation, and the in-memory store is per process
+if workers > 1:
+    os.environ.setdefault("CONVERSATION_STORE", "sqlite")
+# The flat index is shared through the page cache; Chroma loads its HNSW index into every worker
+os.environ.setdefault("VECTOR_BACKEND", "flat")
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+preload_app = True
+if SERVER == "asgi":
+    wsgi_app = "asgi_app:app"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "app:app"
+    worker_class = "gthread"
+    # A streamed answer holds its thread until the last token
+    threads = int(os.getenv("WEB_THREADS", "16"))
+graceful_timeout = 30
+
+
+def on_starting(server):
+    # preload_app has imported the app (and chatbot) by now; load what the workers will share
+    import chatbot
+    chatbot.preload()
+    # Objects created so far are never collected, so the garbage collector does not write to (and
+    # so copy) their pages in every worker
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # The ASGI app warms up from its lifespan handler
+    if SERVER != "asgi":
+        import chatbot
+        chatbot.start_warm_up()
@@ -0,0 +1,360 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import httpx
+import requests
+
+from metrics import LLM_ENDPOINT_REQUESTS
+
+# A pool of Ollama instances serving the same model. Each request goes to the healthy endpoint
+# with the fewest requests in flight, within that endpoint's concurrency limit (callers wait for
+# a free slot, up to LLM_QUEUE_TIMEOUT). A request that cannot connect, or gets a 5xx before any
+# output, is retried on another endpoint. After CIRCUIT_FAILURES consecutive failures an endpoint
+# is skipped for CIRCUIT_COOLDOWN seconds, then gets one trial request; a background thread
+# checks every endpoint's health every HEALTH_CHECK_INTERVAL seconds.
+
+# Requests in flight per endpoint: one number for all, or a comma-separated list in OLLAMA_URLS
+# order
+LLM_ENDPOINT_CONCURRENCY = os.getenv("LLM_ENDPOINT_CONCURRENCY", "4")
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+CIRCUIT_FAILURES = int(os.getenv("CIRCUIT_FAILURES", "3"))
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", "30"))
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "10"))
+HEALTH_CHECK_TIMEOUT = 2
+HEALTH_CHECK_PATH = "/api/version"
+
+logger = logging.getLogger(__name__)
+
+
+class EndpointUnavailable(Exception):
+    """No endpoint could take the request: all are down, or all stayed at their limit throughout."""
+
+
+class UpstreamError(Exception):
+    """An endpoint took the request but gave no answer: an error response, a bad body or no text."""
+
+
+class Endpoint:
+    def __init__(self, url, limit):
+        self.url = url.rstrip("/")
+        self.limit = limit
+        self.outstanding = 0
+        self.healthy = True  # until a health check says otherwise
+        self.failures = 0  # consecutive
+        self.open_until = 0.0  # circuit open (endpoint skipped) until this time
+        self.trial = False  # half-open: the one request let through after the cooldown is in flight
+        self.requests = 0
+
+    def state(self, now):
+        if self.failures < CIRCUIT_FAILURES:
+            return "closed"
+        return "open" if now < self.open_until else "half_open"
+
+    def capacity(self, now):
+        """Requests this endpoint can take right now."""
+        if not self.healthy:
+            return 0
+        state = self.state(now)
+        if state == "open":
+            return 0
+        if state == "half_open":
+            return 0 if self.trial or self.outstanding else 1
+        return self.limit - self.outstanding
+
+
+def parse_limits(value, count):
+    limits = [int(part) for part in str(value).split(",") if part.strip()]
+    if len(limits) == 1:
+        return limits * count
+    if len(limits) != count:
+        raise ValueError(f"LLM_ENDPOINT_CONCURRENCY has {len(limits)} limits for {count} endpoints")
+    return limits
+
+
+class LLMPool:
+    """
+    Least-outstanding-requests routing over several Ollama base URLs, with failover.
+
+    request() / request_async() are context managers around one HTTP call: the endpoint's slot is
+    held until the block exits, so a streamed answer counts as in flight until it has been read.
+    """
+
+    def __init__(self, urls, limits=LLM_ENDPOINT_CONCURRENCY, queue_timeout=LLM_QUEUE_TIMEOUT):
+        if not urls:
+            raise ValueError("LLMPool needs at least one endpoint")
+        self.endpoints = [Endpoint(url, limit)
+                          for url, limit in zip(urls, parse_limits(limits, len(urls)))]
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self._async_waiters = []  # (loop, future) of coroutines waiting for a free slot
+        self._health_thread = None
+        self._stop = threading.Event()
+        self.retries = 0
+        self.rejected = 0
+
+    # Slot bookkeeping
+
+    def _try_acquire(self, exclude):
+        """
+        The least-loaded endpoint with a free slot (and its slot), None if all are busy; raises if
+        all are down.
+        """
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e not in exclude]
+        free = [e for e in candidates if e.capacity(now) > 0]
+        if not free:
+            if not any(e.healthy and e.state(now) != "open" for e in candidates):
+                raise EndpointUnavailable("no healthy LLM endpoint")
+            return None
+        endpoint = min(free, key=lambda e: (e.outstanding / e.limit, e.requests))
+        if endpoint.state(now) == "half_open":
+            endpoint.trial = True
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        return endpoint
+
+    def acquire(self, exclude=(), queue_timeout=None):
+        """
+        Blocks until an endpoint (other than those in exclude) has a free slot, up to queue_timeout
+        seconds.
+        """
+        queue_timeout = self.queue_timeout if queue_timeout is None else queue_timeout
+        deadline = time.monotonic() + queue_timeout
+        with self._condition:
+            while True:
+                endpoint = self._try_acquire(exclude)
+                if endpoint is not None:
+                    return endpoint
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    raise EndpointUnavailable(f"all LLM endpoints busy for {queue_timeout:g}s")
+                # Bounded so an endpoint coming back after a cooldown is noticed
+                self._condition.wait(min(remaining, 1.0))
+
+    async def acquire_async(self, exclude=(), queue_timeout=None):
+        """acquire() for the event loop: waits on a future instead of blocking the thread."""
+        loop = asyncio.get_running_loop()
+        queue_timeout = self.queue_timeout if queue_timeout is None else queue_timeout
+        deadline = time.monotonic() + queue_timeout
+        while True:
+            with self._condition:
+                endpoint = self._try_acquire(exclude)
+                if endpoint is not None:
+                    return endpoint
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    raise EndpointUnavailable(f"all LLM endpoints busy for {queue_timeout:g}s")
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter[1]), min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._condition:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def release(self, endpoint, ok):
+        """
+        Frees the endpoint's slot; ok is True on success, False on failure, None if it says nothing
+        of the endpoint.
+        """
+        with self._condition:
+            endpoint.outstanding -= 1
+            endpoint.trial = False
+            if ok:
+                endpoint.failures = 0
+            elif ok is False:
+                endpoint.failures += 1
+                if endpoint.failures >= CIRCUIT_FAILURES:
+                    endpoint.open_until = time.monotonic() + CIRCUIT_COOLDOWN
+                    if endpoint.failures == CIRCUIT_FAILURES:
+                        logger.warning(f"LLM endpoint {endpoint.url} failed {endpoint.failures} "
+                                       f"times; skipped for {CIRCUIT_COOLDOWN}s")
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+        if ok is not None:
+            LLM_ENDPOINT_REQUESTS.inc(endpoint=endpoint.url, outcome="ok" if ok else "failed")
+
+    # Requests with failover
+
+    @contextmanager
+    def request(self, session, path, queue_timeout=None, **kwargs):
+        """
+        session.post(endpoint + path, **kwargs), on another endpoint if one cannot be reached.
+
+        Raises:
+            EndpointUnavailable: if no endpoint was left to try, or none had a free slot within
+                queue_timeout
+            requests.exceptions.RequestException: if the endpoint failed otherwise
+        """
+        tried = []
+        while True:
+            try:
+                endpoint = self.acquire(tried, queue_timeout)
+            except EndpointUnavailable as e:
+                raise EndpointUnavailable(f"{e}{_tried(tried)}") from None
+            try:
+                response = session.post(endpoint.url + path, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                self._failed(endpoint, tried, e)
+                continue
+            except requests.exceptions.Timeout:
+                self.release(endpoint, None)  # usually the request's deadline, not the endpoint
+                raise
+            except requests.exceptions.RequestException:
+                self.release(endpoint, False)
+                raise
+            except BaseException:
+                self.release(endpoint, None)
+                raise
+            if response.status_code >= 500:
+                response.close()
+                self._failed(endpoint, tried, f"HTTP {response.status_code}")
+                continue
+            break
+
+        ok = False
+        try:
+            with response:
+                response.raise_for_status()
+                yield response
+            ok = True
+        except (GeneratorExit, TimeoutError, requests.exceptions.Timeout):
+            ok = None  # the caller stopped reading (client went away, or its deadline passed)
+            raise
+        except requests.exceptions.HTTPError:
+            ok = None  # a 4xx is the request's fault, not the endpoint's
+            raise
+        finally:
+            self.release(endpoint, ok)
+
+    @asynccontextmanager
+    async def request_async(self, client, path, stream=False, queue_timeout=None, **kwargs):
+        """
+        request() for an httpx.AsyncClient; stream=True reads the body lazily. Raises
+        EndpointUnavailable or httpx.HTTPError.
+        """
+        tried = []
+        while True:
+            try:
+                endpoint = await self.acquire_async(tried, queue_timeout)
+            except EndpointUnavailable as e:
+                raise EndpointUnavailable(f"{e}{_tried(tried)}") from None
+            try:
+                request = client.build_request("POST", endpoint.url + path, **kwargs)
+                response = await client.send(request, stream=stream)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as e:
+                self._failed(endpoint, tried, e)
+                continue
+            except httpx.TimeoutException:
+                self.release(endpoint, None)
+                raise
+            except httpx.HTTPError:
+                self.release(endpoint, False)
+                raise
+            except BaseException:
+                self.release(endpoint, None)
+                raise
+            if response.status_code >= 500:
+                await response.aclose()
+                self._failed(endpoint, tried, f"HTTP {response.status_code}")
+                continue
+            break
+
+        ok = False
+        try:
+            try:
+                response.raise_for_status()
+                yield response
+            finally:
+                await response.aclose()
+            ok = True
+        except (GeneratorExit, asyncio.CancelledError, TimeoutError, httpx.TimeoutException):
+            ok = None
+            raise
+        except httpx.HTTPStatusError:
+            ok = None
+            raise
+        finally:
+            self.release(endpoint, ok)
+
+    def _failed(self, endpoint, tried, error):
+        logger.warning(f"LLM endpoint {endpoint.url} failed: {error}; trying another")
+        tried.append(endpoint)
+        self.release(endpoint, False)
+        with self._condition:
+            self.retries += 1
+        LLM_ENDPOINT_REQUESTS.inc(endpoint=endpoint.url, outcome="retried")
+
+    # Health checks
+
+    def check_health(self, session=None):
+        """GETs every endpoint's HEALTH_CHECK_PATH once and records which ones answered."""
+        session = session or requests
+        for endpoint in self.endpoints:
+            try:
+                healthy = session.get(endpoint.url + HEALTH_CHECK_PATH,
+                                      timeout=HEALTH_CHECK_TIMEOUT).ok
+            except requests.exceptions.RequestException:
+                healthy = False
+            if healthy != endpoint.healthy:
+                state = "healthy" if healthy else "unhealthy"
+                logger.warning(f"LLM endpoint {endpoint.url} is {state}")
+            with self._condition:
+                endpoint.healthy = healthy
+                if healthy and endpoint.state(time.monotonic()) == "open":
+                    endpoint.open_until = 0.0  # up again: let the trial request through now
+                self._condition.notify_all()
+
+    def start_health_checks(self, interval=HEALTH_CHECK_INTERVAL):
+        """Checks the endpoints every interval seconds in a daemon thread (started only once)."""
+        if self._health_thread is not None or interval <= 0:
+            return
+
+        def run():
+            session = requests.Session()
+            while True:
+                self.check_health(session)
+                if self._stop.wait(interval):
+                    return
+
+        self._health_thread = threading.Thread(target=run, name="llm-health", daemon=True)
+        self._health_thread.start()
+
+    def stop_health_checks(self):
+        self._stop.set()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._condition:
+            return {
+                "endpoints": [{
+                    "url": e.url,
+                    "healthy": e.healthy,
+                    "circuit": e.state(now),
+                    "outstanding": e.outstanding,
+                    "limit": e.limit,
+                    "requests": e.requests,
+                } for e in self.endpoints],
+                "retries": self.retries,
+                "rejected": self.rejected,
+            }
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def _tried(endpoints):
+    return f" (tried {', '.join(e.url for e in endpoints)})" if endpoints else ""
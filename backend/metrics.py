@@ -0,0 +1,172 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-stage latency metrics in the Prometheus text format, with no client library: a handful of
+# histograms and counters is all the backend needs. Stage timings are also collected per request
+# (through a context variable) for the Server-Timing response header.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RATE_BUCKETS = (1, 2.5, 5, 10, 15, 20, 30, 40, 60, 80, 120, 200)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [count per bucket..., +Inf count], sum
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(counts), total)
+                            for key, (counts, total) in self._series.items())
+        for key, counts, total in series:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                bucket_labels = _format_labels({**labels, "le": le})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            labels = _format_labels(dict(zip(self.labelnames, key)))
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "legal_ai_stage_seconds",
+    "Time spent in each stage of answering: embedding, act_routing, vector_search, lexical_search, "
+    "citation_lookup, retrieval, sentence_embedding, context_compression, prompt_assembly, "
+    "llm_first_token, llm_generation.",
+    ["stage"]
+)
+REQUEST_SECONDS = Histogram(
+    "legal_ai_request_seconds", "End-to-end request time by endpoint.", ["endpoint"]
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "legal_ai_llm_tokens_per_second",
+    "Generation speed reported by Ollama (eval_count / eval_duration).",
+    buckets=RATE_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "legal_ai_llm_tokens_total", "Tokens processed by Ollama, by kind (prompt or completion).",
+    ["kind"]
+)
+LLM_ENDPOINT_REQUESTS = Counter(
+    "legal_ai_llm_endpoint_requests_total",
+    "Requests sent to each Ollama server, by outcome (ok, failed, retried).",
+    ["endpoint", "outcome"]
+)
+ADMISSION_REJECTED = Counter(
+    "legal_ai_admission_rejected_total",
+    "Requests turned away by admission control, by reason (queue_full, queue_timeout).", ["reason"]
+)
+REGISTRY = [STAGE_SECONDS, REQUEST_SECONDS, LLM_TOKENS_PER_SECOND, LLM_TOKENS,
+            LLM_ENDPOINT_REQUESTS, ADMISSION_REJECTED]
+
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request():
+    """Starts collecting stage timings for the current request; returns the dict they go into."""
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def current_timings():
+    return _request_timings.get()
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage):
+    """Times the enclosed block as one stage of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def observe_ollama(data):
+    """
+    Records the token counts and generation speed from an Ollama response (the final chunk when
+    streaming).
+    """
+    if data.get("prompt_eval_count"):
+        LLM_TOKENS.inc(data["prompt_eval_count"], kind="prompt")
+    if data.get("eval_count"):
+        LLM_TOKENS.inc(data["eval_count"], kind="completion")
+        if data.get("eval_duration"):
+            LLM_TOKENS_PER_SECOND.observe(data["eval_count"] / (data["eval_duration"] / 1e9))
+
+
+def server_timing(timings):
+    """Server-Timing header value for a request's stage timings, in milliseconds."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,244 @@
+import math
+import os
+import re
+
+# Assembles the LLM prompt within a fixed token budget, so prefill time does not grow with the
+# length of the question or of the conversation. Tokens are estimated from characters, which is
+# close enough for English legal text with Llama's tokenizer and needs no model files.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1536"))
+QUERY_MAX_TOKENS = int(os.getenv("QUERY_MAX_TOKENS", "256"))
+# History (rolling summary plus the most recent exchanges); what it leaves unused goes to context
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "384"))
+DEFINITION_MAX_TOKENS = int(os.getenv("DEFINITION_MAX_TOKENS", "96"))  # per defined term
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "160"))
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "4"))
+# Chat mode: earlier turns replayed verbatim as messages, within this many tokens
+CHAT_HISTORY_MAX_TOKENS = int(os.getenv("CHAT_HISTORY_MAX_TOKENS", "4096"))
+
+SYSTEM_PROMPT = ("You are an AI expert in Indian law. "
+                 "Use the legal documents provided to answer queries.")
+
+PROMPT_TEMPLATE = SYSTEM_PROMPT + """
+
+    Context:
+    {context}
+
+    {definitions}
+
+    {conversation_history}
+
+    Current Question: {query}
+    Answer:
+    """
+
+# One user message in chat mode; the history travels as earlier messages
+TURN_TEMPLATE = """Context:
+{context}
+
+{definitions}
+
+Question: {query}"""
+
+HISTORY_HEADER = "Previous conversation:\n"
+SUMMARY_HEADER = "Summary of earlier turns:\n"
+SENTENCE = re.compile(r"[^.!?\n]+[.!?]*")
+ELISION = " [...] "
+
+
+def count_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate(text, max_tokens):
+    """Cuts text to about max_tokens, at a word boundary."""
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= 4:
+        return ""
+    cut = text[:max_chars - 4]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut + " ..."
+
+
+def condense_query(query, max_tokens=QUERY_MAX_TOKENS):
+    """
+    Shrinks an oversized question to max_tokens: repeated sentences are dropped, then the middle
+    is elided, keeping the opening (usually the setup) and the end (usually the actual question).
+    """
+    query = re.sub(r"\s+", " ", query).strip()
+    if count_tokens(query) <= max_tokens:
+        return query
+
+    seen, sentences = set(), []
+    for sentence in SENTENCE.findall(query):
+        key = sentence.strip().lower()
+        if key and key not in seen:
+            seen.add(key)
+            sentences.append(sentence.strip())
+    query = " ".join(sentences)
+    if count_tokens(query) <= max_tokens:
+        return query
+
+    half = int((max_tokens * CHARS_PER_TOKEN - len(ELISION)) / 2)
+    head = query[:half].rsplit(" ", 1)[0]
+    tail = query[-half:].split(" ", 1)[-1]
+    return head + ELISION + tail
+
+
+def fold_into_summary(summary, exchange, max_tokens=SUMMARY_MAX_TOKENS):
+    """
+    Adds one exchange to a conversation's rolling summary: a line with the question and the first
+    sentence of the answer. Only the new line is computed; the oldest lines go when it is full.
+    """
+    answer = SENTENCE.search(exchange["assistant"])
+    line = "- Asked: {}; answered: {}".format(
+        truncate(re.sub(r"\s+", " ", exchange["user"]).strip(), 32),
+        truncate(answer.group(0).strip() if answer else "", 48)
+    )
+    lines = summary.splitlines() if summary else []
+    lines.append(line)
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def _render_exchange(exchange):
+    return f"User: {exchange['user']}\nAssistant: {exchange['assistant']}\n"
+
+
+def _fit_recent(exchanges, budget):
+    """
+    Returns (number of older exchanges left out, rendered recent exchanges newest first, tokens
+    used).
+    """
+    shown, used = [], 0
+    index = len(exchanges)
+    while index > 0:
+        rendered = _render_exchange(exchanges[index - 1])
+        if used + count_tokens(rendered) > budget:
+            break
+        shown.append(rendered)
+        used += count_tokens(rendered)
+        index -= 1
+    if exchanges and index == len(exchanges):
+        # Not even the latest exchange fits: show it cut down
+        rendered = truncate(_render_exchange(exchanges[-1]), budget - 1)
+        if rendered:
+            shown.append(rendered + "\n")
+            used += count_tokens(rendered) + 1
+        index -= 1
+    return index, shown, used
+
+
+def build_history(summary, exchanges, max_tokens=HISTORY_MAX_TOKENS):
+    """
+    Renders the conversation history within max_tokens: the summary of older turns, then as many
+    of the most recent exchanges as fit. Exchanges that do not fit are folded into the summary
+    instead; when not even the latest one fits, it is shown truncated.
+    """
+    if not summary and not exchanges:
+        return ""
+    budget = max_tokens - count_tokens(HISTORY_HEADER)
+    index, shown, used = _fit_recent(exchanges, budget)
+    if summary or index:
+        # Some turns only appear in the summary: keep a quarter of the budget for it
+        index, shown, used = _fit_recent(exchanges, budget - max_tokens // 4)
+    budget -= used
+
+    for exchange in exchanges[:index]:
+        summary = fold_into_summary(summary, exchange)
+    # The newest summary lines matter most
+    lines = summary.splitlines() if summary else []
+    while lines and count_tokens("\n".join(lines)) > budget - count_tokens(SUMMARY_HEADER):
+        lines.pop(0)
+    summary = "\n".join(lines)
+
+    parts = [HISTORY_HEADER]
+    if summary:
+        parts.append(SUMMARY_HEADER + summary + "\n")
+    parts.extend(reversed(shown))
+    return "".join(parts)
+
+
+def build_definitions(defined_terms, max_tokens_each=DEFINITION_MAX_TOKENS):
+    if not defined_terms:
+        return ""
+    return "Definitions:\n" + "\n".join(
+        f"- {term}: {truncate(meaning, max_tokens_each)}" for term, meaning in defined_terms
+    )
+
+
+def build_prompt(query, chunks, defined_terms=(), summary="", exchanges=(),
+                 budget=PROMPT_TOKEN_BUDGET):
+    """
+    Fills PROMPT_TEMPLATE within budget tokens. The query is condensed to QUERY_MAX_TOKENS and the
+    history to HISTORY_MAX_TOKENS first, then the retrieved chunks take what is left in rank order,
+    the last one that does not fit being truncated.
+    """
+    query = condense_query(query)
+    conversation_history = build_history(summary, list(exchanges))
+    definitions = build_definitions(defined_terms)
+
+    remaining = budget - count_tokens(PROMPT_TEMPLATE.format(
+        context="", definitions=definitions, conversation_history=conversation_history, query=query
+    ))
+    return PROMPT_TEMPLATE.format(
+        context=_fill_context(chunks, remaining), definitions=definitions,
+        conversation_history=conversation_history, query=query
+    )
+
+
+def _fill_context(chunks, budget):
+    """Joins chunks in rank order within budget tokens, truncating the first one that won't fit."""
+    included = []
+    for chunk in chunks:
+        cost = count_tokens(chunk) + 1
+        if cost > budget:
+            if budget > 32:
+                included.append(truncate(chunk, budget - 1))
+            break
+        included.append(chunk)
+        budget -= cost
+    return "\n".join(included)
+
+
+def build_turn_message(query, chunks, defined_terms=(), budget=PROMPT_TOKEN_BUDGET):
+    """The user message of a chat turn: context, definitions and question within budget tokens."""
+    query = condense_query(query)
+    definitions = build_definitions(defined_terms)
+    frame = TURN_TEMPLATE.format(context="", definitions=definitions, query=query)
+    context = _fill_context(chunks, budget - count_tokens(frame))
+    return TURN_TEMPLATE.format(context=context, definitions=definitions, query=query)
+
+
+def build_chat_messages(message, summary="", exchanges=(), history_budget=CHAT_HISTORY_MAX_TOKENS):
+    """
+    Messages for the chat API: a system prompt (with the summary of older turns), the earlier
+    exchanges exactly as they were sent, then the new user message.
+
+    Because earlier turns are replayed verbatim, each request extends the previous one and the
+    LLM server only has to process the new message. The prefix changes only when the history is
+    trimmed: by the conversation store, or here when the replay would exceed history_budget.
+    """
+    kept, used = 0, 0
+    for exchange in reversed(exchanges):
+        cost = (count_tokens(exchange.get("message", exchange["user"]))
+                + count_tokens(exchange["assistant"]))
+        if used + cost > history_budget:
+            break
+        used += cost
+        kept += 1
+    for exchange in exchanges[:len(exchanges) - kept]:
+        summary = fold_into_summary(summary, exchange)
+
+    system = SYSTEM_PROMPT
+    if summary:
+        system += "\n\n" + SUMMARY_HEADER + summary
+    messages = [{"role": "system", "content": system}]
+    for exchange in exchanges[len(exchanges) - kept:]:
+        messages.append({"role": "user", "content": exchange.get("message", exchange["user"])})
+        messages.append({"role": "assistant", "content": exchange["assistant"]})
+    messages.append({"role": "user", "content": message})
+    return messages
@@ -0,0 +1,134 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from queue import Queue, Empty
+
+
+def normalize_text(text):
+    """MiniLM's tokenizer is uncased and ignores extra whitespace, so these variants embed alike."""
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+class QueryEmbeddingCache:
+    """Thread-safe bounded LRU cache of query vectors keyed by normalized text."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key, vector):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class EmbeddingBatcher:
+    """
+    Dynamic micro-batcher: concurrent callers of embed() are gathered for up to `window`
+    seconds (or `max_batch` texts) and embedded in a single forward pass by `embed_fn`,
+    which takes a list of texts and returns a list of vectors.
+    """
+
+    def __init__(self, embed_fn, window=0.005, max_batch=32):
+        self.embed_fn = embed_fn
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        # A forked child does not inherit the worker thread; it starts its own on first use
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._queue = Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._start_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="embedding-batcher",
+                                                    daemon=True)
+                    self._worker.start()
+
+    def embed(self, text, timeout=None):
+        """
+        Returns text's vector. Raises TimeoutError if it is not ready within timeout seconds; the
+        text is then left out of the batch if that has not started yet.
+        """
+        if self.window <= 0:
+            return self.embed_fn([text])[0]
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError as e:
+            # Not the builtin TimeoutError before Python 3.11; callers get the builtin everywhere
+            future.cancel()
+            raise TimeoutError(f"query embedding not ready within {timeout:g}s") from e
+
+    def _collect(self):
+        """
+        Blocks for the first request, then gathers more until the window closes or the batch is
+        full.
+        """
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Callers that gave up while queued are dropped
+            batch = [(text, future) for text, future in self._collect()
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            # Identical texts in one batch are embedded once
+            unique_texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(unique_texts, self.embed_fn(unique_texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for text, future in batch:
+                future.set_result(vectors[text])
@@ -0,0 +1,250 @@
+import asyncio
+import contextvars
+import threading
+
+# Request coalescing: concurrent callers asking for the same key share one in-flight computation
+# instead of each running their own. Nothing is kept once the computation finishes; repeated
+# answers over time are the answer cache's job.
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Thread version: do(key, fn, *args) runs fn once for all concurrent callers with that key. A
+    caller that joined an ongoing call waits at most timeout seconds for it (then TimeoutError).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if leader:
+            try:
+                call.result = fn(*args)
+            except Exception as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+            return call.result
+
+        if not call.event.wait(timeout):
+            raise TimeoutError(f"shared call still running after {timeout:g}s")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        return {"calls": self.calls, "shared": self.shared}
+
+
+class AsyncSingleFlight:
+    """
+    Event-loop version: do(key, coroutine_fn, *args) awaits one shared task per key, each caller at
+    most its own timeout seconds. The task is cancelled once every caller has gone.
+    """
+
+    def __init__(self):
+        self._tasks = {}  # key -> [task, number of callers waiting for it]
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, fn, *args, timeout=None):
+        entry = self._tasks.get(key)
+        if entry is None:
+            entry = self._tasks[key] = [asyncio.ensure_future(fn(*args)), 0]
+            entry[0].add_done_callback(lambda _: self._forget(key, entry))
+            self.calls += 1
+        else:
+            self.shared += 1
+        entry[1] += 1
+        try:
+            # Unlike awaiting the task, wait() leaves it running when this caller times out or is
+            # cancelled: the computation the others are waiting for
+            done, _ = await asyncio.wait({entry[0]}, timeout=timeout)
+            if not done:
+                raise TimeoutError(f"shared call still running after {timeout:g}s")
+            return entry[0].result()
+        finally:
+            entry[1] -= 1
+            if not entry[1] and not entry[0].done():
+                # Everyone timed out or was cancelled: nobody needs the result any more
+                self._forget(key, entry)
+                entry[0].cancel()
+
+    def _forget(self, key, entry):
+        if self._tasks.get(key) is entry:
+            del self._tasks[key]
+
+    def stats(self):
+        return {"calls": self.calls, "shared": self.shared}
+
+
+class _Stream:
+    def __init__(self):
+        self.items = []
+        self.result = {}  # filled in by the source, e.g. metadata every subscriber needs
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.joined = False  # stop producing only once someone subscribed and everyone left
+        self.cond = None  # threading.Condition (thread version)
+        self.changed = None  # asyncio.Event replaced on every change (event-loop version)
+
+
+class StreamSingleFlight:
+    """
+    Fans one streamed computation out to every concurrent subscriber with the same key.
+
+    source(result) is iterated once, in a background thread; each subscriber gets every item from
+    the start, so late joiners catch up on what was already produced. When all subscribers have
+    gone, the source is closed (e.g. dropping the upstream connection).
+    """
+
+    def __init__(self):
+        self._streams = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def subscribe(self, key, source):
+        """Returns (iterator over the items, result dict), the dict complete once the items are."""
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None:
+                stream = self._streams[key] = _Stream()
+                stream.cond = threading.Condition()
+                self.calls += 1
+                # The source runs in the context of the subscriber that started it, like a task
+                threading.Thread(target=contextvars.copy_context().run,
+                                 args=(self._produce, key, stream, source),
+                                 daemon=True, name="stream-flight").start()
+            else:
+                self.shared += 1
+        return self._follow(stream), stream.result
+
+    def _produce(self, key, stream, source):
+        iterator = source(stream.result)
+        try:
+            for item in iterator:
+                with stream.cond:
+                    stream.items.append(item)
+                    stream.cond.notify_all()
+                    if stream.joined and not stream.subscribers:
+                        break
+        except Exception as e:
+            stream.error = e
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+            with self._lock:
+                del self._streams[key]
+            with stream.cond:
+                stream.done = True
+                stream.cond.notify_all()
+
+    def _follow(self, stream):
+        with stream.cond:
+            stream.subscribers += 1
+            stream.joined = True
+        position = 0
+        try:
+            while True:
+                with stream.cond:
+                    stream.cond.wait_for(lambda: len(stream.items) > position or stream.done)
+                    items, done = stream.items[position:], stream.done
+                position += len(items)
+                yield from items
+                if done:
+                    if stream.error is not None:
+                        raise stream.error
+                    return
+        finally:
+            with stream.cond:
+                stream.subscribers -= 1
+
+    def stats(self):
+        return {"calls": self.calls, "shared": self.shared}
+
+
+class AsyncStreamSingleFlight:
+    """Event-loop version of StreamSingleFlight; source(result) is an async iterator (a task)."""
+
+    def __init__(self):
+        self._streams = {}
+        self.calls = 0
+        self.shared = 0
+
+    def subscribe(self, key, source):
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = self._streams[key] = _Stream()
+            stream.changed = asyncio.Event()
+            self.calls += 1
+            asyncio.ensure_future(self._produce(key, stream, source))
+        else:
+            self.shared += 1
+        return self._follow(stream), stream.result
+
+    def _notify(self, stream):
+        stream.changed.set()
+        stream.changed = asyncio.Event()
+
+    async def _produce(self, key, stream, source):
+        iterator = source(stream.result)
+        try:
+            async for item in iterator:
+                stream.items.append(item)
+                self._notify(stream)
+                if stream.joined and not stream.subscribers:
+                    break
+        except Exception as e:
+            stream.error = e
+        finally:
+            await iterator.aclose()
+            del self._streams[key]
+            stream.done = True
+            self._notify(stream)
+
+    async def _follow(self, stream):
+        stream.subscribers += 1
+        stream.joined = True
+        position = 0
+        try:
+            while True:
+                if len(stream.items) == position and not stream.done:
+                    await stream.changed.wait()
+                    continue
+                items, done = stream.items[position:], stream.done
+                position += len(items)
+                for item in items:
+                    yield item
+                if done:
+                    if stream.error is not None:
+                        raise stream.error
+                    return
+        finally:
+            stream.subscribers -= 1
+
+    def stats(self):
+        return {"calls": self.calls, "shared": self.shared}
@@ -1,49 +1,1069 @@
+import argparse
+import contextvars
+import hashlib
+import itertools
+import json
 import os
-import torch # type: ignore
-from langchain_community.vectorstores import Chroma  # type: ignore # Updated import
-from langchain_huggingface import HuggingFaceEmbeddings  # type: ignore # Updated import
-from tqdm import tqdm  # type: ignore # Progress bar
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Sibling modules are importable whether this runs as a script, from backend/ or as
+# dataset.vector_database
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from query_embedding import QueryEmbeddingCache, EmbeddingBatcher, normalize_text
+from bm25_index import BM25Index, build_bm25_index, reciprocal_rank_fusion
+from citation_index import CitationIndex, canonical_act
+from act_index import ActIndex
+from flat_index import FlatIndex, write_flat_index
+from embedders import EMBEDDING_BACKENDS, drift_report, load_embedder
 
 # Ensure ChromaDB is always stored in /dataset/chroma_db
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))  # Get project root
-CHROMA_DB_PATH = os.path.join(BASE_DIR, "dataset", "chroma_db")
+CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", os.path.join(BASE_DIR, "dataset", "chroma_db"))
+# Touched whenever the index is rebuilt, so dependent caches know to invalidate
+INDEX_VERSION_FILE = os.path.join(CHROMA_DB_PATH, "index_version")
+# Lexical index over the same chunks, rebuilt by store_documents
+BM25_PATH = os.path.join(CHROMA_DB_PATH, "bm25")
+# (act, section) -> chunk IDs for citation queries, rebuilt by store_documents
+CITATIONS_PATH = os.path.join(CHROMA_DB_PATH, "citations.json")
+# Names, aliases and centroids of the acts in the store, for routing queries to them, rebuilt by
+# store_documents
+ACTS_PATH = os.path.join(CHROMA_DB_PATH, "acts")
+# Memory-mapped export of the Chroma vectors, written by export_flat_index
+FLAT_INDEX_PATH = os.path.join(CHROMA_DB_PATH, "flat")
+# Backend and model the stored vectors were computed with (torch and EMBEDDING_MODEL if missing)
+EMBEDDER_FILE = os.path.join(CHROMA_DB_PATH, "embedder.json")
+# Results of check_embedding_drift per backend
+EMBEDDING_DRIFT_FILE = os.path.join(CHROMA_DB_PATH, "embedding_drift.json")
+# Versioned snapshots of all of the above, each in SNAPSHOTS_PATH/<name> (see build_snapshot); the
+# one named in CURRENT_SNAPSHOT_FILE is served. Without that file CHROMA_DB_PATH itself is the only
+# index, updated in place.
+SNAPSHOTS_PATH = os.path.join(CHROMA_DB_PATH, "snapshots")
+CURRENT_SNAPSHOT_FILE = os.path.join(CHROMA_DB_PATH, "CURRENT")
+# Older snapshots kept besides the served one, to roll back to
+SNAPSHOTS_KEEP = int(os.getenv("SNAPSHOTS_KEEP", "2"))
+
+# torch, the embedding model and Chroma are loaded on first use (or by warm_up), not at import,
+# so importing this module stays cheap for tests, CLI tools and the Flask reloader
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# "torch", "int8" or "onnx", see embedders.py; a backend other than the one the corpus was embedded
+# with should pass check_embedding_drift first
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH",
+                                os.path.join(BASE_DIR, "dataset", "onnx_embedder"))
+# Torch (or ONNX Runtime) intra-op threads (0 keeps the default of one per core); with several
+# worker processes each should get its share of the cores, see backend/gunicorn.conf.py
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0"))
+
+# HNSW parameters of the Chroma collection ("hnsw:M", "hnsw:construction_ef", "hnsw:search_ef",
+# "hnsw:space"). They are fixed when the collection is created, so changing them means rebuilding
+# the store; unset ones keep Chroma's defaults. benchmarks/retrieval_recall.py measures the
+# trade-off.
+HNSW_PARAMS = {
+    key: cast(os.environ[env])
+    for key, env, cast in [
+        ("hnsw:space", "HNSW_SPACE", str),
+        ("hnsw:M", "HNSW_M", int),
+        ("hnsw:construction_ef", "HNSW_CONSTRUCTION_EF", int),
+        ("hnsw:search_ef", "HNSW_SEARCH_EF", int),
+    ]
+    if os.getenv(env)
+}
+# The collection store_documents writes to (LangChain's default name)
+CHROMA_COLLECTION = "langchain"
+
+# Seconds spent in each startup step, reported by /ready
+startup_timings = {}
+# "not_loaded", "loading", "ready" or "error: ..." per lazily created component
+_component_states = {"embeddings": "not_loaded", "vector_store": "not_loaded"}
+_embeddings = None
+_db = None
+_embeddings_lock = threading.Lock()
+_db_lock = threading.Lock()
+
+def _timed(step, start):
+    startup_timings[step] = round(time.perf_counter() - start, 3)
+
+# Called as timing_hook(stage, seconds) after each retrieval stage; the backend points it at its
+# metrics
+timing_hook = None
+
+def set_timing_hook(hook):
+    global timing_hook
+    timing_hook = hook
+
+# Called as deadline_hook() before embedding: the seconds the current request has left (None for no
+# limit), raising once its deadline has passed; the backend points it at its admission control
+deadline_hook = None
+
+def set_deadline_hook(hook):
+    global deadline_hook
+    deadline_hook = hook
+
+def _time_left():
+    return deadline_hook() if deadline_hook is not None else None
+
+@contextmanager
+def _stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timing_hook is not None:
+            timing_hook(name, time.perf_counter() - start)
+
+def get_embeddings():
+    """
+    Returns the EMBEDDING_BACKEND embedder, importing its runtime and loading the model on the first
+    call.
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                _component_states["embeddings"] = "loading"
+                try:
+                    start = time.perf_counter()
+                    embeddings = load_embedder(EMBEDDING_BACKEND, EMBEDDING_MODEL, TORCH_THREADS,
+                                               EMBEDDING_ONNX_PATH)
+                    _timed("load_embedding_model", start)
+                except Exception as e:
+                    _component_states["embeddings"] = f"error: {e}"
+                    raise
+                _warn_if_unchecked()
+                _embeddings = embeddings
+                _component_states["embeddings"] = "ready"
+    return _embeddings
+
+def use_embeddings(embeddings):
+    """Replaces the embedding model, e.g. with the deterministic stub used by the benchmarks."""
+    global _embeddings
+    with _embeddings_lock:
+        _embeddings = embeddings
+        _component_states["embeddings"] = "ready"
+    query_cache.clear()
+
+def _read_json(path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+def corpus_embedder(index_path=CHROMA_DB_PATH):
+    """{"backend", "model"} the vectors stored in index_path were computed with."""
+    return _read_json(os.path.join(index_path, "embedder.json"),
+                      {"backend": "torch", "model": EMBEDDING_MODEL})
 
-# Check if GPU is available
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"✅ Using device: {DEVICE}")
+def _current_embedder():
+    return {"backend": EMBEDDING_BACKEND, "model": EMBEDDING_MODEL}
 
-# Initialize embeddings with GPU support
-embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2",  
-    model_kwargs={"device": DEVICE}  # Enable GPU usage
+def _record_embedder():
+    with open(EMBEDDER_FILE, "w", encoding="utf-8") as f:
+        json.dump(_current_embedder(), f)
+
+def _warn_if_unchecked():
+    """Warns when queries are embedded differently from the corpus without a passing drift check."""
+    path = current_snapshot().path
+    corpus = corpus_embedder(path)
+    if not os.path.isdir(path) or corpus == _current_embedder():
+        return
+    report = _read_json(os.path.join(path, "embedding_drift.json"), {}).get(EMBEDDING_BACKEND)
+    if report is None or report["model"] != EMBEDDING_MODEL or report["corpus_embedder"] != corpus:
+        print(f"⚠️ The corpus was embedded with {corpus} but queries use {EMBEDDING_BACKEND}, "
+              f"which has not been checked: "
+              f"python vector_database.py --check-drift {EMBEDDING_BACKEND}")
+    elif report["reembed_required"]:
+        print(f"⚠️ Queries embedded with {EMBEDDING_BACKEND} drift too far from the corpus "
+              f"vectors; re-embed it with "
+              f"EMBEDDING_BACKEND={EMBEDDING_BACKEND} python vector_database.py --reembed")
+
+def _hnsw_mismatch(metadata):
+    """The HNSW_PARAMS a collection was not created with: {key: (wanted, stored or None)}."""
+    metadata = metadata or {}
+    return {key: (value, metadata.get(key))
+            for key, value in HNSW_PARAMS.items() if metadata.get(key) != value}
+
+def _open_chroma(path):
+    embeddings = get_embeddings()
+    _component_states["vector_store"] = "loading"
+    try:
+        start = time.perf_counter()
+        import chromadb  # type: ignore
+        from langchain_community.vectorstores import Chroma  # type: ignore
+        client = chromadb.PersistentClient(path=path)
+        # Chroma ignores (or, depending on the version, rejects or merely records) the metadata of
+        # an existing collection, so HNSW_PARAMS are only passed when the collection is created
+        names = [getattr(collection, "name", collection)
+                 for collection in client.list_collections()]
+        exists = CHROMA_COLLECTION in names
+        db = Chroma(collection_name=CHROMA_COLLECTION, client=client, persist_directory=path,
+                    embedding_function=embeddings,
+                    collection_metadata=None if exists else HNSW_PARAMS or None)
+        _timed("open_chroma", start)
+    except Exception as e:
+        _component_states["vector_store"] = f"error: {e}"
+        raise
+    mismatch = _hnsw_mismatch(get_collection(db).metadata) if exists else {}
+    if mismatch:
+        print(f"⚠️ The Chroma collection in {path} was built with other HNSW parameters ("
+              + ", ".join(f"{key}: {stored} instead of {wanted}"
+                          for key, (wanted, stored) in mismatch.items())
+              + "); they are fixed at creation, so delete the store or build a --snapshot "
+              + "to apply them")
+    _component_states["vector_store"] = "ready"
+    return db
+
+def get_db():
+    """
+    Returns the Chroma store in CHROMA_DB_PATH (the one store_documents writes to), opening it on
+    the first call.
+    """
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                _db = _open_chroma(CHROMA_DB_PATH)
+    return _db
+
+def get_collection(db=None):
+    """
+    Returns the chromadb collection behind db (default: get_db()). Vectors are written and chunks
+    counted through it, as the LangChain wrapper has no upsert, update or count and its add_texts
+    would embed the texts again; this is the only place that reaches into the wrapper.
+    """
+    return (get_db() if db is None else db)._collection
+
+# Repeat queries skip the embedding model; concurrent misses share one forward pass
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))  # 0 disables batching
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+
+query_cache = QueryEmbeddingCache(QUERY_CACHE_SIZE)
+embedding_batcher = EmbeddingBatcher(
+    lambda texts: get_embeddings().embed_documents(texts), window=EMBED_BATCH_WINDOW_MS / 1000,
+    max_batch=EMBED_MAX_BATCH
 )
 
-# Create ChromaDB in the correct location
-db = Chroma(persist_directory=CHROMA_DB_PATH, embedding_function=embeddings)
+# "hybrid" fuses BM25 and dense results with reciprocal rank fusion (falls back to dense when
+# no BM25 index has been built); "dense" is embedding similarity only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Candidates taken from each retriever before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
 
-# Function to add documents to DB with progress tracking
-def store_documents():
-    dataset_path = os.path.join(BASE_DIR, "dataset", "legal_chunks.txt")
-    
+# Which acts' chunks a query searches when search_documents is not given any: "keyword" searches
+# only the acts the question names ("... under the Hindu Marriage Act", "IPC") and every act
+# otherwise; "centroid" also sends other questions to the acts whose mean chunk vector is closest
+# to the query (at most ACT_ROUTING_MAX_ACTS, those within ACT_ROUTING_MARGIN of the best, if it
+# scores at least ACT_ROUTING_MIN_SCORE); "off" always searches every act
+ACT_ROUTING = os.getenv("ACT_ROUTING", "keyword")
+ACT_ROUTING_MAX_ACTS = int(os.getenv("ACT_ROUTING_MAX_ACTS", "2"))
+ACT_ROUTING_MARGIN = float(os.getenv("ACT_ROUTING_MARGIN", "0.05"))
+ACT_ROUTING_MIN_SCORE = float(os.getenv("ACT_ROUTING_MIN_SCORE", "0.3"))
+
+# "chroma" searches the Chroma store; "flat" scans the memory-mapped export (falls back to Chroma
+# when it has not been exported)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+# Candidates per result re-scored with full-precision vectors in the flat backend (0 disables)
+FLAT_RESCORE_FACTOR = int(os.getenv("FLAT_RESCORE_FACTOR", "4"))
+
+retrieval_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval")
+
+class IndexSnapshot:
+    """
+    One version of the index: a directory laid out like CHROMA_DB_PATH, whose Chroma store and BM25,
+    citation, act and flat indexes are opened on first use. A search pins the served snapshot once
+    and uses it throughout, so swapping in a new one never mixes two versions in one answer; the
+    replaced snapshot releases its memory-mapped indexes once the last search on it is done.
+    """
+
+    def __init__(self, path, version, name=None):
+        self.path = path
+        self.version = version
+        self.name = name  # None for the in-place index in CHROMA_DB_PATH
+        self._opened = {}
+        self._db = None
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._users = 0  # searches pinning this snapshot
+        self._retired = False
+
+    def _get(self, key, marker, loader):
+        """The index `key`, loaded on the first call (None if its marker file does not exist)."""
+        if key not in self._opened:
+            with self._lock:
+                if key not in self._opened:
+                    exists = os.path.exists(os.path.join(self.path, marker))
+                    path = os.path.join(self.path, marker.split("/")[0])
+                    self._opened[key] = loader(path) if exists else None
+        return self._opened[key]
+
+    def bm25(self):
+        return self._get("bm25", "bm25/vocab.json", BM25Index)
+
+    def citations(self):
+        return self._get("citations", "citations.json", CitationIndex.load)
+
+    def acts(self):
+        return self._get("acts", "acts/acts.json", ActIndex.load)
+
+    def flat(self):
+        return self._get("flat", "flat/meta.json",
+                         lambda path: FlatIndex(path, rescore_factor=max(FLAT_RESCORE_FACTOR, 1)))
+
+    def has_flat(self):
+        return os.path.exists(os.path.join(self.path, "flat", "meta.json"))
+
+    def db(self):
+        if self.path == CHROMA_DB_PATH:
+            return get_db()
+        if self._db is None:
+            with self._db_lock:
+                if self._db is None:
+                    self._db = _open_chroma(self.path)
+        return self._db
+
+    def store_opened(self):
+        return (_db if self.path == CHROMA_DB_PATH else self._db) is not None
+
+    def open(self, store=True):
+        """Opens every index; the Chroma store too if store is set and searches will need it."""
+        flat = self.flat() if VECTOR_BACKEND == "flat" else None
+        if flat is None and store:
+            self.db()
+        self.bm25()
+        self.citations()
+        self.acts()
+
+    def enter(self):
+        with self._lock:
+            self._users += 1
+
+    def leave(self):
+        with self._lock:
+            self._users -= 1
+            drained = self._retired and not self._users
+        if drained:
+            self.close()
+
+    def retire(self):
+        """Marks the snapshot as no longer served: it is closed once no search pins it."""
+        with self._lock:
+            self._retired = True
+            drained = not self._users
+        if drained:
+            self.close()
+
+    def close(self):
+        """Unmaps the BM25 and flat indexes and closes their files (they reopen if used again)."""
+        with self._lock:
+            opened, self._opened = self._opened, {}
+            self._db = None
+        for index in opened.values():
+            if hasattr(index, "close"):
+                index.close()
+
+# The served snapshot, and how many times reload_index has replaced it
+_snapshot = None
+_snapshot_lock = threading.Lock()
+_reload_lock = threading.Lock()
+index_reloads = 0
+
+def _read_pointer():
+    """(directory, version, snapshot name) of the index that should be served."""
+    try:
+        with open(CURRENT_SNAPSHOT_FILE, "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        name = ""
+    if name:
+        return os.path.join(SNAPSHOTS_PATH, name), name, name
+    try:
+        version = os.stat(INDEX_VERSION_FILE).st_mtime_ns
+    except FileNotFoundError:
+        version = None
+    return CHROMA_DB_PATH, version, None
+
+def current_snapshot():
+    """
+    The index snapshot queries are answered from: opened on the first call, replaced by
+    reload_index.
+    """
+    global _snapshot
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = IndexSnapshot(*_read_pointer())
+    return _snapshot
+
+@contextmanager
+def pinned_snapshot(snapshot=None):
+    """
+    The served snapshot (or the given one), kept open until the block ends even if reload_index
+    swaps in another one meanwhile.
+    """
+    if snapshot is None:
+        current_snapshot()
+        with _snapshot_lock:
+            snapshot = _snapshot
+            snapshot.enter()
+    else:
+        snapshot.enter()
+    try:
+        yield snapshot
+    finally:
+        snapshot.leave()
+
+def reload_index():
+    """
+    Switches to the snapshot CURRENT_SNAPSHOT_FILE names (or to the in-place index, if it was
+    rebuilt) when it is not the one being served. The new snapshot's indexes are opened and a search
+    is run on it while queries are still answered from the old one; only then is it swapped in,
+    which also empties the answer cache (keyed on index_version). Returns True if it switched. If
+    the new snapshot cannot be opened the error is raised and the old one stays in service.
+    """
+    global _snapshot, index_reloads
+    with _reload_lock:
+        path, version, name = _read_pointer()
+        served = current_snapshot()
+        if (path, version) == (served.path, served.version):
+            return False
+        start = time.perf_counter()
+        snapshot = IndexSnapshot(path, version, name)
+        snapshot.open()
+        search_documents("warm up", k=1, snapshot=snapshot)
+        with _snapshot_lock:
+            _snapshot = snapshot
+        served.retire()
+        index_reloads += 1
+        _timed("reload_index", start)
+    return True
+
+def _mark_rebuilt():
+    """
+    Marks the in-place index as rebuilt: this process serves the new version now, servers at their
+    next reload_index.
+    """
+    with open(INDEX_VERSION_FILE, "w", encoding="utf-8") as f:
+        f.write(str(time.time()))
+    if _snapshot is not None and _snapshot.path == CHROMA_DB_PATH:
+        reload_index()
+
+def list_snapshots():
+    """Names of the complete snapshots in SNAPSHOTS_PATH, oldest first."""
+    if not os.path.isdir(SNAPSHOTS_PATH):
+        return []
+    return sorted(name for name in os.listdir(SNAPSHOTS_PATH)
+                  if not name.endswith(".tmp")
+                  and os.path.isdir(os.path.join(SNAPSHOTS_PATH, name)))
+
+def activate_snapshot(name):
+    """Makes snapshot name the served one; running servers switch to it at their next reload."""
+    if name not in list_snapshots():
+        raise ValueError(f"No index snapshot named {name!r} in {SNAPSHOTS_PATH}")
+    tmp_path = CURRENT_SNAPSHOT_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(tmp_path, CURRENT_SNAPSHOT_FILE)
+
+def build_snapshot(store_args=()):
+    """
+    Builds a new snapshot without touching the served one: copies the served index to
+    SNAPSHOTS_PATH/<name>.tmp, runs this script with store_args on the copy in a child process (its
+    CHROMA_DB_PATH pointing there), then renames it to SNAPSHOTS_PATH/<name>. Returns the name; it
+    is not served until activate_snapshot(name).
+    """
+    name = time.strftime("%Y%m%d-%H%M%S")
+    existing = set(list_snapshots())
+    suffix = 1
+    while name in existing:
+        name, suffix = f"{time.strftime('%Y%m%d-%H%M%S')}-{suffix}", suffix + 1
+    source = _read_pointer()[0]
+    tmp_path = os.path.join(SNAPSHOTS_PATH, name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    if os.path.isdir(source):
+        shutil.copytree(source, tmp_path,
+                        ignore=shutil.ignore_patterns("snapshots", "CURRENT", "CURRENT.tmp"))
+    else:
+        os.makedirs(tmp_path)
+    subprocess.run([sys.executable, os.path.abspath(__file__), *store_args],
+                   env=dict(os.environ, CHROMA_DB_PATH=tmp_path), check=True)
+    os.replace(tmp_path, os.path.join(SNAPSHOTS_PATH, name))
+    return name
+
+def prune_snapshots(keep=SNAPSHOTS_KEEP):
+    """Deletes all but the newest keep snapshots besides the served one."""
+    served = _read_pointer()[2]
+    older = [name for name in list_snapshots() if name != served]
+    for name in older[:max(len(older) - keep, 0)]:
+        shutil.rmtree(os.path.join(SNAPSHOTS_PATH, name), ignore_errors=True)
+
+def index_status():
+    """The served snapshot and the ones available, for /ready and the admin endpoint."""
+    snapshot = current_snapshot()
+    return {
+        "snapshot": snapshot.name,
+        "version": str(snapshot.version),
+        "reloads": index_reloads,
+        "snapshots": list_snapshots(),
+    }
+
+CHUNKS_PATH = os.path.join(BASE_DIR, "dataset", "legal_chunks.jsonl")
+# Progress of the last ingestion run, so an interrupted run resumes where it stopped
+CHECKPOINT_PATH = os.path.join(CHROMA_DB_PATH, "ingest_checkpoint.json")
+
+def chunk_id(text):
+    """Content-hash ID of a chunk; storing the same text twice is a no-op."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def chunk_metadata(record):
+    """Chroma metadata for a chunk record from chunk_data.py (values must be scalars)."""
+    return {
+        "law": record.get("law") or "",
+        "act": canonical_act(record["law"]) if record.get("law") else "",
+        "section": record.get("section") or "",
+        "sections": ",".join(record.get("sections") or []),
+        "start": record.get("start", -1),
+        "end": record.get("end", -1)
+    }
+
+def _act_of(metadata):
+    """The chunk's act key; stores built before the "act" metadata only have the law's name."""
+    metadata = metadata or {}
+    return metadata.get("act") or (canonical_act(metadata["law"]) if metadata.get("law") else "")
+
+def _pages(db, include, batch_size):
+    """Every stored chunk, as the page dicts Chroma's get returns, batch_size at a time."""
+    offset = 0
+    while True:
+        page = db.get(include=include, limit=batch_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield page
+        offset += len(page["ids"])
+
+def iter_chunks(dataset_path=CHUNKS_PATH):
+    """
+    Streams chunk records ({"text": ..., plus law/section metadata}) from the chunks file:
+    JSON lines as written by chunk_data.py, or the older plain-text format separated by blank lines.
+    """
     with open(dataset_path, "r", encoding="utf-8") as f:
-        legal_chunks = [line.strip() for line in f.readlines() if line.strip()]
-    
-    print(f"✅ Found {len(legal_chunks)} legal documents. Storing in ChromaDB...")
+        if dataset_path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        lines = []
+        for line in f:
+            if line.strip():
+                lines.append(line.rstrip("\n"))
+            elif lines:
+                yield {"text": "\n".join(lines).strip()}
+                lines = []
+        if lines:
+            yield {"text": "\n".join(lines).strip()}
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def _load_checkpoint(dataset_path):
+    """Returns how many chunks of this exact file (same size and mtime) were already stored."""
+    stat = os.stat(dataset_path)
+    try:
+        with open(CHECKPOINT_PATH, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return 0
+    if (checkpoint.get("source") == os.path.abspath(dataset_path)
+            and checkpoint.get("size") == stat.st_size
+            and checkpoint.get("mtime_ns") == stat.st_mtime_ns):
+        return checkpoint.get("chunks_done", 0)
+    return 0
+
+def _save_checkpoint(dataset_path, chunks_done):
+    stat = os.stat(dataset_path)
+    tmp_path = CHECKPOINT_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "source": os.path.abspath(dataset_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "chunks_done": chunks_done
+        }, f)
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
+def _new_chunks(batch, in_flight=()):
+    """Drops duplicates within the batch, chunks still being written and chunks already stored."""
+    unique = {chunk_id(record["text"]): record for record in batch}
+    existing = set(get_db().get(ids=list(unique), include=[])["ids"])
+    ids = [id_ for id_ in unique if id_ not in existing and id_ not in in_flight]
+    return ids, [unique[id_] for id_ in ids]
 
-    # Use tqdm for progress bar
-    batch_size = 500  # Store in chunks of 500 for efficiency
-    for i in tqdm(range(0, len(legal_chunks), batch_size), desc="Processing", unit="batch"):
-        batch = legal_chunks[i:i + batch_size]
-        db.add_texts(batch)
+# Function to add documents to DB with progress tracking
+def store_documents(dataset_path=CHUNKS_PATH, batch_size=500, prune=False):
+    """
+    Streams chunks into ChromaDB. Safe to re-run: chunks are keyed by content hash and only
+    new ones are embedded, progress is checkpointed after every batch, and the next batch is
+    embedded while the current one is being written.
     
-    db.persist()
+    Args:
+        dataset_path: Chunks file written by chunk_data.py (.jsonl, or legacy blank-line
+            separated .txt)
+        batch_size: Chunks embedded and written per batch
+        prune: Also delete stored chunks that are no longer in the file (reads the whole file)
+
+    Returns:
+        (added, removed): how many chunks were stored and deleted
+    """
+    from tqdm import tqdm  # type: ignore # Progress bar
+
+    os.makedirs(CHROMA_DB_PATH, exist_ok=True)
+    db = get_db()
+    collection = get_collection(db)
+    embeddings = get_embeddings()
+    if corpus_embedder() != _current_embedder() and collection.count():
+        # New chunks must be embedded like the stored ones
+        raise RuntimeError(f"The store was embedded with {corpus_embedder()}, "
+                           f"not {_current_embedder()}; use the same EMBEDDING_BACKEND "
+                           f"or add --reembed to re-embed the store first")
+    skip = 0 if prune else _load_checkpoint(dataset_path)
+    if skip:
+        print(f"⏩ Resuming after {skip} chunks already stored")
+
+    seen_ids = set()
+    chunks_done = skip
+    added = 0
+    pending = None  # (chunk count, ids, records, embedding future) of the batch being embedded
+
+    def write(batch_len, ids, records, future):
+        nonlocal chunks_done, added
+        if ids:
+            collection.upsert(
+                ids=ids,
+                embeddings=future.result(),
+                documents=[record["text"] for record in records],
+                metadatas=[chunk_metadata(record) for record in records]
+            )
+            added += len(ids)
+        chunks_done += batch_len
+        _save_checkpoint(dataset_path, chunks_done)
+        progress.update(batch_len)
+
+    print(f"✅ Storing legal documents from {dataset_path} in ChromaDB...")
+    chunks = itertools.islice(iter_chunks(dataset_path), skip, None)
+    with ThreadPoolExecutor(max_workers=1) as embedder, \
+            tqdm(desc="Processing", unit="chunk", initial=skip) as progress:
+        for batch in _batched(chunks, batch_size):
+            if prune:
+                seen_ids.update(chunk_id(record["text"]) for record in batch)
+            ids, records = _new_chunks(batch, set(pending[1]) if pending else ())
+            future = None
+            if records:
+                future = embedder.submit(embeddings.embed_documents,
+                                         [record["text"] for record in records])
+            # Write the previous batch while this one is being embedded
+            if pending:
+                write(*pending)
+            pending = (len(batch), ids, records, future)
+        if pending:
+            write(*pending)
+
+    removed = 0
+    if prune:
+        stale = [id_ for id_ in db.get(include=[])["ids"] if id_ not in seen_ids]
+        for batch in _batched(stale, batch_size):
+            db.delete(ids=batch)
+        removed = len(stale)
+
+    if added or removed or not os.path.exists(BM25_PATH) or not os.path.exists(ACTS_PATH):
+        db.persist()
+        _record_embedder()
+        build_act_index(batch_size)
+        build_lexical_index(batch_size)
+        build_citation_index(batch_size)
+        # Keep an existing flat export in sync with the store
+        flat_meta = os.path.join(FLAT_INDEX_PATH, "meta.json")
+        if os.path.exists(flat_meta):
+            with open(flat_meta, "r", encoding="utf-8") as f:
+                export_flat_index(json.load(f)["dtype"], batch_size)
+        _mark_rebuilt()
+    print(f"✅ Added {added} and removed {removed} chunks ({chunks_done} in file)")
     print(f"✅ Legal database stored successfully at {CHROMA_DB_PATH}")
+    return added, removed
+
+def build_act_index(batch_size=1000):
+    """
+    Builds the act index (names, aliases, centroids) from the chunks in ChromaDB, first adding the
+    "act" metadata to chunks stored before it existed.
+    """
+    db = get_db()
+
+    def chunks():
+        for page in _pages(db, ["embeddings", "metadatas"], batch_size):
+            untagged = [(id_, {**metadata, "act": _act_of(metadata)}) for id_, metadata
+                        in zip(page["ids"], page["metadatas"])
+                        if metadata and "act" not in metadata]
+            if untagged:
+                get_collection(db).update(ids=[id_ for id_, _ in untagged],
+                                          metadatas=[m for _, m in untagged])
+            for metadata, vector in zip(page["metadatas"], page["embeddings"]):
+                yield {**(metadata or {}), "act": _act_of(metadata)}, vector
+
+    acts = ActIndex.build(chunks())
+    acts.save(ACTS_PATH)
+    print(f"✅ Act index over {len(acts.acts)} acts stored at {ACTS_PATH}")
+
+def build_lexical_index(batch_size=1000):
+    """Builds the BM25 index from every chunk currently stored in ChromaDB."""
+    db = get_db()
+
+    def documents():
+        for page in _pages(db, ["documents", "metadatas"], batch_size):
+            for id_, text, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                yield id_, text, _act_of(metadata)
+
+    count = build_bm25_index(documents(), BM25_PATH)
+    print(f"✅ BM25 index over {count} chunks stored at {BM25_PATH}")
+
+def build_citation_index(batch_size=1000):
+    """Builds the (act, section) -> chunk index from the law/section metadata in ChromaDB."""
+    db = get_db()
+
+    def chunks():
+        for page in _pages(db, ["metadatas"], batch_size):
+            yield from zip(page["ids"], page["metadatas"])
+
+    citations = CitationIndex.build(chunks())
+    citations.save(CITATIONS_PATH)
+    sections = sum(len(s) for s in citations.table.values())
+    print(f"✅ Citation index over {sections} sections stored at {CITATIONS_PATH}")
+
+def export_flat_index(dtype="int8", batch_size=1000):
+    """Exports every stored chunk and its vector to the memory-mapped flat index."""
+    db = get_db()
+    count = get_collection(db).count()
+
+    def records():
+        for page in _pages(db, ["embeddings", "documents", "metadatas"], batch_size):
+            for id_, vector, text, metadata in zip(page["ids"], page["embeddings"],
+                                                   page["documents"], page["metadatas"]):
+                yield id_, vector, text, _act_of(metadata)
+
+    dim = len(get_embeddings().embed_query("dimension probe"))
+    write_flat_index(records(), count, dim, FLAT_INDEX_PATH, dtype=dtype)
+    _mark_rebuilt()
+    print(f"✅ Flat {dtype} index over {count} chunks exported to {FLAT_INDEX_PATH}")
+
+def reembed_documents(batch_size=500):
+    """
+    Re-computes the vector of every stored chunk with the current EMBEDDING_BACKEND, in place, for
+    when check_embedding_drift says its queries cannot be searched against the existing vectors.
+    """
+    from tqdm import tqdm  # type: ignore
+
+    db = get_db()
+    embeddings = get_embeddings()
+    collection = get_collection(db)
+    ids = collection.get(include=[])["ids"]
+    with tqdm(desc="Re-embedding", unit="chunk", total=len(ids)) as progress:
+        for batch in _batched(ids, batch_size):
+            page = collection.get(ids=batch, include=["documents"])
+            collection.update(ids=page["ids"],
+                              embeddings=embeddings.embed_documents(page["documents"]))
+            progress.update(len(batch))
+    db.persist()
+    _record_embedder()
+    flat_meta = os.path.join(FLAT_INDEX_PATH, "meta.json")
+    if os.path.exists(flat_meta):
+        with open(flat_meta, "r", encoding="utf-8") as f:
+            export_flat_index(json.load(f)["dtype"], batch_size)
+    _mark_rebuilt()
+    print(f"✅ Re-embedded {len(ids)} chunks with {EMBEDDING_BACKEND}")
+
+def _corpus_sample(size, seed=0):
+    """Up to size random stored chunks: their texts and their stored vectors."""
+    rng = random.Random(seed)
+    flat = current_snapshot().flat()
+    if flat is not None and flat.full is not None:
+        rows = sorted(rng.sample(range(len(flat)), min(size, len(flat))))
+        return [flat.text(row) for row in rows], flat.full[rows]
+    db = current_snapshot().db()
+    ids = db.get(include=[])["ids"]
+    found = db.get(ids=rng.sample(ids, min(size, len(ids))), include=["embeddings", "documents"])
+    return found["documents"], found["embeddings"]
+
+def check_embedding_drift(backend, sample=500, k=10, embeddings=None):
+    """
+    Embeds a random sample of the stored chunks with backend (or the given embeddings) and compares
+    the vectors with the stored ones, see embedders.drift_report. The report is kept in
+    EMBEDDING_DRIFT_FILE, where get_embeddings looks before serving queries with that backend.
+    """
+    path = current_snapshot().path
+    texts, stored = _corpus_sample(sample)
+    if embeddings is None:
+        embeddings = load_embedder(backend, EMBEDDING_MODEL, TORCH_THREADS, EMBEDDING_ONNX_PATH)
+    start = time.perf_counter()
+    vectors = [vector for batch in _batched(texts, 64)
+               for vector in embeddings.embed_documents(batch)]
+    elapsed = time.perf_counter() - start
+    report = {"backend": backend, "model": EMBEDDING_MODEL,
+              "corpus_embedder": corpus_embedder(path), **drift_report(stored, vectors, k=k),
+              "ms_per_text": round(elapsed * 1000 / max(len(texts), 1), 3)}
+    drift_file = os.path.join(path, "embedding_drift.json")
+    reports = _read_json(drift_file, {})
+    reports[backend] = report
+    with open(drift_file, "w", encoding="utf-8") as f:
+        json.dump(reports, f, indent=2)
+    return report
+
+def index_version():
+    """
+    Version of the served index: its snapshot name, or when it was last rebuilt in place (None if
+    never marked).
+    """
+    return current_snapshot().version
+
+def embed_query(query):
+    """Returns the query vector, from the LRU cache when possible, else via the micro-batcher."""
+    key = normalize_text(query)
+    with _stage("embedding"):
+        vector = query_cache.get(key)
+        if vector is None:
+            # A request whose deadline passes while queued is dropped from the batch
+            vector = embedding_batcher.embed(query, timeout=_time_left())
+            query_cache.put(key, vector)
+    return vector
+
+def embed_texts(texts):
+    """Embeds a batch of texts (e.g. the sentences of the retrieved chunks) in one model call."""
+    _time_left()
+    with _stage("sentence_embedding"):
+        return get_embeddings().embed_documents(texts)
+
+def get_bm25_index():
+    """Returns the served BM25 index (None if it was never built)."""
+    return current_snapshot().bm25()
+
+def get_citation_index():
+    """Returns the served (act, section) citation index (None if it was never built)."""
+    return current_snapshot().citations()
+
+def get_act_index():
+    """Returns the served act index (None if it was never built)."""
+    return current_snapshot().acts()
+
+def _flat(snapshot):
+    return snapshot.flat() if VECTOR_BACKEND == "flat" else None
+
+def get_flat_index():
+    """The flat vector index when it is the selected backend and has been exported, else None."""
+    return _flat(current_snapshot())
+
+def lookup_citation(query, k=3, snapshot=None):
+    """
+    Returns the chunks of the provision cited in query ("Section 144 of CrPC", "IPC 420"),
+    fetched by ID without embedding the query, or [] when the query is not a known citation.
+    """
+    with pinned_snapshot(snapshot) as snapshot:
+        citations = snapshot.citations()
+        with _stage("citation_lookup"):
+            ids = citations.lookup(query)[:k] if citations is not None else []
+        if not ids:
+            return []
+        flat = _flat(snapshot)
+        if flat is not None:
+            return flat.texts_for_ids(ids)
+        found = snapshot.db().get(ids=ids, include=["documents"])
+    texts = dict(zip(found["ids"], found["documents"]))
+    return [texts[id_] for id_ in ids if id_ in texts]
+
+def is_citation_query(query):
+    """True when query cites a provision that lookup_citation can answer exactly."""
+    with pinned_snapshot() as snapshot:
+        citations = snapshot.citations()
+        return citations is not None and bool(citations.lookup(query))
+
+def route_query(query, snapshot=None):
+    """
+    The act keys whose chunks query should search, by ACT_ROUTING; [] means every act. In "centroid"
+    mode this embeds the query (the vector is cached for the search that follows).
+    """
+    with pinned_snapshot(snapshot) as snapshot:
+        acts = snapshot.acts()
+    if acts is None or ACT_ROUTING == "off":
+        return []
+    routed = acts.mentioned(query)
+    if routed or ACT_ROUTING != "centroid":
+        return routed
+    vector = embed_query(query)
+    with _stage("act_routing"):
+        return acts.nearest(vector, ACT_ROUTING_MAX_ACTS, ACT_ROUTING_MARGIN, ACT_ROUTING_MIN_SCORE)
+
+def _act_filter(acts):
+    return {"act": acts[0]} if len(acts) == 1 else {"act": {"$in": acts}}
+
+def _dense_search(snapshot, query, k, acts=()):
+    flat = _flat(snapshot)
+    vector = embed_query(query)
+    with _stage("vector_search"):
+        if flat is not None:
+            found = flat.search(vector, k, rescore=FLAT_RESCORE_FACTOR > 0, acts=acts)
+            return [text for _, text, _ in found]
+        results = snapshot.db().similarity_search_by_vector(
+            vector, k=k, filter=_act_filter(acts) if acts else None)
+        return [doc.page_content for doc in results]
+
+def _lexical_search(bm25, query, k, acts=()):
+    with _stage("lexical_search"):
+        return bm25.search(query, k, acts=acts)
+
+def search_documents(query, k=3, mode=None, acts=None, snapshot=None):
+    """
+    Retrieve the top k most relevant legal documents for a given query.
+    
+    In hybrid mode the BM25 and dense searches run in parallel and are merged with
+    reciprocal rank fusion, which helps with statute numbers and exact legal phrases.
+
+    Only the chunks of the given acts (names in any spelling, e.g. ["IPC"]) are searched; without
+    acts, route_query picks them from the query. Unknown act names are ignored.
+
+    Searches the served index snapshot, or the given one.
+    """
+    with pinned_snapshot(snapshot) as snapshot:
+        # Citations of a specific provision are answered by exact lookup
+        cited = lookup_citation(query, k, snapshot)
+        if cited:
+            return cited
+
+        if acts is None:
+            acts = route_query(query, snapshot)
+        else:
+            index = snapshot.acts()
+            acts = (index.resolve(acts) if index is not None
+                    else [canonical_act(act) for act in acts])
+
+        bm25 = snapshot.bm25() if (mode or RETRIEVAL_MODE) == "hybrid" else None
+        if bm25 is None:
+            return _dense_search(snapshot, query, k, acts)
+
+        candidates = max(k, HYBRID_CANDIDATES)
+        # Run in a copy of the caller's context so the timing hook still knows which request it is
+        lexical = retrieval_executor.submit(contextvars.copy_context().run, _lexical_search,
+                                            bm25, query, candidates, acts)
+        dense = _dense_search(snapshot, query, candidates, acts)
+        # Both sides are keyed by content hash: a store from before content-hash IDs keeps random
+        # ones
+        return reciprocal_rank_fusion([
+            [(chunk_id(text), text) for text in dense],
+            [(chunk_id(text), text) for _, text, _ in lexical.result()]
+        ], k=k)
+
+def component_status():
+    """State of each retrieval component, for the readiness probe."""
+    status = dict(_component_states)
+    snapshot = current_snapshot()
+    if VECTOR_BACKEND == "flat" and not snapshot.store_opened() and snapshot.has_flat():
+        # Searches are served from the flat export; Chroma is only opened for writes
+        status["vector_store"] = "not_needed"
+    return status
+
+def preload():
+    """
+    Loads what forked worker processes can share copy-on-write: the embedding model's weights and
+    the memory-mapped indexes. Runs no inference and opens no Chroma client, so no thread pool,
+    thread or SQLite connection is created before the fork; each worker still calls warm_up().
+    """
+    start = time.perf_counter()
+    get_embeddings()
+    snapshot = current_snapshot()
+    snapshot.open(store=False)
+    if _flat(snapshot) is None:
+        print("⚠️ No flat index exported: "
+              "every worker will open Chroma and load its own HNSW index")
+    _timed("preload_retrieval", start)
 
-def search_documents(query, k=3):
-    """Retrieve the top k most relevant legal documents for a given query."""
-    results = db.similarity_search(query, k=k)
-    return [doc.page_content for doc in results]
+def warm_up():
+    """
+    Loads the embedding model and the indexes and runs one dummy embedding and search, so the
+    first real query does not pay for model loading, CUDA initialization or cold page cache.
+    """
+    start = time.perf_counter()
+    get_embeddings()
+    current_snapshot().open()
+    embedding_batcher.embed("warm up")
+    search_documents("warm up", k=1)
+    _timed("warm_up_retrieval", start)
 
 if __name__ == "__main__":
-    store_documents()  # Run this script to store data initially
+    # Run this script to store data initially, and again after the corpus changes
+    parser = argparse.ArgumentParser(description="Store legal chunks in ChromaDB")
+    parser.add_argument("--chunks", default=CHUNKS_PATH,
+                        help="chunks file written by chunk_data.py")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--prune", action="store_true",
+                        help="delete stored chunks no longer in the file")
+    parser.add_argument("--export-flat", choices=["int8", "float16"],
+                        help="afterwards export the vectors to the memory-mapped flat index")
+    parser.add_argument("--check-drift", choices=EMBEDDING_BACKENDS, metavar="BACKEND",
+                        help="only compare BACKEND's vectors of --sample stored chunks "
+                             "with the stored ones")
+    parser.add_argument("--sample", type=int, default=500)
+    parser.add_argument("--reembed", action="store_true",
+                        help="first re-embed every stored chunk with EMBEDDING_BACKEND")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="do all of the above in a copy of the served index, "
+                             "saved as a new snapshot")
+    parser.add_argument("--activate", action="store_true",
+                        help="with --snapshot: serve the new snapshot "
+                             "(servers switch at their next reload)")
+    parser.add_argument("--use-snapshot", metavar="NAME",
+                        help="only serve snapshot NAME, e.g. to roll back")
+    parser.add_argument("--list-snapshots", action="store_true", help="only list the snapshots")
+    args = parser.parse_args()
+    if args.list_snapshots:
+        served = _read_pointer()[2]
+        for name in list_snapshots():
+            print(f"{name} (served)" if name == served else name)
+        sys.exit(0)
+    if args.use_snapshot:
+        activate_snapshot(args.use_snapshot)
+        print(f"✅ Serving index snapshot {args.use_snapshot}")
+        sys.exit(0)
+    if args.snapshot:
+        name = build_snapshot([arg for arg in sys.argv[1:]
+                               if arg not in ("--snapshot", "--activate")])
+        if args.activate:
+            activate_snapshot(name)
+        prune_snapshots()
+        print(f"✅ Index snapshot {name} built" + (" and activated" if args.activate else
+                                                  f"; serve it with --use-snapshot {name}"))
+        sys.exit(0)
+    if os.path.exists(CURRENT_SNAPSHOT_FILE):
+        if not args.check_drift:
+            parser.error("the index is served from snapshots: add --snapshot to build a new one")
+        # Drift is checked on the served snapshot, and recorded there
+        env = dict(os.environ, CHROMA_DB_PATH=_read_pointer()[0])
+        sys.exit(subprocess.run([sys.executable, os.path.abspath(__file__), *sys.argv[1:]],
+                                env=env).returncode)
+    if args.check_drift:
+        report = check_embedding_drift(args.check_drift, args.sample)
+        print(json.dumps(report, indent=2))
+        sys.exit(1 if report["reembed_required"] else 0)
+    if args.reembed:
+        reembed_documents(args.batch_size)
+    store_documents(args.chunks, args.batch_size, args.prune)
+    if args.export_flat:
+        export_flat_index(args.export_flat)
     
\ No newline at end of file
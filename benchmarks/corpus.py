@@ -0,0 +1,125 @@
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(ROOT, "dataset"))
+
+from act_index import ActIndex  # noqa: E402
+from bm25_index import build_bm25_index  # noqa: E402
+from chunk_data import chunk_legal_texts  # noqa: E402
+from citation_index import CitationIndex  # noqa: E402
+from flat_index import write_flat_index  # noqa: E402
+
+# Synthetic legal corpus in the format data_processing.py writes ("### {law}" then the text), and
+# an offline index over it in the layout vector_database.py reads from CHROMA_DB_PATH: BM25,
+# citations, acts and the flat vector export. Deterministic for a given seed.
+
+LAWS = ("Indian Penal Code", "Code of Criminal Procedure", "Indian Contract Act",
+        "Transfer of Property Act", "Consumer Protection Act", "Information Technology Act",
+        "Hindu Marriage Act", "Specific Relief Act")
+TOPICS = ("contract", "tenant", "landlord", "property", "cheating", "theft", "bail", "arrest",
+          "warrant", "marriage", "divorce", "maintenance", "consumer", "complaint", "evidence",
+          "witness", "offence", "punishment", "fine", "imprisonment", "agreement", "consideration",
+          "lease", "mortgage", "notice", "compensation", "injunction", "decree", "appeal",
+          "magistrate", "police", "investigation")
+FILLER = ("shall", "be", "liable", "to", "any", "person", "who", "the", "court", "may", "under",
+          "this", "section", "provided", "that", "in", "case", "of", "or", "with", "and", "such",
+          "as", "is")
+
+
+def synthetic_legal_text(laws=len(LAWS), sections=100, sentences=6, seed=0):
+    rng = random.Random(seed)
+    parts = []
+    for law in LAWS[:laws]:
+        parts.append(f"### {law}\n")
+        for number in range(1, sections + 1):
+            topic = rng.choice(TOPICS)
+            parts.append(f"Section {number}. {topic.capitalize()} provisions.\n")
+            for _ in range(sentences):
+                words = [rng.choice(FILLER if rng.random() < 0.7 else TOPICS)
+                         for _ in range(rng.randint(12, 28))]
+                words.insert(rng.randint(0, len(words)), topic)
+                parts.append(" ".join(words).capitalize() + ".\n")
+        parts.append("\n")
+    return "".join(parts)
+
+
+def write_corpus(path, **kwargs):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(synthetic_legal_text(**kwargs))
+    return path
+
+
+def sample_queries(records, count=50, seed=0):
+    """Questions built from the chunks' own words, so each has relevant chunks in the corpus."""
+    rng = random.Random(seed)
+    queries = []
+    for record in rng.sample(records, min(count, len(records))):
+        words = record["text"].split()
+        start = rng.randint(0, max(len(words) - 6, 0))
+        phrase = " ".join(words[start:start + 6]).strip(".")
+        queries.append(f"What does the law say about {phrase}?")
+    return queries
+
+
+def build_index(index_dir, records, embeddings, dtype="float16", batch_size=256):
+    """
+    Writes the BM25, citation, act and flat indexes for records (chunk records from chunk_data.py)
+    to index_dir, embedding the texts with embeddings; returns seconds spent per step.
+    """
+    # Reads CHROMA_DB_PATH at import; only helpers are used here
+    from vector_database import chunk_id, chunk_metadata
+
+    os.makedirs(index_dir, exist_ok=True)
+    ids = [chunk_id(record["text"]) for record in records]
+    metadatas = [chunk_metadata(record) for record in records]
+    timings = {}
+
+    start = time.perf_counter()
+    vectors = []
+    for offset in range(0, len(records), batch_size):
+        batch = records[offset:offset + batch_size]
+        vectors.extend(embeddings.embed_documents([record["text"] for record in batch]))
+    timings["embed"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    build_bm25_index(((id_, record["text"], metadata["act"])
+                      for id_, record, metadata in zip(ids, records, metadatas)),
+                     os.path.join(index_dir, "bm25"))
+    timings["bm25"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    citations = CitationIndex.build(zip(ids, metadatas))
+    citations.save(os.path.join(index_dir, "citations.json"))
+    timings["citations"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ActIndex.build(zip(metadatas, vectors)).save(os.path.join(index_dir, "acts"))
+    timings["acts"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    write_flat_index(((id_, vector, record["text"], metadata["act"])
+                      for id_, vector, record, metadata in zip(ids, vectors, records, metadatas)),
+                     len(records), len(vectors[0]), os.path.join(index_dir, "flat"), dtype=dtype)
+    timings["flat"] = time.perf_counter() - start
+
+    with open(os.path.join(index_dir, "index_version"), "w", encoding="utf-8") as f:
+        f.write(str(time.time()))
+    return timings
+
+
+def build_synthetic_index(work_dir, embeddings, sections=100, seed=0, dtype="float16"):
+    """
+    Writes a synthetic corpus to work_dir, chunks it and indexes it in work_dir/index; returns the
+    records.
+    """
+    corpus = write_corpus(os.path.join(work_dir, "legal_texts.txt"), sections=sections, seed=seed)
+    records = list(chunk_legal_texts(corpus))
+    with open(os.path.join(work_dir, "legal_chunks.jsonl"), "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    build_index(os.path.join(work_dir, "index"), records, embeddings, dtype=dtype)
+    return records
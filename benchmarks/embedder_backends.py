@@ -0,0 +1,111 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import results
+from corpus import sample_queries, write_corpus
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "dataset"))
+
+from chunk_data import chunk_legal_texts  # noqa: E402
+from embedders import EMBEDDING_BACKENDS, drift_report, load_embedder  # noqa: E402
+
+# Query embedding latency, throughput, load time and memory of each embedding backend (torch,
+# int8, onnx; see dataset/embedders.py), and the drift of each one's vectors from the first
+# backend's on the same chunks. Unlike the other benchmarks this needs the real model. Every backend
+# is measured in a fresh process, so the memory it reports is its own (runtime and model) and not
+# its predecessors'.
+
+
+def _rss_bytes():
+    with open("/proc/self/statm", "r") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def measure(backend, model, onnx_dir, threads, queries, texts, repeat):
+    """Runs in a child process; returns (metrics, vectors of texts)."""
+    rss = _rss_bytes()
+    start = time.perf_counter()
+    embeddings = load_embedder(backend, model, threads, onnx_dir)
+    embeddings.embed_query("warm up")
+    metrics = {"load_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+    durations = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            embeddings.embed_query(query)
+            durations.append(time.perf_counter() - start)
+    metrics.update(results.summarize_latencies(durations, prefix="query_"))
+
+    start = time.perf_counter()
+    vectors = [vector for offset in range(0, len(texts), 32)
+               for vector in embeddings.embed_documents(texts[offset:offset + 32])]
+    metrics["batch_texts_per_s"] = round(len(texts) / (time.perf_counter() - start), 1)
+    metrics["rss_growth_bytes"] = _rss_bytes() - rss
+    return metrics, vectors
+
+
+def _load_texts(chunks_path, sections, work_dir):
+    if chunks_path:
+        with open(chunks_path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    corpus = write_corpus(os.path.join(work_dir, "legal_texts.txt"), sections=sections)
+    return list(chunk_legal_texts(corpus))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Latency, memory and drift of the embedding backends")
+    parser.add_argument("--backends", default=",".join(EMBEDDING_BACKENDS),
+                        help="comma-separated; drift is measured against the first")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL",
+                                                     "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--onnx-dir", default=os.getenv(
+        "EMBEDDING_ONNX_PATH", os.path.join(ROOT, "dataset", "onnx_embedder")))
+    parser.add_argument("--threads", type=int, default=int(os.getenv("TORCH_THREADS", "0")))
+    parser.add_argument("--chunks",
+                        help="legal_chunks.jsonl to sample from (default: a synthetic corpus)")
+    parser.add_argument("--sections", type=int, default=50,
+                        help="sections per act in the synthetic corpus")
+    parser.add_argument("--texts", type=int, default=500,
+                        help="chunks embedded for throughput and drift")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="legal-ai-embedders-")
+    records = _load_texts(args.chunks, args.sections, work_dir)
+    texts = [record["text"] for record in records[:args.texts]]
+    queries = sample_queries(records, args.queries)
+
+    report = {}
+    reference = None
+    for backend in args.backends.split(","):
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as child:
+            metrics, vectors = child.submit(
+                measure, backend, args.model, args.onnx_dir, args.threads, queries, texts,
+                args.repeat
+            ).result()
+        if reference is None:
+            reference = vectors
+        else:
+            metrics.update(drift_report(reference, vectors))
+        report[f"embedder_{backend}"] = metrics
+
+    results.print_results(report)
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key != "output"}
+        results.save(args.output, "embedder_backends", config, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stand-in for Ollama's /api/chat and /api/generate with a configurable, deterministic cost:
+# prefill_ms + prefill_ms_per_token * prompt tokens before the first token, then token_ms per
+# generated token. Responses carry the same fields as Ollama's (eval_count, eval_duration, ...).
+
+WORDS = ("the", "court", "held", "that", "section", "applies", "to", "contract", "under", "Indian",
+         "law")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like Ollama
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._send_json({"models": [{"name": self.server.model}]})
+
+    def do_POST(self):
+        if self.path not in ("/api/chat", "/api/generate"):
+            self._send_json({"error": "not found"}, status=404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        chat = self.path == "/api/chat"
+        server = self.server
+        server.record_request()
+
+        llm_input = body.get("messages") if chat else body.get("prompt")
+        if not llm_input:
+            # An empty prompt or message list only loads the model
+            self._send_json(self._final(chat, "", 0, 0, 0, 0, done_reason="load"))
+            return
+        if server.error_rate and server.random.random() < server.error_rate:
+            self._send_json({"error": "simulated failure"}, status=500)
+            return
+
+        prompt_tokens = len(json.dumps(llm_input)) // 4
+        prefill = (server.prefill_ms + server.prefill_ms_per_token * prompt_tokens) / 1000
+        started = time.perf_counter()
+        time.sleep(prefill)
+        tokens = [WORDS[i % len(WORDS)] + " " for i in range(server.tokens)]
+
+        if not body.get("stream", True):
+            time.sleep(server.token_ms * len(tokens) / 1000)
+            self._send_json(self._final(chat, "".join(tokens), prompt_tokens, len(tokens), prefill,
+                                        time.perf_counter() - started - prefill))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                time.sleep(server.token_ms / 1000)
+                self._send_chunk(self._chunk(chat, token, done=False))
+            self._send_chunk(self._final(chat, "", prompt_tokens, len(tokens), prefill,
+                                         time.perf_counter() - started - prefill))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            server.record_cancel()  # the client went away mid-stream
+
+    def _chunk(self, chat, text, done):
+        chunk = {"model": self.server.model, "done": done}
+        if chat:
+            chunk["message"] = {"role": "assistant", "content": text}
+        else:
+            chunk["response"] = text
+        return chunk
+
+    def _final(self, chat, text, prompt_tokens, eval_count, prefill, generation,
+               done_reason="stop"):
+        chunk = self._chunk(chat, text, done=True)
+        chunk.update({
+            "done_reason": done_reason,
+            "total_duration": int((prefill + generation) * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prefill * 1e9),
+            "eval_count": eval_count,
+            "eval_duration": int(generation * 1e9),
+        })
+        return chunk
+
+    def _send_chunk(self, data):
+        line = json.dumps(data).encode("utf-8") + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeOllama(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, model="llama3.2", tokens=64, token_ms=20.0,
+                 prefill_ms=50.0, prefill_ms_per_token=0.0, error_rate=0.0, seed=0):
+        super().__init__((host, port), _Handler)
+        self.model = model
+        self.tokens = tokens
+        self.token_ms = token_ms
+        self.prefill_ms = prefill_ms
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.cancelled = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_cancel(self):
+        with self._lock:
+            self.cancelled += 1
+
+    def start(self):
+        """Serves in a background thread; returns the base URL."""
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self.url
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections (e.g. a request past its deadline) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama server for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--tokens", type=int, default=64, help="tokens generated per answer")
+    parser.add_argument("--token-ms", type=float, default=20.0, help="delay per generated token")
+    parser.add_argument("--prefill-ms", type=float, default=50.0,
+                        help="fixed delay before the first token")
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.0,
+                        help="extra delay per prompt token")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of requests answered with 500")
+    args = parser.parse_args()
+
+    server = FakeOllama(args.host, args.port, tokens=args.tokens, token_ms=args.token_ms,
+                        prefill_ms=args.prefill_ms, prefill_ms_per_token=args.prefill_ms_per_token,
+                        error_rate=args.error_rate)
+    print(f"Fake Ollama listening on {server.url}")
+    server.serve_forever()
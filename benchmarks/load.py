@@ -0,0 +1,284 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import results
+
+# Load generator for the backend's HTTP API.
+#   closed loop: `concurrency` users each send their next request as soon as the last one finished
+#   open loop:   requests arrive at `rate` per second (Poisson) whether or not earlier ones
+#                finished; latency counts from the scheduled arrival, so queueing delay is not
+#                hidden
+# Reports latency percentiles, throughput and error rate per endpoint, and time to first token
+# for streamed answers.
+
+ENDPOINTS = ("ask", "ask_stream", "search")
+DEFAULT_QUERIES = (
+    "What are the rights of a tenant under Indian law?",
+    "What is the punishment for cheating?",
+    "When can the police arrest without a warrant?",
+    "How is a contract without consideration treated?",
+    "What are the grounds for divorce?",
+    "Explain Section 144 of CrPC.",
+    "What compensation can a consumer claim for a defective product?",
+    "What is the law on maintenance of a wife?",
+)
+
+
+class Recorder:
+    """Collects per-endpoint outcomes; only requests started after warm-up are counted."""
+
+    def __init__(self, measure_from):
+        self.measure_from = measure_from
+        self.samples = {}  # endpoint -> list of (latency, first token latency or None, ok)
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, started, latency, first_token, ok):
+        if started < self.measure_from:
+            return
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((latency, first_token, ok))
+
+    def summary(self, duration):
+        report = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            ok = [s for s in samples if s[2]]
+            entry = {
+                "requests": len(samples),
+                "errors": len(samples) - len(ok),
+                "error_rate": round((len(samples) - len(ok)) / len(samples), 4),
+                "throughput_rps": round(len(ok) / duration, 3),
+            }
+            entry.update(results.summarize_latencies([s[0] for s in ok]))
+            entry.update(results.summarize_latencies([s[1] for s in ok if s[1] is not None],
+                                                     prefix="ttft_"))
+            report[endpoint] = entry
+        return report
+
+
+class Client:
+    def __init__(self, base_url, queries, distinct_queries, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.queries = queries
+        self.distinct_queries = distinct_queries
+        self.timeout = timeout
+        self._local = threading.local()
+        self._counter = itertools.count()
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _query(self, rng):
+        query = rng.choice(self.queries)
+        if self.distinct_queries:
+            # A unique suffix defeats the answer cache and request coalescing
+            query += f" (request {next(self._counter)})"
+        return query
+
+    def send(self, endpoint, rng):
+        """Returns (first token latency or None, ok); the caller times the whole request."""
+        query = self._query(rng)
+        body = {"query": query, "conversationId": str(uuid.uuid4()), "isNewConversation": True}
+        if endpoint == "search":
+            response = self._session().post(f"{self.base_url}/debug_search", json={"query": query},
+                                            timeout=self.timeout)
+            return None, response.status_code == 200 and "retrieved" in response.json()
+        if endpoint == "ask":
+            response = self._session().post(f"{self.base_url}/ask", json=body, timeout=self.timeout)
+            return None, response.status_code == 200 and "response" in response.json()
+
+        body["stream"] = True
+        started = time.perf_counter()
+        first_token = None
+        with self._session().post(f"{self.base_url}/ask", json=body, stream=True,
+                                  timeout=self.timeout) as response:
+            if response.status_code != 200:
+                return None, False
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if "token" in event and first_token is None:
+                    first_token = time.perf_counter() - started
+                if "error" in event:
+                    return first_token, False
+                if event.get("done"):
+                    return first_token, True
+        return first_token, False  # the stream ended without a done line
+
+
+def _pick(mix, rng):
+    endpoints, weights = zip(*mix.items())
+    return rng.choices(endpoints, weights)[0]
+
+
+def _timed_send(client, recorder, endpoint, rng, scheduled):
+    sent = time.perf_counter()
+    try:
+        first_token, ok = client.send(endpoint, rng)
+    except (requests.RequestException, ValueError):
+        first_token, ok = None, False
+    if first_token is not None:
+        first_token += sent - scheduled  # include any wait for a free worker
+    recorder.add(endpoint, scheduled, time.perf_counter() - scheduled, first_token, ok)
+
+
+def run_closed_loop(client, mix, concurrency, duration, warmup, seed=0):
+    start = time.perf_counter()
+    recorder = Recorder(start + warmup)
+    end = start + warmup + duration
+
+    def user(index):
+        rng = random.Random(seed + index)
+        while time.perf_counter() < end:
+            _timed_send(client, recorder, _pick(mix, rng), rng, time.perf_counter())
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.summary(duration)
+
+
+def run_open_loop(client, mix, rate, duration, warmup, max_in_flight=1000, seed=0):
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    recorder = Recorder(start + warmup)
+    end = start + warmup + duration
+    scheduled = start
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        while True:
+            scheduled += rng.expovariate(rate)
+            if scheduled >= end:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(_timed_send, client, recorder, _pick(mix, rng),
+                        random.Random(rng.random()), scheduled)
+    return recorder.summary(duration)
+
+
+def _parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(
+                f"unknown endpoint {name!r} (expected one of {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _wait_ready(base_url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def _start_offline_server(args):
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py"),
+               "--server", args.server, "--port", str(args.port), "--tokens", str(args.tokens),
+               "--token-ms", str(args.token_ms), "--prefill-ms", str(args.prefill_ms),
+               "--embed-ms", str(args.embed_ms), "--ollama-instances", str(args.ollama_instances),
+               "--workers", str(args.workers)]
+    return subprocess.Popen(command)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load test the backend and report latency percentiles")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="backend to test")
+    parser.add_argument("--offline", action="store_true",
+                        help="start serve.py (stub embedder, fake Ollama) on --port and test it")
+    parser.add_argument("--server", choices=["flask", "asgi"], default="flask",
+                        help="with --offline")
+    parser.add_argument("--port", type=int, default=5055, help="with --offline")
+    parser.add_argument("--tokens", type=int, default=64, help="with --offline: tokens per answer")
+    parser.add_argument("--token-ms", type=float, default=20.0,
+                        help="with --offline: fake Ollama per-token delay")
+    parser.add_argument("--prefill-ms", type=float, default=50.0,
+                        help="with --offline: fake Ollama prefill delay")
+    parser.add_argument("--embed-ms", type=float, default=5.0,
+                        help="with --offline: stub embedder latency")
+    parser.add_argument("--ollama-instances", type=int, default=1,
+                        help="with --offline: fake Ollamas in the pool")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="with --offline: gunicorn worker processes")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed loop: concurrent users")
+    parser.add_argument("--rate", type=float, default=5.0, help="open loop: requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds run before measuring")
+    parser.add_argument("--mix", type=_parse_mix, default={"ask": 1, "ask_stream": 1, "search": 1},
+                        help="endpoint weights, e.g. ask=2,ask_stream=1,search=1")
+    parser.add_argument("--queries", help="file with one query per line")
+    parser.add_argument("--distinct-queries", action="store_true", help="make every query unique")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with this results file and fail on regression")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    server = None
+    base_url = args.url
+    if args.offline:
+        server = _start_offline_server(args)
+        base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        if not _wait_ready(base_url, timeout=300):
+            sys.exit(f"{base_url}/ready did not return 200")
+        client = Client(base_url, queries, args.distinct_queries, args.timeout)
+        if args.mode == "closed":
+            report = run_closed_loop(client, args.mix, args.concurrency, args.duration,
+                                     args.warmup, args.seed)
+        else:
+            report = run_open_loop(client, args.mix, args.rate, args.duration, args.warmup,
+                                   seed=args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    results.print_results(report)
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    current = {"config": config, "results": report}
+    if args.output:
+        current = results.save(args.output, "load", config, report)
+    if args.baseline:
+        baseline = results.load(args.baseline)
+        for key, (before, after) in results.config_differences(baseline, current).items():
+            print(f"warning: {key} differs: {before!r} -> {after!r}")
+        rows = results.compare(baseline, current, args.tolerance)
+        results.print_comparison(rows)
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
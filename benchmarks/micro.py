@@ -0,0 +1,156 @@
+import argparse
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+import results
+from corpus import LAWS, build_index, sample_queries, write_corpus
+from stub_embedder import StubEmbeddings
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Micro-benchmarks of the retrieval path on a synthetic corpus with the stub embedder: chunking,
+# ingestion (embedding and index builds), search_documents in each mode, and prompt assembly.
+# The stub's simulated cost stands in for the model, so the numbers track our code, not torch.
+
+
+def _time_each(fn, items, repeat=1):
+    durations = []
+    for _ in range(repeat):
+        for item in items:
+            start = time.perf_counter()
+            fn(item)
+            durations.append(time.perf_counter() - start)
+    return durations
+
+
+def bench_chunking(corpus_path):
+    chunk_data = importlib.import_module("chunk_data")
+    start = time.perf_counter()
+    records = list(chunk_data.chunk_legal_texts(corpus_path))
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(corpus_path)
+    return records, {
+        "chunks": len(records),
+        "total_ms": round(elapsed * 1000, 3),
+        "chunks_per_s": round(len(records) / elapsed, 1),
+        "mb_per_s": round(size / elapsed / 1e6, 3),
+    }
+
+
+def bench_ingestion(index_dir, records, embeddings):
+    start = time.perf_counter()
+    timings = build_index(index_dir, records, embeddings)
+    elapsed = time.perf_counter() - start
+    report = {f"{step}_ms": round(seconds * 1000, 3) for step, seconds in timings.items()}
+    report["total_ms"] = round(elapsed * 1000, 3)
+    report["chunks_per_s"] = round(len(records) / elapsed, 1)
+    return report
+
+
+def bench_chroma_ingestion(vector_database, chunks_path, count):
+    """store_documents into a fresh Chroma store; needs chromadb and langchain."""
+    start = time.perf_counter()
+    vector_database.store_documents(chunks_path, batch_size=256)
+    elapsed = time.perf_counter() - start
+    return {"total_ms": round(elapsed * 1000, 3), "chunks_per_s": round(count / elapsed, 1)}
+
+
+def bench_search(vector_database, queries, repeat):
+    report = {}
+    for mode in ("dense", "hybrid"):
+        vector_database.query_cache.clear()
+        cold = _time_each(lambda q: vector_database.search_documents(q, mode=mode), queries)
+        warm = _time_each(lambda q: vector_database.search_documents(q, mode=mode), queries, repeat)
+        report[f"search_documents_{mode}_uncached"] = results.summarize_latencies(cold)
+        report[f"search_documents_{mode}_cached_embedding"] = results.summarize_latencies(warm)
+    # Searching one act's chunks instead of the whole corpus (embeddings cached by the passes above)
+    report["search_documents_hybrid_one_act"] = results.summarize_latencies(
+        _time_each(lambda q: vector_database.search_documents(q, mode="hybrid", acts=[LAWS[0]]),
+                   queries, repeat)
+    )
+    citations = [f"Section {n} of the {law}" for n in (1, 7, 42) for law in LAWS[:3]]
+    report["search_documents_citation"] = results.summarize_latencies(
+        _time_each(vector_database.search_documents, citations, repeat)
+    )
+    return report
+
+
+def bench_prompt_assembly(vector_database, queries, repeat):
+    prompt_builder = importlib.import_module("prompt_builder")
+    retrieved = [(query, vector_database.search_documents(query)) for query in queries]
+    exchanges = [{"user": query, "assistant": " ".join(chunks)[:800]}
+                 for query, chunks in retrieved[:5]]
+    return {
+        "build_prompt": results.summarize_latencies(_time_each(
+            lambda item: prompt_builder.build_prompt(item[0], item[1], (), "", exchanges),
+            retrieved, repeat
+        )),
+        "build_chat_messages": results.summarize_latencies(_time_each(
+            lambda item: prompt_builder.build_chat_messages(
+                prompt_builder.build_turn_message(item[0], item[1]), "", exchanges
+            ), retrieved, repeat
+        )),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmarks of chunking, ingestion, search and prompts")
+    parser.add_argument("--sections", type=int, default=200,
+                        help="sections per act in the synthetic corpus")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="passes over the queries for the warm timings")
+    parser.add_argument("--embed-ms", type=float, default=0.0,
+                        help="simulated model cost per embedding call")
+    parser.add_argument("--chroma", action="store_true",
+                        help="also time store_documents into Chroma")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with this results file and fail on regression")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="legal-ai-micro-")
+    index_dir = os.path.join(work_dir, "index")
+    # vector_database reads these at import
+    os.environ["CHROMA_DB_PATH"] = index_dir
+    os.environ.setdefault("VECTOR_BACKEND", "flat")
+    # A single caller: batching would only add the wait
+    os.environ.setdefault("EMBED_BATCH_WINDOW_MS", "0")
+    sys.path.insert(0, os.path.join(ROOT, "backend"))
+    vector_database = importlib.import_module("vector_database")
+    embeddings = StubEmbeddings(cost_ms=args.embed_ms)
+    vector_database.use_embeddings(embeddings)
+
+    corpus_path = write_corpus(os.path.join(work_dir, "legal_texts.txt"), sections=args.sections)
+    records, report = bench_chunking(corpus_path)
+    report = {"chunking": report, "ingestion": bench_ingestion(index_dir, records, embeddings)}
+    queries = sample_queries(records, args.queries)
+    report.update(bench_search(vector_database, queries, args.repeat))
+    report.update(bench_prompt_assembly(vector_database, queries, args.repeat))
+    if args.chroma:
+        chunks_path = os.path.join(work_dir, "legal_chunks.jsonl")
+        importlib.import_module("chunk_data").write_chunks(records, chunks_path)
+        report["ingestion_chroma"] = bench_chroma_ingestion(vector_database, chunks_path,
+                                                            len(records))
+
+    results.print_results(report)
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    current = {"config": config, "results": report}
+    if args.output:
+        current = results.save(args.output, "micro", config, report)
+    if args.baseline:
+        baseline = results.load(args.baseline)
+        for key, (before, after) in results.config_differences(baseline, current).items():
+            print(f"warning: {key} differs: {before!r} -> {after!r}")
+        rows = results.compare(baseline, current, args.tolerance)
+        results.print_comparison(rows)
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+# Benchmark results are JSON files of {"results": {benchmark: {metric: value}}} plus the
+# environment and configuration they were measured with. compare() checks a run against a
+# baseline: metrics ending in _ms or _bytes (and error_rate) must not grow, metrics ending in
+# _per_s or _rps (and recall) must not shrink, by more than the tolerance.
+
+LOWER_IS_BETTER = ("_ms", "_bytes", "error_rate")
+HIGHER_IS_BETTER = ("_per_s", "_rps", "recall")
+
+
+def percentile(values, q):
+    """The q-th percentile (0-100) of values, by linear interpolation; None when there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize_latencies(seconds, prefix=""):
+    """p50/p95/p99/mean/max in milliseconds of a list of durations in seconds."""
+    if not seconds:
+        return {}
+    summary = {f"{prefix}p{q}_ms": round(percentile(seconds, q) * 1000, 3) for q in (50, 95, 99)}
+    summary[f"{prefix}mean_ms"] = round(sum(seconds) / len(seconds) * 1000, 3)
+    summary[f"{prefix}max_ms"] = round(max(seconds) * 1000, 3)
+    return summary
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "argv": sys.argv,
+    }
+
+
+def save(path, kind, config, results):
+    report = {
+        "kind": kind,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment(),
+        "config": config,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _direction(metric):
+    if metric.endswith("max_ms"):
+        return 0  # a single outlier; too noisy to judge
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    return 0  # counts and settings are reported, not judged
+
+
+def compare(baseline, current, tolerance=0.10, error_rate_slack=0.01):
+    """
+    Returns a list of (benchmark, metric, baseline value, current value, change, regressed)
+    for every judged metric present in both reports.
+    """
+    rows = []
+    for name, metrics in baseline["results"].items():
+        for metric, before in metrics.items():
+            after = current["results"].get(name, {}).get(metric)
+            direction = _direction(metric)
+            if (not direction or not isinstance(before, (int, float))
+                    or not isinstance(after, (int, float))):
+                continue
+            if metric.endswith("error_rate"):
+                # Absolute slack: going from 0 to 0.1% errors is not an infinite regression
+                change = after - before
+                regressed = change > error_rate_slack
+            else:
+                change = (after - before) / before if before else 0.0
+                regressed = change * direction < -tolerance
+            rows.append((name, metric, before, after, change, regressed))
+    return rows
+
+
+def config_differences(baseline, current):
+    """Settings that differ between two runs, which makes their numbers hard to compare."""
+    before, after = baseline.get("config", {}), current.get("config", {})
+    return {key: (before.get(key), after.get(key)) for key in sorted(set(before) | set(after))
+            if before.get(key) != after.get(key)}
+
+
+def print_comparison(rows):
+    for name, metric, before, after, change, regressed in rows:
+        flag = "REGRESSION" if regressed else "ok"
+        print(f"{flag:>10}  {name:<32} {metric:<20} "
+              f"{before:>12.3f} -> {after:>12.3f} ({change:+.1%})")
+
+
+def print_results(results):
+    for name, metrics in results.items():
+        print(name)
+        for metric, value in metrics.items():
+            print(f"    {metric:<24} {value}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare a benchmark run against a baseline")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed relative regression (0.10 = 10%%)")
+    parser.add_argument("--error-rate-slack", type=float, default=0.01,
+                        help="allowed absolute error-rate increase")
+    args = parser.parse_args()
+
+    baseline, current = load(args.baseline), load(args.current)
+    for key, (before, after) in config_differences(baseline, current).items():
+        print(f"warning: {key} differs: {before!r} -> {after!r}")
+    rows = compare(baseline, current, args.tolerance, args.error_rate_slack)
+    print_comparison(rows)
+    regressions = sum(1 for row in rows if row[-1])
+    if regressions:
+        print(f"{regressions} metric(s) regressed by more than {args.tolerance:.0%}")
+        sys.exit(1)
+    print(f"No regressions in {len(rows)} metrics")
@@ -0,0 +1,235 @@
+import argparse
+import importlib
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np  # type: ignore
+
+import results
+from corpus import build_synthetic_index, sample_queries
+from stub_embedder import StubEmbeddings
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Recall-vs-latency sweep of the vector index. Exact brute-force top-k over the stored
+# embeddings is the ground truth; every HNSW configuration (M, construction_ef, search_ef) is
+# built in a scratch Chroma collection and queried for each k, alongside the flat exports.
+# Recall@k is the fraction of the exact top k that the index returned.
+
+
+def _load_stored(vector_database, batch_size=1000):
+    """Vectors of every chunk in the Chroma store at CHROMA_DB_PATH, and its distance space."""
+    collection = vector_database.get_collection()
+    vectors = []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings"], limit=batch_size, offset=offset)
+        if not page["ids"]:
+            break
+        vectors.extend(page["embeddings"])
+        offset += len(page["ids"])
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+    return np.asarray(vectors, dtype=np.float32), space
+
+
+def exact_top_k(vectors, queries, k, space="l2"):
+    """Row indices of the k nearest vectors to each query, nearest first."""
+    if space == "l2":
+        scores = -(np.sum(vectors ** 2, axis=1)[None, :] - 2 * queries @ vectors.T)
+    elif space == "cosine":
+        normalized = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        norms = np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        scores = queries @ normalized.T / norms
+    else:  # "ip"
+        scores = queries @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def recall(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def hnsw_memory_bytes(count, dim, m):
+    """
+    hnswlib's allocation: level 0 holds each vector, 2*M links and a label; an element reaches
+    each upper level with probability 1/M, and upper levels hold M links.
+    """
+    level0 = count * (dim * 4 + 2 * m * 4 + 4 + 8)
+    upper = count / max(m - 1, 1) * (m * 4 + 4)
+    return int(level0 + upper)
+
+
+def _dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def sweep_hnsw(vectors, queries, truths, ks, space, ms, construction_efs, search_efs, work_dir):
+    import chromadb  # type: ignore
+
+    report = {}
+    ids = [str(i) for i in range(len(vectors))]
+    for m, construction_ef, search_ef in itertools.product(ms, construction_efs, search_efs):
+        path = os.path.join(work_dir, f"hnsw-{m}-{construction_ef}-{search_ef}")
+        client = chromadb.PersistentClient(path=path)
+        collection = client.create_collection("bench", metadata={
+            "hnsw:space": space, "hnsw:M": m, "hnsw:construction_ef": construction_ef,
+            "hnsw:search_ef": search_ef
+        })
+        start = time.perf_counter()
+        for offset in range(0, len(vectors), 1000):
+            collection.add(ids=ids[offset:offset + 1000],
+                           embeddings=vectors[offset:offset + 1000].tolist())
+        build = time.perf_counter() - start
+
+        for k in ks:
+            found, durations = [], []
+            for query in queries:
+                start = time.perf_counter()
+                result = collection.query(query_embeddings=[query.tolist()], n_results=k,
+                                          include=[])
+                durations.append(time.perf_counter() - start)
+                found.append([int(id_) for id_ in result["ids"][0]])
+            entry = {"recall": round(recall(found, truths[k]), 4)}
+            entry.update(results.summarize_latencies(durations))
+            entry["index_memory_bytes"] = hnsw_memory_bytes(len(vectors), vectors.shape[1], m)
+            entry["disk_bytes"] = _dir_bytes(path)
+            entry["build_s"] = round(build, 3)
+            name = f"hnsw M={m} construction_ef={construction_ef} search_ef={search_ef} k={k}"
+            report[name] = entry
+        del collection, client
+        shutil.rmtree(path, ignore_errors=True)
+    return report
+
+
+def sweep_flat(vectors, queries, truths, ks, work_dir):
+    flat_index = importlib.import_module("flat_index")
+    report = {}
+    for dtype, rescore in (("float16", False), ("int8", False), ("int8", True)):
+        path = os.path.join(work_dir, f"flat-{dtype}")
+        flat_index.write_flat_index(((str(i), v, "") for i, v in enumerate(vectors)), len(vectors),
+                                    vectors.shape[1], path, dtype=dtype)
+        index = flat_index.FlatIndex(path)
+        for k in ks:
+            found, durations = [], []
+            for query in queries:
+                start = time.perf_counter()
+                hits = index.search(query, k, rescore=rescore)
+                durations.append(time.perf_counter() - start)
+                found.append([int(id_) for id_, _, _ in hits])
+            entry = {"recall": round(recall(found, truths[k]), 4)}
+            entry.update(results.summarize_latencies(durations))
+            entry["index_memory_bytes"] = os.path.getsize(os.path.join(path, "vectors.npy"))
+            entry["disk_bytes"] = _dir_bytes(path)
+            report[f"flat {dtype}{' rescored' if rescore else ''} k={k}"] = entry
+        index.close()
+        shutil.rmtree(path, ignore_errors=True)
+    return report
+
+
+def recommend(report, ks, target_recall):
+    """The fastest (by p95) HNSW setting per k that reaches target_recall."""
+    choices = {}
+    for k in ks:
+        candidates = [(entry["p95_ms"], name) for name, entry in report.items()
+                      if name.startswith("hnsw") and name.endswith(f" k={k}")
+                      and entry["recall"] >= target_recall]
+        if candidates:
+            choices[k] = min(candidates)[1]
+    return choices
+
+
+def _ints(text):
+    return [int(part) for part in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recall vs latency of HNSW settings and flat exports")
+    parser.add_argument("--source", choices=["chroma", "synthetic"], default="chroma",
+                        help="vectors of the Chroma store at CHROMA_DB_PATH, "
+                             "or a synthetic stub-embedded corpus")
+    parser.add_argument("--sections", type=int, default=500, help="synthetic: sections per act")
+    parser.add_argument("--queries",
+                        help="file with one query per line, embedded with the configured model")
+    parser.add_argument("--num-queries", type=int, default=200,
+                        help="without --queries: stored vectors + noise")
+    parser.add_argument("--noise", type=float, default=0.05,
+                        help="std of the noise added to sampled vectors")
+    parser.add_argument("--k", type=_ints, default=[3, 5, 10])
+    parser.add_argument("--m", type=_ints, default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=_ints, default=[64, 100, 200])
+    parser.add_argument("--search-ef", type=_ints, default=[10, 20, 50, 100])
+    parser.add_argument("--space", choices=["l2", "cosine", "ip"],
+                        help="default: the stored collection's")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--no-flat", action="store_true", help="skip the flat index rows")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="legal-ai-recall-")
+    if args.source == "synthetic":
+        os.environ["CHROMA_DB_PATH"] = os.path.join(work_dir, "index")
+    sys.path.insert(0, os.path.join(ROOT, "backend"))
+    vector_database = importlib.import_module("vector_database")
+
+    rng = np.random.default_rng(args.seed)
+    if args.source == "synthetic":
+        embeddings = StubEmbeddings()
+        vector_database.use_embeddings(embeddings)
+        records = build_synthetic_index(work_dir, embeddings, sections=args.sections)
+        vectors = np.asarray(embeddings.embed_documents([r["text"] for r in records]),
+                             dtype=np.float32)
+        space = "l2"
+        query_texts = sample_queries(records, args.num_queries, args.seed)
+        queries = np.asarray(embeddings.embed_documents(query_texts), dtype=np.float32)
+    else:
+        vectors, space = _load_stored(vector_database)
+        if args.queries:
+            with open(args.queries, "r", encoding="utf-8") as f:
+                texts = [line.strip() for line in f if line.strip()]
+            queries = np.asarray(vector_database.get_embeddings().embed_documents(texts),
+                                 dtype=np.float32)
+        else:
+            rows = rng.choice(len(vectors), size=min(args.num_queries, len(vectors)), replace=False)
+            noise = rng.normal(0, args.noise, size=(len(rows), vectors.shape[1]))
+            queries = vectors[rows] + noise.astype(np.float32)
+    space = args.space or space
+    print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}, {len(queries)} queries, "
+          f"space {space}")
+
+    truths = {k: exact_top_k(vectors, queries, k, space).tolist() for k in args.k}
+    report = {}
+    if not args.no_flat:
+        report.update(sweep_flat(vectors, queries, truths, args.k, work_dir))
+    try:
+        report.update(sweep_hnsw(vectors, queries, truths, args.k, space, args.m,
+                                 args.construction_ef, args.search_ef, work_dir))
+    except ImportError:
+        print("chromadb is not installed: HNSW settings skipped")
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{'index':<60} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'memory MB':>10}")
+    for name, entry in report.items():
+        print(f"{name:<60} {entry['recall']:>7.3f} {entry['p50_ms']:>8.3f} {entry['p95_ms']:>8.3f} "
+              f"{entry['index_memory_bytes'] / 1e6:>10.1f}")
+    for k, name in recommend(report, args.k, args.target_recall).items():
+        settings = dict(part.split("=") for part in name.split()[1:4])
+        print(f"k={k}: fastest HNSW setting with recall >= {args.target_recall}: {name}")
+        print(f"    HNSW_M={settings['M']} HNSW_CONSTRUCTION_EF={settings['construction_ef']} "
+              f"HNSW_SEARCH_EF={settings['search_ef']} (then rebuild the store)")
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key != "output"}
+        config.update(vectors=len(vectors), dim=int(vectors.shape[1]), space=space)
+        results.save(args.output, "retrieval_recall", config, report)
+
+
+if __name__ == "__main__":
+    main()
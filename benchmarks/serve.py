@@ -0,0 +1,111 @@
+import argparse
+import importlib
+import logging
+import os
+import runpy
+import sys
+import tempfile
+
+from corpus import build_synthetic_index
+from fake_ollama import FakeOllama
+from stub_embedder import StubEmbeddings
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Runs the real backend (Flask or ASGI) fully offline: a synthetic corpus indexed with the stub
+# embedder and served from the flat backend, and a fake Ollama in the same process. Only the
+# model-dependent parts are replaced; routing, retrieval, prompt assembly, caching, coalescing
+# and streaming are the production code. load.py --offline starts this in a subprocess. With
+# --workers the backend runs under gunicorn with backend/gunicorn.conf.py, as in production.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the backend offline for load testing")
+    parser.add_argument("--server", choices=["flask", "asgi"], default="flask")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--work-dir",
+                        help="where the synthetic corpus and index go (default: a temp dir)")
+    parser.add_argument("--sections", type=int, default=100,
+                        help="sections per act in the synthetic corpus")
+    parser.add_argument("--embed-ms", type=float, default=5.0,
+                        help="simulated embedding model latency")
+    parser.add_argument("--ollama-url",
+                        help="use these comma-separated (fake) Ollamas instead of starting any")
+    parser.add_argument("--ollama-instances", type=int, default=1,
+                        help="fake Ollamas to start and spread over")
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    parser.add_argument("--prefill-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="serve with gunicorn and this many worker processes")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="legal-ai-bench-")
+    # Before anything imports vector_database, which reads it at import
+    os.environ["CHROMA_DB_PATH"] = os.path.join(work_dir, "index")
+    embeddings = StubEmbeddings(cost_ms=args.embed_ms)
+    records = build_synthetic_index(work_dir, embeddings, sections=args.sections)
+    print(f"Indexed {len(records)} synthetic chunks in {work_dir}", flush=True)
+
+    ollama_urls = args.ollama_url
+    if not ollama_urls:
+        ollama_urls = ",".join(
+            FakeOllama(tokens=args.tokens, token_ms=args.token_ms, prefill_ms=args.prefill_ms,
+                       error_rate=args.error_rate, seed=i).start()
+            for i in range(args.ollama_instances)
+        )
+
+    # The backend reads these at import; other settings can be given in the environment
+    os.environ["OLLAMA_URLS"] = ollama_urls
+    os.environ.setdefault("VECTOR_BACKEND", "flat")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("LOG_PROMPTS", "False")
+    if args.workers:
+        os.environ["WEB_WORKERS"] = str(args.workers)
+        os.environ["SERVER"] = args.server
+        os.environ.setdefault("CONVERSATION_DB_PATH", os.path.join(work_dir, "conversations.db"))
+        # What gunicorn.conf.py sets, before chatbot reads it
+        config = runpy.run_path(os.path.join(ROOT, "backend", "gunicorn.conf.py"))
+
+    sys.path.insert(0, os.path.join(ROOT, "backend"))
+    chatbot = importlib.import_module("chatbot")
+    # chatbot imports vector_database under a different name in and out of production
+    importlib.import_module(chatbot.search_documents.__module__).use_embeddings(embeddings)
+
+    if args.workers:
+        _run_gunicorn(config, args.port)
+    elif args.server == "asgi":
+        import uvicorn  # type: ignore
+        uvicorn.run("asgi_app:app", host="127.0.0.1", port=args.port, log_level="warning")
+    else:
+        from werkzeug.serving import make_server
+        app = importlib.import_module("app").app
+        # One line per request otherwise
+        logging.getLogger("werkzeug").setLevel(os.environ["LOG_LEVEL"])
+        chatbot.start_warm_up()
+        print(f"Serving on http://127.0.0.1:{args.port}", flush=True)
+        make_server("127.0.0.1", args.port, app, threaded=True).serve_forever()
+
+
+def _run_gunicorn(config, port):
+    """Runs gunicorn with the settings and hooks of backend/gunicorn.conf.py, listening on port."""
+    from gunicorn.app.base import BaseApplication  # type: ignore
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for name, value in config.items():
+                if name in self.cfg.settings and value is not None:
+                    self.cfg.set(name, value)
+            self.cfg.set("bind", f"127.0.0.1:{port}")
+            self.cfg.set("loglevel", os.environ["LOG_LEVEL"].lower())
+
+        def load(self):
+            return importlib.import_module(config["wsgi_app"].split(":")[0]).app
+
+    print(f"Serving on http://127.0.0.1:{port} with {config['workers']} workers", flush=True)
+    Server().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import hashlib
+import re
+import time
+
+import numpy as np  # type: ignore
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+class StubEmbeddings:
+    """
+    Deterministic stand-in for HuggingFaceEmbeddings: every token is hashed to a fixed random
+    vector and a text is the normalized sum of its tokens' vectors. Texts sharing words are
+    similar, so retrieval behaves plausibly, and no model or torch is needed.
+
+    cost_ms simulates the model's per-call latency (plus cost_per_text_ms per text in a batch).
+    """
+
+    def __init__(self, dim=384, cost_ms=0.0, cost_per_text_ms=0.0):
+        self.dim = dim
+        self.cost_ms = cost_ms
+        self.cost_per_text_ms = cost_per_text_ms
+        self._token_vectors = {}
+
+    def _token_vector(self, token):
+        vector = self._token_vectors.get(token)
+        if vector is None:
+            seed = int.from_bytes(hashlib.sha256(token.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            self._token_vectors[token] = vector
+        return vector
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in TOKEN.findall(text.lower()):
+            vector += self._token_vector(token)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _wait(self, count):
+        delay = (self.cost_ms + self.cost_per_text_ms * count) / 1000
+        if delay > 0:
+            # Busy-wait: like the real model, the time is spent on CPU rather than sleeping
+            end = time.perf_counter() + delay
+            while time.perf_counter() < end:
+                pass
+
+    def embed_documents(self, texts):
+        self._wait(len(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
@@ -0,0 +1,56 @@
+import argparse
+import os
+
+# Memory of a prefork server: the master and each of its worker processes, from
+# /proc/<pid>/smaps_rollup (Linux). RSS counts shared pages in every process that maps them; PSS
+# splits them between the processes, so the PSS total is what the server really takes. Pages the
+# workers still share with the master (the preloaded model and indexes) show up as "shared".
+
+FIELDS = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared", "Shared_Dirty": "shared",
+          "Private_Clean": "private", "Private_Dirty": "private"}
+
+
+def process_memory(pid):
+    """{"rss", "pss", "shared", "private"} in bytes for one process."""
+    memory = dict.fromkeys(set(FIELDS.values()), 0)
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in FIELDS:
+                memory[FIELDS[name]] += int(rest.split()[0]) * 1024
+    return memory
+
+
+def children(pid):
+    pids = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children", "r") as f:
+            pids.extend(int(child) for child in f.read().split())
+    return pids
+
+
+def report(master_pid):
+    rows = [("master", master_pid, process_memory(master_pid))]
+    rows += [(f"worker {i + 1}", pid, process_memory(pid))
+             for i, pid in enumerate(sorted(children(master_pid)))]
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RSS / PSS of a gunicorn master and its workers")
+    parser.add_argument("pid", type=int, help="PID of the gunicorn master")
+    args = parser.parse_args()
+
+    rows = report(args.pid)
+    print(f"{'process':<10} {'pid':>8} {'RSS MB':>9} {'PSS MB':>9} {'shared MB':>10} "
+          f"{'private MB':>11}")
+    for name, pid, memory in rows:
+        print(f"{name:<10} {pid:>8} {memory['rss'] / 1e6:>9.1f} {memory['pss'] / 1e6:>9.1f} "
+              f"{memory['shared'] / 1e6:>10.1f} {memory['private'] / 1e6:>11.1f}")
+    total_rss = sum(memory["rss"] for _, _, memory in rows)
+    total_pss = sum(memory["pss"] for _, _, memory in rows)
+    print(f"{'total':<10} {'':>8} {total_rss / 1e6:>9.1f} {total_pss / 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
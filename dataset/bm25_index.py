@@ -0,0 +1,190 @@
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+from collections import defaultdict
+
+import numpy as np  # type: ignore
+
+# BM25 inverted index persisted as flat arrays, so a server can open it with mmap and share
+# the pages with other processes instead of loading it into the Python heap:
+#   vocab.json          term -> term id, plus corpus statistics
+#   offsets.npy         int64[V + 1], postings of term t are [offsets[t], offsets[t + 1])
+#   postings_doc.npy    int32, document numbers
+#   postings_tf.npy     uint16, term frequency in that document
+#   doc_lengths.npy     int32[N], tokens per document
+#   ids.json            chunk content IDs by document number
+#   texts.bin           UTF-8 chunk texts back to back
+#   text_offsets.npy    int64[N + 1], byte range of each text in texts.bin
+#   doc_acts.npy        optional int16[N], each chunk's act as an index into vocab.json's "acts"
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on",
+    "or", "that", "the", "this", "to", "was", "what", "which", "with", "under", "shall", "any",
+}
+
+
+def tokenize(text):
+    """Lowercased alphanumeric tokens; numbers are kept so "Section 498A" matches exactly."""
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def build_bm25_index(documents, index_dir):
+    """
+    Builds the index from an iterable of (chunk id, text) or (chunk id, text, act) tuples and
+    writes it to index_dir, replacing any previous index there atomically.
+    """
+    postings = defaultdict(list)  # term -> [(doc, tf)]
+    doc_lengths = []
+    ids = []
+    act_numbers = {}
+    doc_acts = []
+    tmp_dir = index_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    text_offsets = [0]
+    with open(os.path.join(tmp_dir, "texts.bin"), "wb") as texts_file:
+        for doc, (chunk_id, text, *act) in enumerate(documents):
+            doc_acts.append(act_numbers.setdefault(act[0], len(act_numbers))
+                            if act and act[0] else -1)
+            tokens = tokenize(text)
+            counts = defaultdict(int)
+            for token in tokens:
+                counts[token] += 1
+            for token, tf in counts.items():
+                postings[token].append((doc, min(tf, 65535)))
+            doc_lengths.append(len(tokens))
+            ids.append(chunk_id)
+            encoded = text.encode("utf-8")
+            texts_file.write(encoded)
+            text_offsets.append(text_offsets[-1] + len(encoded))
+
+    vocab = {term: term_id for term_id, term in enumerate(sorted(postings))}
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    postings_doc = np.empty(sum(len(p) for p in postings.values()), dtype=np.int32)
+    postings_tf = np.empty(len(postings_doc), dtype=np.uint16)
+    position = 0
+    for term, term_id in vocab.items():
+        entries = postings[term]
+        postings_doc[position:position + len(entries)] = [doc for doc, _ in entries]
+        postings_tf[position:position + len(entries)] = [tf for _, tf in entries]
+        position += len(entries)
+        offsets[term_id + 1] = position
+
+    np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp_dir, "postings_doc.npy"), postings_doc)
+    np.save(os.path.join(tmp_dir, "postings_tf.npy"), postings_tf)
+    np.save(os.path.join(tmp_dir, "doc_lengths.npy"), np.asarray(doc_lengths, dtype=np.int32))
+    np.save(os.path.join(tmp_dir, "text_offsets.npy"), np.asarray(text_offsets, dtype=np.int64))
+    if act_numbers:
+        np.save(os.path.join(tmp_dir, "doc_acts.npy"), np.asarray(doc_acts, dtype=np.int16))
+    with open(os.path.join(tmp_dir, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+    with open(os.path.join(tmp_dir, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "vocab": vocab,
+            "doc_count": len(doc_lengths),
+            "avg_doc_length": (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0,
+            "acts": list(act_numbers)
+        }, f)
+
+    old_dir = index_dir + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(index_dir):
+        os.replace(index_dir, old_dir)
+    os.replace(tmp_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return len(doc_lengths)
+
+
+class BM25Index:
+    """Read-only, memory-mapped BM25 index written by build_bm25_index."""
+
+    def __init__(self, index_dir, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        with open(os.path.join(index_dir, "vocab.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(index_dir, "ids.json"), "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        self.vocab = meta["vocab"]
+        self.doc_count = meta["doc_count"]
+        self.avg_doc_length = meta["avg_doc_length"] or 1.0
+        self.acts = meta.get("acts", [])
+
+        def load(name):
+            return np.load(os.path.join(index_dir, name), mmap_mode="r")
+
+        self.offsets = load("offsets.npy")
+        self.postings_doc = load("postings_doc.npy")
+        self.postings_tf = load("postings_tf.npy")
+        self.doc_lengths = load("doc_lengths.npy")
+        self.text_offsets = load("text_offsets.npy")
+        self.doc_acts = load("doc_acts.npy") if self.acts else None
+        self._texts_file = open(os.path.join(index_dir, "texts.bin"), "rb")
+        size = os.fstat(self._texts_file.fileno()).st_size
+        self._texts = (mmap.mmap(self._texts_file.fileno(), 0, access=mmap.ACCESS_READ)
+                       if size else b"")
+        # Length normalization is query-independent, so precompute it once
+        lengths = np.asarray(self.doc_lengths, dtype=np.float32)
+        self._norm = self.k1 * (1 - self.b + self.b * lengths / self.avg_doc_length)
+
+    def __len__(self):
+        return self.doc_count
+
+    def text(self, doc):
+        return self._texts[self.text_offsets[doc]:self.text_offsets[doc + 1]].decode("utf-8")
+
+    def search(self, query, k=3, acts=None):
+        """
+        Returns up to k (chunk id, text, score) tuples, best first; acts keeps only their chunks.
+        """
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.postings_doc[start:end]
+            tf = self.postings_tf[start:end].astype(np.float32)
+            idf = math.log(1 + (self.doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            # Each document appears once per posting list, so fancy-index += is safe
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self._norm[docs])
+        if acts and self.doc_acts is not None:
+            wanted = [n for n, act in enumerate(self.acts) if act in acts]
+            scores[~np.isin(self.doc_acts, wanted)] = 0
+
+        matched = np.count_nonzero(scores)
+        if not matched:
+            return []
+        k = min(k, matched)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[doc], self.text(doc), float(scores[doc])) for doc in top]
+
+    def close(self):
+        """Closes texts.bin and drops the memory-mapped arrays, which unmaps them."""
+        if isinstance(self._texts, mmap.mmap):
+            self._texts.close()
+        self._texts_file.close()
+        self.offsets = self.postings_doc = self.postings_tf = None
+        self.doc_lengths = self.text_offsets = self.doc_acts = None
+
+
+def reciprocal_rank_fusion(rankings, k=3, c=60):
+    """
+    Merges ranked lists of (key, item) pairs: each item scores sum(1 / (c + rank)) over the
+    lists it appears in. Returns the top k items.
+    """
+    scores = defaultdict(float)
+    items = {}
+    for ranking in rankings:
+        for rank, (key, item) in enumerate(ranking, start=1):
+            scores[key] += 1.0 / (c + rank)
+            items.setdefault(key, item)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [items[key] for key in best]
@@ -1,13 +1,178 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter # type: ignore
+import argparse
+import hashlib
+import json
+import re
 
-with open("legal_texts.txt", "r", encoding="utf-8") as f:
-    text = f.read()
+INPUT_FILE = "legal_texts.txt"
+OUTPUT_FILE = "legal_chunks.jsonl"
+CHUNK_SIZE = 1024
+CHUNK_OVERLAP = 100
 
-splitter = RecursiveCharacterTextSplitter(chunk_size=1024, chunk_overlap=100)
-chunks = splitter.split_text(text)
+# data_processing.py writes "### {law}" before each law's text
+LAW_HEADER = re.compile(r"^###\s+(.+?)\s*$")
+# "Section 144", "Sec. 144A", "Article 21", or a heading line like "144. Power to issue order..."
+SECTION_HEADING = re.compile(
+    r"^\s*(?:(?:Section|Sec\.|Article|Art\.)\s+(\d+[A-Z]*)\b|(\d+[A-Z]*)\.\s+[A-Z\[])"
+)
 
-# Save chunks for vector storage
-with open("legal_chunks.txt", "w", encoding="utf-8") as f:
-    for chunk in chunks:
-        f.write(chunk + "\n\n")
-print("completed chunk data")
\ No newline at end of file
+
+def _section_number(line):
+    match = SECTION_HEADING.match(line)
+    if not match:
+        return None
+    return match.group(1) or match.group(2)
+
+
+def _iter_lines(path):
+    """Yields (byte offset, decoded line) pairs, reading the file incrementally."""
+    offset = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            yield offset, raw.decode("utf-8")
+            offset += len(raw)
+
+
+def _split_long_line(offset, line, chunk_size, piece_size):
+    """
+    Splits a line longer than chunk_size at whitespace into pieces of about piece_size
+    characters, so an oversized line can still be overlapped. Byte offsets stay exact.
+    """
+    if len(line) <= chunk_size:
+        yield offset, line
+        return
+    while len(line) > piece_size:
+        cut = line.rfind(" ", 0, piece_size)
+        if cut <= 0:
+            cut = piece_size
+        piece = line[:cut + 1]
+        yield offset, piece
+        offset += len(piece.encode("utf-8"))
+        line = line[cut + 1:]
+    if line:
+        yield offset, line
+
+
+def _overlap_tail(pieces, chunk_overlap):
+    """
+    The end of a chunk to repeat at the start of the next, at most chunk_overlap characters: the
+    last whole lines that fit, then the tail of the line before them, cut at whitespace so no word
+    is split. Returns (pieces, size); byte offsets stay exact.
+    """
+    overlap, size = [], 0
+    for offset, line in reversed(pieces):
+        if size + len(line) <= chunk_overlap:
+            overlap.insert(0, (offset, line))
+            size += len(line)
+            continue
+        cut = line.find(" ", len(line) - (chunk_overlap - size))
+        tail = line[cut + 1:] if cut >= 0 else ""
+        if tail.strip():
+            overlap.insert(0, (offset + len(line[:cut + 1].encode("utf-8")), tail))
+            size += len(tail)
+        break
+    return overlap, size
+
+
+def _record(law, pieces, sections):
+    text = "".join(line for _, line in pieces).strip()
+    start = pieces[0][0]
+    end = pieces[-1][0] + len(pieces[-1][1].encode("utf-8"))
+    return {
+        "id": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        "law": law,
+        "section": sections[0] if sections else None,
+        "sections": sections,
+        "start": start,
+        "end": end,
+        "text": text,
+    }
+
+
+def chunk_legal_texts(path=INPUT_FILE, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Streams legal_texts.txt and yields one chunk record at a time, so memory stays bounded by
+    the chunk size rather than the corpus size.
+
+    Chunks never span two laws. A new section starts a new chunk unless the current chunk
+    still has room, so small consecutive sections are packed together (all of them are listed
+    in "sections"). Oversized sections are split with chunk_overlap characters of overlap.
+    """
+    law = None
+    pieces = []  # (byte offset, line) making up the current chunk
+    size = 0
+    sections = []
+    current_section = None
+
+    def flush():
+        nonlocal pieces, size, sections
+        record = None
+        if pieces and "".join(line for _, line in pieces).strip():
+            record = _record(law, pieces, sections)
+        pieces, size, sections = [], 0, []
+        return record
+
+    for offset, line in _iter_lines(path):
+        header = LAW_HEADER.match(line)
+        if header:
+            record = flush()
+            if record:
+                yield record
+            law = header.group(1)
+            current_section = None
+            continue
+
+        if not line.strip():
+            if pieces:
+                pieces.append((offset, line))
+            continue
+
+        number = _section_number(line)
+        if number is not None:
+            # Start a fresh chunk at a section heading unless the current one has plenty of room
+            if pieces and size + len(line) > chunk_size // 2:
+                record = flush()
+                if record:
+                    yield record
+            current_section = number
+            sections.append(number)
+
+        line_overlap = max(chunk_overlap // 2, 16)
+        for piece_offset, piece in _split_long_line(offset, line, chunk_size, line_overlap):
+            if pieces and size + len(piece) > chunk_size:
+                # Oversized section: carry the tail of this chunk over as overlap
+                overlap, overlap_size = _overlap_tail(pieces, chunk_overlap)
+                record = flush()
+                if record:
+                    yield record
+                pieces, size = overlap, overlap_size
+                if current_section is not None:
+                    sections = [current_section]
+            pieces.append((piece_offset, piece))
+            size += len(piece)
+
+    record = flush()
+    if record:
+        yield record
+
+
+def write_chunks(records, output_path=OUTPUT_FILE):
+    """Writes chunk records as JSON lines and returns how many were written."""
+    count = 0
+    with open(output_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split legal_texts.txt into JSONL chunks")
+    parser.add_argument("--input", default=INPUT_FILE)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    args = parser.parse_args()
+
+    chunks = chunk_legal_texts(args.input, args.chunk_size, args.chunk_overlap)
+    count = write_chunks(chunks, args.output)
+    print(f"completed chunk data: {count} chunks written to {args.output}")
@@ -0,0 +1,207 @@
+import functools
+import json
+import os
+import re
+from collections import defaultdict
+
+# (act, section number) -> chunk IDs, built at ingestion from the law/section metadata that
+# chunk_data.py attaches to every chunk. Queries that cite a provision ("Section 144 of CrPC",
+# "IPC 420", "Article 21") are answered from this table without running the embedding model.
+
+# Abbreviations and informal names people use for the acts in legal_sources.json
+ACT_ALIASES = {
+    "ipc": "indian penal code",
+    "penal code": "indian penal code",
+    "crpc": "code of criminal procedure",
+    "cr pc": "code of criminal procedure",
+    "cr p c": "code of criminal procedure",
+    "criminal procedure code": "code of criminal procedure",
+    "cpc": "code of civil procedure",
+    "civil procedure code": "code of civil procedure",
+    "bns": "bharatiya nyaya sanhita",
+    "nyaya sanhita": "bharatiya nyaya sanhita",
+    "constitution": "indian constitution",
+    "constitution of india": "indian constitution",
+    "indian contract act": "contract act",
+    "ica": "contract act",
+    "income tax act": "income tax act",
+    "it act": "information technology act",
+    "rti": "right to information act",
+    "rti act": "right to information act",
+    "consumer protection act": "consumer protection act",
+}
+# Aliases that are also ordinary words ("is it 3 years too late?") or other names: like the one-
+# and two-letter abbreviations act_aliases takes from official names ("(IT)"), they only name an
+# act when written as a title ("IT Act") or cited with a section word ("section 10 of the ICA")
+AMBIGUOUS_ALIASES = {"ica", "it act"}
+
+# A bare "s" is only taken as "section" in "s. 420 IPC", where the number sits next to the act
+SECTION_WORD = r"(?:sections?|secs?|articles?|arts?)"
+# Not a year: "IPC 1860", "Hindu Marriage Act 1955"
+SECTION_NUMBER = r"(?!(?:1[89]|[2-9]\d)\d\d\b)(\d+[a-z]?)"
+SECTION_REF = re.compile(rf"\b{SECTION_WORD}\.?\s*{SECTION_NUMBER}\b")
+ARTICLE_REF = re.compile(rf"\b(?:articles?|arts?)\.?\s*{SECTION_NUMBER}\b")
+SECTION_BEFORE = re.compile(rf"\b{SECTION_WORD}\s*{SECTION_NUMBER}\s+(?:of\s+)?(?:the\s+)?$")
+SECTION_AFTER = re.compile(rf"\s+{SECTION_WORD}\s*{SECTION_NUMBER}\b")
+
+
+def _words(text):
+    """text with every run of other characters replaced by one space, case kept."""
+    return re.sub(r"[^A-Za-z0-9]+", " ", text).strip()
+
+
+def _normalize(text):
+    return _words(text).lower()
+
+
+def canonical_act(name):
+    """
+    "THE BHARATIYA NYAYA SANHITA, 2023" -> "bharatiya nyaya sanhita"; "IPC" -> "indian penal code".
+    """
+    # "Information Technology (IT) Act" -> "Information Technology Act"
+    name = re.sub(r"\([^)]*\)", " ", name)
+    name = _normalize(name)
+    name = re.sub(r"^the\s+", "", name)
+    name = re.sub(r"\s+\d{4}$", "", name)  # trailing year
+    return ACT_ALIASES.get(name, name)
+
+
+def act_aliases(law_names):
+    """Every spelling that should resolve to one of law_names, longest first for matching."""
+    aliases = {}
+    for law in law_names:
+        key = canonical_act(law)
+        aliases[key] = key
+        # Parenthesised abbreviations in the official name, e.g. "(RTI)" -> "rti act" and "rti"
+        for abbreviation in re.findall(r"\(([^)]+)\)", law):
+            abbreviation = _normalize(abbreviation)
+            aliases[abbreviation] = key
+            aliases[abbreviation + " act"] = key
+    for alias, key in ACT_ALIASES.items():
+        aliases.setdefault(alias, key)
+    return dict(sorted(aliases.items(), key=lambda item: -len(item[0])))
+
+
+def is_ambiguous(alias):
+    """True for an alias that only names an act as a title or next to a section word."""
+    return alias in AMBIGUOUS_ALIASES or len(re.sub(r" act$", "", alias)) <= 2
+
+
+@functools.lru_cache(maxsize=16)
+def _alias_pattern(aliases):
+    # One alternation, longest alias first, so "code of criminal procedure" wins over "criminal"
+    alternatives = "|".join(re.escape(alias) for alias in sorted(aliases, key=len, reverse=True))
+    return re.compile(rf"\b({alternatives})\b")
+
+
+def _cited_as_act(words, text, span):
+    """Whether the ambiguous alias at span is a title ("IT Act") or cited with a section word."""
+    start, end = span
+    return (words[start:end].endswith(" Act") or SECTION_BEFORE.search(text[:start]) is not None
+            or SECTION_AFTER.match(text, end) is not None)
+
+
+def find_acts(query, aliases, explicit=False):
+    """
+    The acts query names, as (act key, span in the normalized query) in order of appearance.
+    Ambiguous aliases only count as titles or next to a section word, unless the query is
+    explicitly an act name (e.g. a filter).
+    """
+    if not aliases:
+        return []
+    words = _words(query)
+    text = words.lower()
+    return [
+        (aliases[match.group(1)], match.span())
+        for match in _alias_pattern(tuple(aliases)).finditer(text)
+        if explicit or not is_ambiguous(match.group(1)) or _cited_as_act(words, text, match.span())
+    ]
+
+
+def provision_number(text, span):
+    """
+    The number right after ("IPC 420") or before ("420 IPC", "s 420 IPC", "420 of the IPC") the act
+    named at span of the normalized text, or None.
+    """
+    after = re.match(rf"\s+{SECTION_NUMBER}\b", text[span[1]:])
+    before = re.search(rf"\b{SECTION_NUMBER}\s+(?:of\s+)?(?:the\s+)?$", text[:span[0]])
+    match = after or before
+    return match.group(1) if match else None
+
+
+def parse_citation(query, aliases):
+    """
+    Recognizes a citation of a single provision and returns (act key, section number), or None.
+
+    Handles "Section 144 of CrPC", "sec. 420 IPC", "s. 420 IPC", "IPC 420", "420 IPC" and
+    "Article 21" (which defaults to the Constitution when no act is named). A query citing more
+    than one provision ("section 302 IPC and section 103 BNS") is None as well, and left to search.
+    """
+    text = _normalize(query)
+    mentions = find_acts(query, aliases)
+    acts = {act for act, _ in mentions}
+    numbers = {match.group(1) for match in SECTION_REF.finditer(text)}
+    numbers.update(filter(None, (provision_number(text, span) for _, span in mentions)))
+    if len(acts) > 1 or len(numbers) != 1:
+        return None
+
+    act = acts.pop() if acts else None
+    if act is None and ARTICLE_REF.search(text):
+        act = aliases.get("constitution")
+    if act is None:
+        return None
+    return act, numbers.pop().upper()
+
+
+class CitationIndex:
+    """In-memory {act: {section: [chunk ids]}} table with JSON persistence."""
+
+    def __init__(self, table=None, law_names=()):
+        self.table = table or {}
+        self.aliases = act_aliases(law_names)
+
+    @classmethod
+    def build(cls, chunks):
+        """
+        chunks: iterable of (chunk id, metadata) with "law" and comma-joined "sections", in corpus
+        order.
+        """
+        table = defaultdict(lambda: defaultdict(list))
+        law_names = set()
+        for chunk_id, metadata in chunks:
+            law = (metadata or {}).get("law")
+            sections = (metadata or {}).get("sections")
+            if not law or not sections:
+                continue
+            law_names.add(law)
+            for section in sections.split(","):
+                table[canonical_act(law)][section.upper()].append(
+                    (metadata.get("start", 0), chunk_id))
+        ordered = {
+            act: {section: [chunk_id for _, chunk_id in sorted(entries)]
+                  for section, entries in sections.items()}
+            for act, sections in table.items()
+        }
+        return cls(ordered, sorted(law_names))
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"table": self.table, "aliases": self.aliases}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(data["table"])
+        index.aliases = data["aliases"]
+        return index
+
+    def lookup(self, query):
+        """Returns the chunk IDs of the provision query cites, or [] if it is no known citation."""
+        citation = parse_citation(query, self.aliases)
+        if citation is None:
+            return []
+        act, section = citation
+        return self.table.get(act, {}).get(section, [])
@@ -1,17 +1,18 @@
-import requests
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+import argparse
 import json
+import os
 import string
 
-def scrape_legal_definitions(letter):
-    url = f"https://thelawdictionary.org/letter/{letter}/"
-    response = requests.get(url)
+from fetcher import Fetcher
 
-    if response.status_code != 200:
-        print(f"Failed to retrieve data for letter '{letter}'.")
-        return None
+BASE_URL = "https://thelawdictionary.org/letter/{letter}/"
+OUTPUT_DIR = "legal_definitions"
+HTTP_CACHE_DIR = ".http_cache"
 
-    soup = BeautifulSoup(response.text, "html.parser")
+def parse_legal_definitions(html):
+    soup = BeautifulSoup(html, "html.parser")
     definitions = {}
 
     for term_section in soup.find_all("h2"):
@@ -28,14 +29,42 @@ def scrape_legal_definitions(letter):
 
     return definitions
 
-# Scrape definitions for a specific letter
-for letter in string.ascii_lowercase:
-    definitions = scrape_legal_definitions(letter)
+def scrape_legal_definitions(letter, fetcher, base_url=BASE_URL):
+    try:
+        result = fetcher.fetch(base_url.format(letter=letter))
+    except Exception as e:
+        print(f"Failed to retrieve data for letter '{letter}': {e}")
+        return None
+    return parse_legal_definitions(result.text())
+
+def scrape_letter(letter, fetcher, output_dir=OUTPUT_DIR, refresh=False, base_url=BASE_URL):
+    # The per-letter output file doubles as the checkpoint
+    output_path = os.path.join(output_dir, f"legal_definitions_{letter}.json")
+    if os.path.exists(output_path) and not refresh:
+        print(f"Definitions for {letter} already saved, skipping")
+        return
+
+    definitions = scrape_legal_definitions(letter, fetcher, base_url)
 
     # Save the results as a JSON file
     if definitions:
-        with open(f"legal_definitions_{letter}.json", "w", encoding="utf-8") as file:
+        with open(output_path, "w", encoding="utf-8") as file:
             json.dump(definitions, file, indent=4, ensure_ascii=False)
-        print(f"Definitions saved to legal_definitions_{letter}.json")
+        print(f"Definitions saved to {output_path}")
     else:
-        print(f"No definitions found for {letter}")
\ No newline at end of file
+        print(f"No definitions found for {letter}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape legal definitions for every letter")
+    parser.add_argument("--refresh", action="store_true",
+                        help="re-scrape letters that are already saved")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--min-interval", type=float, default=1.0,
+                        help="seconds between requests to the site")
+    args = parser.parse_args()
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    fetcher = Fetcher(HTTP_CACHE_DIR, min_interval=args.min_interval)
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(lambda letter: scrape_letter(letter, fetcher, OUTPUT_DIR, args.refresh),
+                      string.ascii_lowercase))
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests  # type: ignore
+
+# Shared fetch engine for the scrapers: per-host rate limiting, an on-disk response cache that
+# revalidates with ETag / Last-Modified, and per-source checkpoints so a failed run can resume.
+
+DEFAULT_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36")
+}
+
+
+def _atomic_write(path, data):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class HostRateLimiter:
+    """Spaces requests to one host at least min_interval seconds apart; other hosts run freely."""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class FetchResult:
+    def __init__(self, url, path, meta, not_modified):
+        self.url = url
+        self.path = path  # cached body on disk
+        self.content_type = meta.get("content_type", "")
+        self.not_modified = not_modified  # True when the server answered 304
+
+    def content(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def text(self):
+        return self.content().decode("utf-8", errors="replace")
+
+    @property
+    def is_pdf(self):
+        return "pdf" in self.content_type or self.url.lower().endswith(".pdf")
+
+
+class ResponseCache:
+    """Response bodies and their validators (ETag / Last-Modified), one pair of files per URL."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + ".body", base + ".json"
+
+    def load(self, url):
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if not os.path.exists(body_path):
+            return None
+        return meta, body_path
+
+    def store(self, url, response):
+        body_path, meta_path = self._paths(url)
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_type": response.headers.get("Content-Type", ""),
+            "fetched_at": time.time()
+        }
+        _atomic_write(body_path, response.content)
+        _atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+        return meta, body_path
+
+
+class Fetcher:
+    """Thread-safe HTTP fetcher; share one instance between worker threads."""
+
+    def __init__(self, cache_dir, min_interval=1.0, headers=None, pool_size=16):
+        self.cache = ResponseCache(cache_dir)
+        self.limiter = HostRateLimiter(min_interval)
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def fetch(self, url, timeout=15):
+        """
+        GETs url, revalidating any cached copy with a conditional request.
+
+        Raises:
+            requests.exceptions.RequestException: on network errors or non-2xx/304 responses
+        """
+        headers = {}
+        cached = self.cache.load(url)
+        if cached:
+            meta, _ = cached
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        self.limiter.wait(urlparse(url).netloc)
+        response = self.session.get(url, headers=headers, timeout=timeout)
+
+        if response.status_code == 304 and cached:
+            meta, body_path = cached
+            return FetchResult(url, body_path, meta, not_modified=True)
+
+        response.raise_for_status()
+        meta, body_path = self.cache.store(url, response)
+        return FetchResult(url, body_path, meta, not_modified=False)
+
+
+class Checkpoint:
+    """Per-source results, one JSON file each, written atomically as soon as a source completes."""
+
+    def __init__(self, checkpoint_dir):
+        self.checkpoint_dir = checkpoint_dir
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def _path(self, name):
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_")[:60]
+        digest = hashlib.sha256(name.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.checkpoint_dir, f"{slug}_{digest}.json")
+
+    def __contains__(self, name):
+        return os.path.exists(self._path(name))
+
+    def get(self, name):
+        try:
+            with open(self._path(name), "r", encoding="utf-8") as f:
+                return json.load(f)["value"]
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def set(self, name, value):
+        data = json.dumps({"name": name, "value": value}, ensure_ascii=False).encode("utf-8")
+        _atomic_write(self._path(name), data)
@@ -1,14 +1,18 @@
-import requests  # type: ignore
 from bs4 import BeautifulSoup  # type: ignore
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import argparse
 import json
-import time
 import re
 import fitz  # PyMuPDF
-import io
+
+from fetcher import Fetcher, Checkpoint
 
 # Load the JSON file with legal sources
 LEGAL_SOURCES_FILE = "legal_sources.json"
 OUTPUT_JSON_FILE = "law_data.json"
+HTTP_CACHE_DIR = ".http_cache"
+CHECKPOINT_DIR = "scrape_checkpoint"
+PDF_PAGES_PER_TASK = 25
 
 # Function to clean extracted text
 def clean_text(text):
@@ -17,46 +21,49 @@ def clean_text(text):
     text = re.sub(r"\n{2,}", "\n", text)  # Remove excessive newlines
     return text.strip()
 
-# Function to extract text from PDF URL
-def scrape_pdf_text(pdf_url):
-    """Download and extract text from a PDF file given its URL."""
-    try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
-        }
-        response = requests.get(pdf_url, headers=headers, timeout=15)
-        response.raise_for_status()
-
-        with fitz.open(stream=io.BytesIO(response.content), filetype="pdf") as doc:
-            text = "\n".join(page.get_text() for page in doc)
-            return clean_text(text) if text else None
-
-    except Exception as e:
-        print(f"❌ Error processing PDF {pdf_url}: {e}")
-        return None
-
-# Function to scrape legal text from an HTML page
-def scrape_law_text(url):
-    """Scrapes the main legal content from the given URL."""
-    try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        # Extract text using common legal content classes
-        law_sections = soup.find_all(["span", "section", "div", "p", "pre"], class_=lambda x: x and "akn-" in x)
-
-        # Combine extracted text
-        law_text = "\n".join(section.get_text(separator="\n", strip=True) for section in law_sections)
-        return clean_text(law_text) if law_text else None
-
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Error fetching {url}: {e}")
-        return None
+def _extract_pages(pdf_path, start, stop):
+    """Runs in a worker process: text of pages [start, stop) of the PDF."""
+    with fitz.open(pdf_path) as doc:
+        return [doc[i].get_text() for i in range(start, stop)]
+
+# Function to extract text from a downloaded PDF
+def extract_pdf_text(pdf_path, pdf_pool):
+    """Extract text from a PDF page by page, spreading page ranges over a process pool."""
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+
+    futures = [
+        pdf_pool.submit(_extract_pages, pdf_path, start,
+                        min(start + PDF_PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PDF_PAGES_PER_TASK)
+    ]
+    text = "\n".join(page for future in futures for page in future.result())
+    return clean_text(text) if text else None
+
+# Function to extract legal text from an HTML page
+def extract_law_text(html):
+    """Extracts the main legal content from a law's HTML page."""
+    soup = BeautifulSoup(html, "html.parser")
+
+    # Extract text using common legal content classes
+    law_sections = soup.find_all(["span", "section", "div", "p", "pre"],
+                                 class_=lambda x: x and "akn-" in x)
+
+    # Combine extracted text
+    law_text = "\n".join(section.get_text(separator="\n", strip=True) for section in law_sections)
+    return clean_text(law_text) if law_text else None
+
+def scrape_source(fetcher, pdf_pool, law, checkpoint):
+    """
+    Fetches and parses one legal source. If the server says our cached copy is still current
+    and we already have its text checkpointed, parsing is skipped entirely.
+    """
+    result = fetcher.fetch(law["url"], timeout=30)
+    if result.not_modified and law["name"] in checkpoint:
+        return checkpoint.get(law["name"])
+    if result.is_pdf:
+        return extract_pdf_text(result.path, pdf_pool)
+    return extract_law_text(result.text())
 
 # Function to save data in JSON format
 def save_json(data, filename=OUTPUT_JSON_FILE):
@@ -68,36 +75,60 @@ def save_json(data, filename=OUTPUT_JSON_FILE):
     except Exception as e:
         print(f"❌ Error saving JSON: {e}")
 
-# Load legal sources from JSON
-try:
-    with open(LEGAL_SOURCES_FILE, "r", encoding="utf-8") as f:
-        laws = json.load(f)
-except Exception as e:
-    print(f"❌ Error loading {LEGAL_SOURCES_FILE}: {e}")
-    exit(1)
-
-# Dictionary to store scraped data
-legal_data = {}
-
-# Iterate through legal sources and scrape data
-for law in laws:
-    law_name = law["name"]
-    url = law["url"]
-
-    print(f"📜 Scraping: {law_name} ({url})")
-
-    if url.lower().endswith(".pdf"):
-        law_text = scrape_pdf_text(url)
-    else:
-        law_text = scrape_law_text(url)
-
-    if law_text:
-        legal_data[law_name] = law_text
-        print(f"✅ Successfully scraped: {law_name}")
-    else:
-        print(f"⚠️ No data found for {law_name}, skipping...")
+def scrape_all(laws, fetcher, checkpoint, refresh=False, workers=8):
+    """
+    Scrapes every source concurrently (rate-limited per host by the fetcher) and checkpoints
+    each one as soon as it completes. Without refresh, sources checkpointed by an earlier run
+    are not fetched again, so a failed run resumes where it stopped.
+    """
+    todo = [law for law in laws if refresh or law["name"] not in checkpoint]
+    print(f"📜 Scraping {len(todo)} of {len(laws)} sources "
+          f"({len(laws) - len(todo)} already checkpointed)")
+
+    with ProcessPoolExecutor() as pdf_pool, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(scrape_source, fetcher, pdf_pool, law, checkpoint): law
+                   for law in todo}
+        for future in as_completed(futures):
+            law = futures[future]
+            try:
+                law_text = future.result()
+            except Exception as e:
+                print(f"❌ Error scraping {law['name']} ({law['url']}): {e}")
+                continue
+            if law_text:
+                checkpoint.set(law["name"], law_text)
+                print(f"✅ Successfully scraped: {law['name']}")
+            else:
+                print(f"⚠️ No data found for {law['name']}, skipping...")
+
+    # Keep the order of legal_sources.json
+    legal_data = {}
+    for law in laws:
+        law_text = checkpoint.get(law["name"])
+        if law_text:
+            legal_data[law["name"]] = law_text
+    return legal_data
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape the legal sources into law_data.json")
+    parser.add_argument("--refresh", action="store_true",
+                        help="revalidate checkpointed sources too "
+                             "(unchanged pages are not re-downloaded)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--min-interval", type=float, default=2.0,
+                        help="seconds between requests to one host")
+    args = parser.parse_args()
+
+    # Load legal sources from JSON
+    try:
+        with open(LEGAL_SOURCES_FILE, "r", encoding="utf-8") as f:
+            laws = json.load(f)
+    except Exception as e:
+        print(f"❌ Error loading {LEGAL_SOURCES_FILE}: {e}")
+        exit(1)
 
-    time.sleep(2)  # Avoid being rate-limited or blocked
+    fetcher = Fetcher(HTTP_CACHE_DIR, min_interval=args.min_interval)
+    legal_data = scrape_all(laws, fetcher, Checkpoint(CHECKPOINT_DIR), args.refresh, args.workers)
 
-# Save scraped data to JSON
-save_json(legal_data)
+    # Save scraped data to JSON
+    save_json(legal_data)
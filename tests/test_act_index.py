@@ -0,0 +1,119 @@
+import json
+import os
+import sys
+import uuid
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "dataset")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "benchmarks")))
+
+import vector_database
+from act_index import ActIndex
+from bm25_index import build_bm25_index
+from corpus import build_synthetic_index
+from stub_embedder import StubEmbeddings
+
+LAWS = ["THE INDIAN PENAL CODE, 1860", "The Code of Criminal Procedure, 1973",
+        "The Hindu Marriage Act, 1955"]
+
+
+def _metadata(law):
+    return {"law": law, "act": vector_database.chunk_metadata({"law": law})["act"]}
+
+
+def test_keyword_routing_and_centroids(tmp_path):
+    vectors = {LAWS[0]: [1.0, 0.0, 0.0], LAWS[1]: [0.0, 1.0, 0.0], LAWS[2]: [0.0, 0.0, 1.0]}
+    acts = ActIndex.build((_metadata(law), vector) for law in LAWS for vector in [vectors[law]] * 2)
+    acts.save(str(tmp_path / "acts"))
+    acts = ActIndex.load(str(tmp_path / "acts"))
+
+    assert acts.acts["indian penal code"] == {"name": LAWS[0], "chunks": 2}
+    assert acts.mentioned("Is divorce by mutual consent allowed under the Hindu Marriage Act?") == [
+        "hindu marriage act"
+    ]
+    assert acts.mentioned("Bail under CrPC for an IPC offence") == [
+        "code of criminal procedure", "indian penal code"
+    ]
+    assert acts.mentioned("Can my landlord evict me?") == []
+    assert acts.resolve(["IPC", "the Code of Criminal Procedure", "Motor Vehicles Act"]) == [
+        "indian penal code", "code of criminal procedure"
+    ]
+
+    it_act = ActIndex.build([(_metadata("Information Technology (IT) Act, 2000"), None)])
+    assert it_act.mentioned("Does it act as a bar? What is it for?") == []
+    assert it_act.mentioned("Hacking under section 66 of the IT Act") == [
+        "information technology act"
+    ]
+    assert it_act.mentioned("The FIR was filed in March, is it 3 years?") == []
+    assert it_act.mentioned("is it 2 months too late?") == []
+    assert it_act.mentioned("Was it 2019 or was it 2020?") == []
+    assert it_act.resolve(["IT Act"]) == ["information technology act"]
+
+    assert acts.nearest([0.9, 0.1, 0.0]) == ["indian penal code"]
+    assert acts.nearest([0.7, 0.7, 0.0], margin=0.05) == [
+        "indian penal code", "code of criminal procedure"
+    ]
+    assert acts.nearest([0.0, 0.0, -1.0]) == []  # closest to nothing
+
+
+@pytest.fixture
+def synthetic_store(tmp_path, monkeypatch):
+    embeddings = StubEmbeddings(dim=64)
+    records = build_synthetic_index(str(tmp_path), embeddings, sections=30)
+    index_dir = str(tmp_path / "index")
+    for name, file in [("CHROMA_DB_PATH", ""), ("FLAT_INDEX_PATH", "flat"),
+                       ("INDEX_VERSION_FILE", "index_version"), ("BM25_PATH", "bm25"),
+                       ("CITATIONS_PATH", "citations.json"), ("ACTS_PATH", "acts"),
+                       ("SNAPSHOTS_PATH", "snapshots"), ("CURRENT_SNAPSHOT_FILE", "CURRENT")]:
+        monkeypatch.setattr(vector_database, name, os.path.join(index_dir, file))
+    monkeypatch.setattr(vector_database, "_snapshot", None)
+    monkeypatch.setattr(vector_database, "VECTOR_BACKEND", "flat")
+    monkeypatch.setattr(vector_database, "_embeddings", None)
+    monkeypatch.setitem(vector_database._component_states, "embeddings", "not_loaded")
+    monkeypatch.setattr(vector_database.embedding_batcher, "window", 0)
+    vector_database.use_embeddings(embeddings)
+    yield {vector_database.chunk_id(record["text"]): record["law"] for record in records}
+    vector_database.query_cache.clear()
+
+
+@pytest.mark.parametrize("mode", ["dense", "hybrid"])
+def test_search_documents_stays_within_the_routed_act(synthetic_store, monkeypatch, mode):
+    laws = synthetic_store
+    question = "punishment and fine for cheating under the Indian Contract Act"
+    found = vector_database.search_documents(question, k=5, mode=mode)
+    assert len(found) == 5
+    assert {laws[vector_database.chunk_id(text)] for text in found} == {"Indian Contract Act"}
+
+    found = vector_database.search_documents("punishment and fine for cheating", k=5, mode=mode,
+                                             acts=["IPC"])
+    assert {laws[vector_database.chunk_id(text)] for text in found} == {"Indian Penal Code"}
+
+    monkeypatch.setattr(vector_database, "ACT_ROUTING", "off")
+    found = vector_database.search_documents(question, k=20, mode=mode)
+    assert len({laws[vector_database.chunk_id(text)] for text in found}) > 1
+
+
+def test_centroid_routing_picks_the_closest_act(synthetic_store, monkeypatch):
+    monkeypatch.setattr(vector_database, "ACT_ROUTING", "centroid")
+    monkeypatch.setattr(vector_database, "ACT_ROUTING_MIN_SCORE", 0.0)
+    acts = vector_database.get_act_index()
+    centroid = acts.centroids[acts.keys.index("hindu marriage act")]
+    monkeypatch.setattr(vector_database, "embed_query",
+                        lambda query: centroid + 0.01 * np.ones_like(centroid))
+    assert vector_database.route_query("what happens after the wedding")[0] == "hindu marriage act"
+    assert vector_database.route_query("an IPC question") == ["indian penal code"]  # keywords first
+
+
+def test_hybrid_fusion_ignores_how_chunks_are_keyed(synthetic_store, tmp_path, monkeypatch):
+    question = "punishment and fine for cheating"
+    expected = vector_database.search_documents(question, k=5, mode="hybrid")
+    with open(tmp_path / "legal_chunks.jsonl", "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    # A store from before content-hash IDs: the same chunks under random IDs
+    build_bm25_index(((uuid.uuid4().hex, record["text"],
+                       vector_database.chunk_metadata(record)["act"]) for record in records),
+                     vector_database.BM25_PATH)
+    monkeypatch.setattr(vector_database, "_snapshot", None)
+    assert vector_database.search_documents(question, k=5, mode="hybrid") == expected
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from admission import (
+    AdmissionController, DeadlineExceeded, Rejected, bounded, expired, parse_timeout, remaining,
+    set_deadline, use_deadline
+)
+
+
+@pytest.fixture(autouse=True)
+def no_deadline_left_behind():
+    yield
+    use_deadline(None)
+
+
+def test_deadline_helpers():
+    assert parse_timeout("2.5") == 2.5
+    assert parse_timeout("soon") is None and parse_timeout("-1") is None
+    assert parse_timeout(None) is None
+    set_deadline(10)
+    assert 9 < remaining() <= 10
+    assert bounded(100) <= 10 and bounded(1) == 1
+    set_deadline(0.01)
+    time.sleep(0.02)
+    assert expired()
+    with pytest.raises(DeadlineExceeded):
+        bounded(5)
+    assert issubclass(DeadlineExceeded, TimeoutError)
+
+
+def test_queue_is_bounded_and_waiters_get_freed_slots():
+    set_deadline(5)
+    controller = AdmissionController(max_active=1, max_queued=1)
+    ticket = controller.enter()
+    admitted = threading.Event()
+
+    def waiter():
+        set_deadline(5)
+        with controller.admit():
+            admitted.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    while controller.stats()["waiting"] < 1:
+        time.sleep(0.005)
+    with pytest.raises(Rejected) as rejected:
+        controller.enter()
+    assert rejected.value.status == 429 and rejected.value.retry_after >= 1
+
+    controller.leave(ticket)
+    thread.join(timeout=1)
+    assert admitted.is_set()
+    stats = controller.stats()
+    assert stats["active"] == 0 and stats["admitted"] == 2 and stats["rejected"] == 1
+
+
+def test_deadline_passing_in_the_queue_is_a_503():
+    controller = AdmissionController(max_active=1, max_queued=4)
+    set_deadline(5)
+    ticket = controller.enter()
+
+    async def run():
+        set_deadline(0.05)
+        with pytest.raises(Rejected) as rejected:
+            await controller.enter_async()
+        assert rejected.value.status == 503
+
+        set_deadline(5)
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, controller.leave, ticket)
+        async with controller.admit_async():
+            assert controller.stats()["active"] == 1
+
+    asyncio.run(run())
+    assert controller.stats() | {"avg_service_s": 0} == {
+        "active": 0, "waiting": 0, "max_active": 1, "max_queued": 4, "admitted": 2, "rejected": 1,
+        "timed_out_in_queue": 1, "avg_service_s": 0
+    }
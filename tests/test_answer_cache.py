@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from answer_cache import AnswerCache, make_key, normalize_query
+
+
+def test_normalized_queries_share_a_key():
+    """Case, whitespace and trailing punctuation should not change the key"""
+    chunks = ["Section 10. All agreements are contracts..."]
+    assert normalize_query("  Explain Indian   contract law? ") == "explain indian contract law"
+    assert (make_key("Explain Indian contract law.", chunks)
+            == make_key("explain indian contract law", chunks))
+
+
+def test_different_chunks_give_different_keys():
+    """A changed retrieval result must not reuse an old answer"""
+    assert make_key("q", ["a", "b"]) != make_key("q", ["b", "a"])
+
+
+def test_hit_miss_and_lru_eviction():
+    cache = AnswerCache(max_entries=2, ttl=60, max_bytes=1024)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"  # "b" is now least recently used
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("c") == "3"
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1 and stats["evictions"] == 1
+
+
+def test_ttl_expiry():
+    cache = AnswerCache(max_entries=10, ttl=0.01, max_bytes=1024)
+    cache.put("a", "1")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_memory_cap():
+    cache = AnswerCache(max_entries=10, ttl=60, max_bytes=10)
+    cache.put("a", "x" * 5)
+    cache.put("b", "y" * 5)
+    assert cache.stats()["bytes"] <= 10
+    assert cache.get("a") is None
+    cache.put("c", "z" * 100)  # larger than the whole cache, never stored
+    assert cache.get("c") is None
+
+
+def test_invalidated_when_index_version_changes():
+    version = [1]
+    cache = AnswerCache(max_entries=10, ttl=60, max_bytes=1024, version_fn=lambda: version[0])
+    cache.put("a", "1")
+    assert cache.get("a") == "1"
+    version[0] = 2
+    assert cache.get("a") is None
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+from starlette.testclient import TestClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "benchmarks")))
+
+import app
+import asgi_app
+import chatbot
+from admission import DEADLINE_HEADER, AdmissionController, remaining
+from fake_ollama import FakeOllama
+from llm_pool import LLMPool
+
+
+def _dead_url():
+    """A local port nothing listens on."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+@pytest.fixture
+def ollama():
+    server = FakeOllama(tokens=3, token_ms=0, prefill_ms=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def slow_ollama():
+    server = FakeOllama(tokens=3, token_ms=0, prefill_ms=2000)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def use_llm(monkeypatch):
+    """Points the backend at the given Ollama URL, without retrieval or cached answers."""
+    monkeypatch.setattr(chatbot, "search_documents", lambda query: [])
+    chatbot.answer_cache.clear()
+
+    def use(url):
+        monkeypatch.setattr(chatbot, "llm_pool", LLMPool([url]))
+
+    yield use
+    chatbot.answer_cache.clear()
+
+
+def test_ask_reports_llm_failures_with_their_status(use_llm, ollama, monkeypatch):
+    client = app.app.test_client()
+
+    use_llm(ollama.url)
+    response = client.post("/ask", json={"query": "What is bail?"})
+    assert response.status_code == 200 and response.get_json()["response"]
+
+    use_llm(_dead_url())
+    response = client.post("/ask", json={"query": "What is a warrant?"})
+    assert response.status_code == 503 and response.headers["Retry-After"]
+
+    use_llm(ollama.url)
+    monkeypatch.setattr(ollama, "error_rate", 1.0)  # every request gets a 500
+    response = client.post("/ask", json={"query": "What is a summons?"})
+    assert response.status_code == 503 and response.headers["Retry-After"]
+
+    monkeypatch.setattr(ollama, "error_rate", 0.0)
+    # A 404: the endpoint is up but gives no answer
+    monkeypatch.setattr(chatbot, "API_PATH", "/api/missing")
+    response = client.post("/ask", json={"query": "What is an FIR?"})
+    assert response.status_code == 502 and response.headers["Retry-After"]
+    assert "error" in response.get_json()
+
+
+def test_a_deadline_ends_with_its_request(use_llm, slow_ollama, monkeypatch):
+    client = app.app.test_client()  # both requests run on this thread
+    use_llm(slow_ollama.url)
+    response = client.post("/ask", json={"query": "What is bail?"},
+                           headers={DEADLINE_HEADER: "0.3"})
+    assert response.status_code == 504
+
+    def search(query):
+        remaining()  # the embedding checks the deadline the same way
+        return ["chunk"]
+
+    monkeypatch.setattr(chatbot, "search_documents", search)
+    response = client.post("/debug_search", json={"query": "What is a warrant?"})
+    assert response.status_code == 200 and response.get_json() == {"retrieved": ["chunk"]}
+
+
+def _asgi_post(monkeypatch, body, **kwargs):
+    # Every TestClient request runs on a new event loop, which the pooled httpx client can't outlive
+    monkeypatch.setattr(chatbot, "_async_client", None)
+    return TestClient(asgi_app.app).post("/ask", json=body, **kwargs)
+
+
+def test_asgi_streams_the_answer_as_ndjson(use_llm, ollama, monkeypatch):
+    use_llm(ollama.url)
+    response = _asgi_post(monkeypatch, {"query": "What is bail?", "stream": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 4 and all(line["token"] for line in lines[:3])
+    assert lines[-1]["done"] and "total" in lines[-1]["timings"]
+
+
+def test_asgi_turns_requests_away_when_full(use_llm, ollama, monkeypatch):
+    use_llm(ollama.url)
+    admission = AdmissionController(1, max_queued=0)
+    monkeypatch.setattr(asgi_app, "admission", admission)
+    ticket = admission.enter()  # the only slot is taken
+    try:
+        response = _asgi_post(monkeypatch, {"query": "What is bail?"})
+    finally:
+        admission.leave(ticket)
+    assert response.status_code == 429 and int(response.headers["Retry-After"]) >= 1
+
+
+def test_asgi_answers_504_at_the_deadline(use_llm, slow_ollama, monkeypatch):
+    use_llm(slow_ollama.url)
+    response = _asgi_post(monkeypatch, {"query": "What is bail?"}, headers={DEADLINE_HEADER: "0.3"})
+    assert response.status_code == 504
+
+    response = _asgi_post(monkeypatch, {"query": "What is bail?", "stream": True},
+                          headers={DEADLINE_HEADER: "0.3"})
+    assert json.loads(response.text.splitlines()[-1]) == {"error": "Request timed out.",
+                                                          "status": 504}
+
+
+def _recording_generate(seen, seconds):
+    def generate(query, summary, history):
+        seen.append([exchange["user"] for exchange in history])
+        time.sleep(seconds)  # the turns are in flight at once
+        return f"answer to {query}", None
+    return generate
+
+
+def _run_threads(target, args):
+    threads = [threading.Thread(target=target, args=arg) for arg in args]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_turns_of_one_conversation_see_each_other(monkeypatch):
+    seen = []
+    monkeypatch.setattr(chatbot, "_generate", _recording_generate(seen, 0.05))
+
+    def turn(query, conversation_id):
+        with chatbot.conversation_turn(conversation_id):
+            chatbot.ask_llm_with_context(query, conversation_id)
+
+    _run_threads(turn, [(f"q{i}", "c-sync") for i in range(3)])
+    chatbot.conversations.reset("c-sync")
+    assert [len(history) for history in seen] == [0, 1, 2]
+
+
+def test_anonymous_turns_run_at_once_without_history(monkeypatch):
+    seen = []
+    monkeypatch.setattr(chatbot, "_generate", _recording_generate(seen, 0.3))
+
+    def turn(query):
+        with chatbot.conversation_turn(None):
+            chatbot.ask_llm_with_context(query)
+
+    started = time.monotonic()
+    _run_threads(turn, [(f"anonymous q{i}",) for i in range(3)])
+    assert time.monotonic() - started < 0.8  # not one after the other
+    assert seen == [[], [], []]
+
+
+def test_async_turns_of_one_conversation_see_each_other(monkeypatch):
+    seen = []
+
+    async def generate(query, summary, history):
+        seen.append([exchange["user"] for exchange in history])
+        await asyncio.sleep(0.05)
+        return f"answer to {query}", None
+
+    async def turn(query, conversation_id):
+        async with chatbot.conversation_turn_async(conversation_id):
+            await chatbot.ask_llm_with_context_async(query, conversation_id)
+
+    async def turns():
+        await asyncio.gather(*(turn(f"q{i}", "c-async") for i in range(3)))
+
+    monkeypatch.setattr(chatbot, "_generate_async", generate)
+    asyncio.run(turns())
+    chatbot.conversations.reset("c-async")
+    assert [len(history) for history in seen] == [0, 1, 2]
+
+
+def test_a_turn_waits_for_its_conversation_without_a_slot(use_llm, ollama, monkeypatch):
+    use_llm(ollama.url)
+    monkeypatch.setattr(app, "admission", AdmissionController(1, max_queued=0))
+    statuses = {}
+
+    def waiting_turn():
+        response = app.app.test_client().post(
+            "/ask", json={"query": "What is bail?", "conversationId": "c-busy"},
+            headers={DEADLINE_HEADER: "0.5"}
+        )
+        statuses["waiting"] = response.status_code
+
+    with chatbot.conversations.lock("c-busy"):  # a turn of c-busy is in progress
+        waiting = threading.Thread(target=waiting_turn)
+        waiting.start()
+        time.sleep(0.1)
+        response = app.app.test_client().post("/ask", json={"query": "What is a warrant?"})
+        statuses["other"] = response.status_code
+        waiting.join()
+    assert statuses == {"waiting": 504, "other": 200}
@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+
+import numpy as np
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "benchmarks")))
+
+import results
+from fake_ollama import FakeOllama
+from retrieval_recall import exact_top_k, recall
+from stub_embedder import StubEmbeddings
+
+
+def test_percentiles():
+    values = [0.1 * i for i in range(1, 101)]
+    assert results.percentile(values, 50) == values[49] + (values[50] - values[49]) * 0.5
+    assert (results.percentile(values, 99) > results.percentile(values, 95)
+            > results.percentile(values, 50))
+    assert results.percentile([], 50) is None
+    assert results.summarize_latencies([0.01, 0.02])["p50_ms"] == 15.0
+
+
+def test_compare_flags_regressions_by_direction():
+    baseline = {"results": {"ask": {"p95_ms": 100.0, "throughput_rps": 10.0, "error_rate": 0.0,
+                                    "requests": 50}}}
+    current = {"results": {"ask": {"p95_ms": 105.0, "throughput_rps": 8.0, "error_rate": 0.05,
+                                   "requests": 10}}}
+    regressed = {metric for _, metric, _, _, _, flag
+                 in results.compare(baseline, current, tolerance=0.1) if flag}
+    # 5% slower is within tolerance; counts are not judged
+    assert regressed == {"throughput_rps", "error_rate"}
+
+
+def test_stub_embedder_is_deterministic_and_lexical():
+    first, second = StubEmbeddings(dim=64), StubEmbeddings(dim=64)
+    assert (first.embed_query("Bail under Section 437")
+            == second.embed_query("bail under section 437"))
+    tenant, landlord, theft = (np.array(v) for v in first.embed_documents(
+        ["rights of a tenant under a lease", "duties of a landlord under a lease",
+         "punishment for theft"]
+    ))
+    assert tenant @ landlord > tenant @ theft
+    assert abs(np.linalg.norm(tenant) - 1) < 1e-5
+
+
+def test_fake_ollama_streams_with_token_counts():
+    server = FakeOllama(tokens=5, token_ms=0, prefill_ms=0)
+    url = server.start()
+    try:
+        body = {"model": "llama3.2", "messages": [{"role": "user", "content": "hi"}],
+                "stream": True}
+        with requests.post(url + "/api/chat", json=body, stream=True, timeout=10) as response:
+            chunks = [json.loads(line) for line in response.iter_lines() if line]
+        assert len(chunks) == 6 and chunks[-1]["done"]
+        assert chunks[-1]["eval_count"] == 5 and chunks[-1]["eval_duration"] >= 0
+        assert "".join(chunk["message"]["content"] for chunk in chunks).count(" ") == 5
+
+        body = {"model": "llama3.2", "prompt": "", "stream": False}
+        response = requests.post(url + "/api/generate", json=body, timeout=10)
+        assert response.json()["done_reason"] == "load"
+        assert server.requests == 2
+    finally:
+        server.stop()
+
+
+def test_exact_top_k_and_recall():
+    vectors = np.eye(4, dtype=np.float32)
+    queries = np.array([[0.9, 0.1, 0, 0], [0, 0, 0.2, 1]], dtype=np.float32)
+    truth = exact_top_k(vectors, queries, 2).tolist()
+    assert truth == [[0, 1], [3, 2]]
+    assert recall([[0, 2], [3, 2]], truth) == 0.75
@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "dataset")))
+
+from bm25_index import BM25Index, build_bm25_index, reciprocal_rank_fusion
+
+DOCUMENTS = [
+    ("ipc-420", "420. Cheating and dishonestly inducing delivery of property."),
+    ("ipc-415", "415. Cheating. Whoever, by deceiving any person, fraudulently induces the person "
+                "deceived."),
+    ("crpc-144", "144. Power to issue order in urgent cases of nuisance or apprehended danger."),
+    ("hma-24", "24. Maintenance pendente lite and expenses of proceedings."),
+]
+
+
+def test_exact_section_number_ranks_first(tmp_path):
+    build_bm25_index(DOCUMENTS, str(tmp_path / "bm25"))
+    index = BM25Index(str(tmp_path / "bm25"))
+    results = index.search("What does section 144 say?", k=2)
+    assert results[0][0] == "crpc-144"
+    assert results[0][1] == DOCUMENTS[2][1]
+    assert index.search("unrelated words", k=3) == []
+    index.close()
+
+
+def test_rebuild_replaces_index(tmp_path):
+    build_bm25_index(DOCUMENTS, str(tmp_path / "bm25"))
+    build_bm25_index(DOCUMENTS[:1], str(tmp_path / "bm25"))
+    index = BM25Index(str(tmp_path / "bm25"))
+    assert len(index) == 1
+    assert [id_ for id_, _, _ in index.search("cheating", k=3)] == ["ipc-420"]
+
+
+def test_act_filter_keeps_only_that_acts_chunks(tmp_path):
+    acts = ["indian penal code", "indian penal code", "code of criminal procedure",
+            "hindu marriage act"]
+    build_bm25_index([(id_, text, act) for (id_, text), act in zip(DOCUMENTS, acts)],
+                     str(tmp_path / "bm25"))
+    index = BM25Index(str(tmp_path / "bm25"))
+    results = index.search("cheating order maintenance", k=4, acts=["hindu marriage act"])
+    assert [id_ for id_, _, _ in results] == ["hma-24"]
+    assert len(index.search("cheating order maintenance", k=4)) == 4
+    index.close()
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    dense = [("a", "A"), ("b", "B"), ("c", "C")]
+    lexical = [("c", "C"), ("b", "B"), ("d", "D")]
+    # Found by both retrievers beats ranked first by only one
+    assert sorted(reciprocal_rank_fusion([dense, lexical], k=2)) == ["B", "C"]
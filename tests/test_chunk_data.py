@@ -0,0 +1,67 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "dataset")))
+
+from chunk_data import chunk_legal_texts
+
+LEGAL_TEXT = (
+    "### Code of Criminal Procedure\n"
+    "144. Power to issue order in urgent cases of nuisance or apprehended danger.\n"
+    + "(1) In cases where, in the opinion of a District Magistrate, there is sufficient ground. "
+    * 20 + "\n"
+    "145. Procedure where dispute concerning land or water is likely to cause breach of peace.\n"
+    "Whenever an Executive Magistrate is satisfied from a report of a police officer.\n"
+    "\n"
+    "### Indian Penal Code\n"
+    "420. Cheating and dishonestly inducing delivery of property.\n"
+    "Whoever cheats shall be punished with imprisonment.\n"
+)
+
+
+def _chunks(tmp_path, **kwargs):
+    path = tmp_path / "legal_texts.txt"
+    path.write_text(LEGAL_TEXT, encoding="utf-8")
+    return path.read_bytes(), list(chunk_legal_texts(str(path), **kwargs))
+
+
+def test_chunks_carry_law_and_section(tmp_path):
+    _, chunks = _chunks(tmp_path, chunk_size=400, chunk_overlap=100)
+    assert {chunk["law"] for chunk in chunks} == {"Code of Criminal Procedure", "Indian Penal Code"}
+    ipc = [chunk for chunk in chunks if chunk["law"] == "Indian Penal Code"]
+    assert len(ipc) == 1 and ipc[0]["section"] == "420"
+    assert "### " not in "".join(chunk["text"] for chunk in chunks)
+    assert any(chunk["section"] == "145" and chunk["text"].startswith("145.") for chunk in chunks)
+
+
+def test_oversized_section_is_split_with_overlap(tmp_path):
+    _, chunks = _chunks(tmp_path, chunk_size=400, chunk_overlap=100)
+    section_144 = [chunk for chunk in chunks if chunk["section"] == "144"]
+    assert len(section_144) > 1
+    assert all(len(chunk["text"]) <= 400 for chunk in chunks)
+    for first, second in zip(section_144, section_144[1:]):
+        assert second["start"] < first["end"]
+
+
+def test_byte_offsets_and_ids(tmp_path):
+    raw, chunks = _chunks(tmp_path)
+    for chunk in chunks:
+        assert raw[chunk["start"]:chunk["end"]].decode("utf-8").strip() == chunk["text"]
+    assert len({chunk["id"] for chunk in chunks}) == len(chunks)
+
+
+def test_overlap_carries_the_tail_of_long_lines(tmp_path):
+    line = ("Whoever dishonestly receives stolen property worth more than ₹ 500, knowing it to "
+            "be stolen, shall be punished. ")
+    path = tmp_path / "legal_texts.txt"
+    path.write_text("### Indian Penal Code\n411. Dishonestly receiving stolen property.\n"
+                    + (line + "\n") * 8, encoding="utf-8")
+    raw = path.read_bytes()
+    chunks = list(chunk_legal_texts(str(path), chunk_size=400, chunk_overlap=100))
+    assert len(chunks) > 1
+    for first, second in zip(chunks, chunks[1:]):
+        overlap = raw[second["start"]:first["end"]].decode("utf-8").strip()
+        assert 0 < len(overlap) <= 100
+        assert first["text"].endswith(overlap) and second["text"].startswith(overlap)
+    for chunk in chunks:
+        assert raw[chunk["start"]:chunk["end"]].decode("utf-8").strip() == chunk["text"]
@@ -0,0 +1,71 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "dataset")))
+
+from citation_index import CitationIndex, act_aliases, parse_citation
+
+SOURCES = os.path.join(os.path.dirname(__file__), "..", "dataset", "legal_sources.json")
+
+with open(SOURCES, "r", encoding="utf-8") as f:
+    ALIASES = act_aliases(law["name"] for law in json.load(f))
+
+
+def test_citation_patterns():
+    assert (parse_citation("What is Section 144 of CrPC?", ALIASES)
+            == ("code of criminal procedure", "144"))
+    assert parse_citation("Explain Section 376 of IPC.", ALIASES) == ("indian penal code", "376")
+    assert parse_citation("what does 420 IPC say", ALIASES) == ("indian penal code", "420")
+    assert (parse_citation("sec. 498a of the Indian Penal Code", ALIASES)
+            == ("indian penal code", "498A"))
+    assert parse_citation("Section 4 of BNS", ALIASES) == ("bharatiya nyaya sanhita", "4")
+    assert parse_citation("Article 21", ALIASES) == ("indian constitution", "21")
+    assert parse_citation("Section 6 of the RTI Act", ALIASES) == ("right to information act", "6")
+    assert parse_citation("s. 420 IPC", ALIASES) == ("indian penal code", "420")
+    assert (parse_citation("Section 43 of the IT Act", ALIASES)
+            == ("information technology act", "43"))
+    assert parse_citation("Section 10 of the ICA", ALIASES) == ("contract act", "10")
+    assert parse_citation("IT Act 66", ALIASES) == ("information technology act", "66")
+
+
+def test_non_citations_are_not_routed():
+    assert parse_citation("What are the rights of a tenant under Indian law?", ALIASES) is None
+    assert parse_citation("What is the Indian Snake Charming Act of 1950?", ALIASES) is None
+    assert parse_citation("Tell me about the IPC", ALIASES) is None
+
+
+def test_ordinary_words_are_not_citations():
+    assert parse_citation("Does it act as a bar to filing 2 complaints?", ALIASES) is None
+    assert parse_citation("It's 5 years since the FIR, is it too late?", ALIASES) is None
+    assert parse_citation("My landlord's 3 notices: what is it s 5 about?", ALIASES) is None
+    assert parse_citation("The FIR was filed in March, is it 3 years?", ALIASES) is None
+    assert parse_citation("is it 2 months too late?", ALIASES) is None
+    assert parse_citation("ICA 10", ALIASES) is None
+
+
+def test_years_are_not_sections():
+    assert parse_citation("Hindu Marriage Act 1955", ALIASES) is None
+    assert parse_citation("IPC 1860", ALIASES) is None
+    assert (parse_citation("Section 144 of CrPC, 1973", ALIASES)
+            == ("code of criminal procedure", "144"))
+
+
+def test_several_provisions_are_left_to_search():
+    assert parse_citation("Compare section 302 IPC with section 103 BNS", ALIASES) is None
+    assert parse_citation("Section 498A and 304B of IPC", ALIASES) is None
+
+
+def test_lookup_returns_chunks_in_corpus_order(tmp_path):
+    index = CitationIndex.build([
+        ("c2", {"law": "Code of Criminal Procedure", "sections": "144", "start": 900}),
+        ("c1", {"law": "Code of Criminal Procedure", "sections": "143,144", "start": 100}),
+        ("i1", {"law": "Indian Penal Code", "sections": "420", "start": 0}),
+        ("x1", {"law": "", "sections": ""}),
+    ])
+    path = str(tmp_path / "citations.json")
+    index.save(path)
+    loaded = CitationIndex.load(path)
+    assert loaded.lookup("Section 144 of CrPC") == ["c1", "c2"]
+    assert loaded.lookup("IPC 420") == ["i1"]
+    assert loaded.lookup("Section 999 of IPC") == []
@@ -0,0 +1,69 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from context_compressor import ContextCompressor, split_sentences
+from prompt_builder import count_tokens
+
+CHUNK = (
+    "144. Power to issue order in urgent cases of nuisance. A District Magistrate may direct any "
+    "person to abstain from a certain act. The order may be served in the manner provided for a "
+    "summons.\n"
+    "145. Procedure where dispute concerning land is likely to cause breach of peace. The "
+    "Magistrate shall call upon the parties to put in written statements of their claims. The "
+    "statements are to be filed in court."
+)
+
+
+def _embed(texts):
+    # Word-presence vectors over a tiny vocabulary are enough to rank sentences
+    vocabulary = ["magistrate", "order", "summons", "land", "parties", "statements", "claims",
+                  "court", "nuisance"]
+    return [[float(word in text.lower()) for word in vocabulary] + [0.01] for text in texts]
+
+
+def test_split_sentences_keeps_abbreviations():
+    text = ("Punishable under Sec. 420 i.e. cheating. See No. 5 of Art. 21. "
+            "(1) Whoever cheats shall be punished.")
+    assert split_sentences(text) == [
+        "Punishable under Sec. 420 i.e. cheating.", "See No. 5 of Art. 21.",
+        "(1) Whoever cheats shall be punished."
+    ]
+
+
+def test_keeps_best_sentences_under_their_headers():
+    compressor = ContextCompressor(_embed, budget=60)
+    query = _embed(["written statements of claims by the parties"])[0]
+    compressed = compressor.compress(query, [CHUNK])
+    lines = compressed[0].splitlines()
+    assert lines[0] == ("145. Procedure where dispute concerning land is likely to cause breach "
+                        "of peace.")
+    assert lines[1].startswith("The Magistrate shall call upon the parties")
+    assert count_tokens(compressed[0]) <= 60 + 2
+    stats = compressor.stats()
+    assert stats["tokens_out"] < stats["tokens_in"]
+
+
+def test_original_order_and_elisions():
+    compressor = ContextCompressor(_embed, budget=200)
+    query = _embed(["order served like a summons, nuisance"])[0]
+    compressed = compressor.compress(query, [CHUNK], budget=40)[0]
+    assert compressed.startswith("144. Power to issue order in urgent cases of nuisance.\n")
+    assert "..." in compressed or compressed.count(".") >= 3
+    assert "145." not in compressed
+
+
+def test_sentence_vectors_are_embedded_once():
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return _embed(texts)
+
+    compressor = ContextCompressor(embed)
+    query = _embed(["land"])[0]
+    compressor.compress(query, [CHUNK, CHUNK])
+    compressor.compress(query, [CHUNK])
+    assert len(calls) == 1
+    assert len(calls[0]) == len(set(calls[0])) == 4  # four body sentences; headings are not scored
@@ -0,0 +1,171 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from conversation_store import MemoryConversationStore, SQLiteConversationStore
+
+
+def test_memory_store_keeps_last_exchanges():
+    store = MemoryConversationStore(max_conversations=10, ttl=60, max_bytes=1 << 20,
+                                    max_exchanges=2)
+    for i in range(3):
+        store.append("c1", f"q{i}", f"a{i}")
+    assert store.get("c1") == [{"user": "q1", "assistant": "a1"}, {"user": "q2", "assistant": "a2"}]
+    assert store.get("unknown") == []
+    store.reset("c1")
+    assert store.get("c1") == []
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryConversationStore(max_conversations=2, ttl=60, max_bytes=1 << 20)
+    store.append("a", "q", "a")
+    store.append("b", "q", "a")
+    store.get("a")  # "b" is now least recently used
+    store.append("c", "q", "a")
+    assert store.get("b") == []
+    assert store.get("a") and store.get("c")
+    assert store.stats()["evictions"] == 1
+
+
+def test_memory_store_ttl_and_memory_cap():
+    store = MemoryConversationStore(max_conversations=100, ttl=0.05, max_bytes=1 << 20)
+    store.append("a", "q", "a")
+    time.sleep(0.1)
+    assert store.get("a") == []
+
+    store = MemoryConversationStore(max_conversations=100, ttl=60, max_bytes=100)
+    store.append("a", "q", "x" * 60)
+    store.append("b", "q", "x" * 60)
+    assert store.get("a") == []
+    assert store.stats()["bytes"] <= 100
+
+
+def test_concurrent_appends_are_not_lost():
+    store = MemoryConversationStore(max_conversations=10, ttl=60, max_bytes=1 << 20,
+                                    max_exchanges=1000)
+    threads = [threading.Thread(target=store.append, args=("c", f"q{i}", "a")) for i in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store.get("c")) == 50
+
+
+def test_sqlite_store_reads_pending_and_committed_writes(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "c.db"), ttl=60, max_exchanges=2,
+                                    flush_interval=0.01)
+    store.append("c1", "q0", "a0")
+    assert store.get("c1") == [{"user": "q0", "assistant": "a0"}]  # still queued
+    store.append("c1", "q1", "a1")
+    store.append("c1", "q2", "a2")
+    assert store.flush(timeout=5)
+    assert [e["user"] for e in store.get("c1")] == ["q1", "q2"]
+    assert store.stats()["write_batches"] >= 1
+
+    store.reset("c1")
+    assert store.get("c1") == []
+    store.close()
+
+
+def test_sqlite_store_starts_its_writer_on_the_first_write(tmp_path):
+    # A prefork master creates the store but must not start a thread before forking the workers
+    store = SQLiteConversationStore(str(tmp_path / "c.db"), ttl=60, flush_interval=0.01)
+    assert store._writer is None and store.flush(timeout=1)
+    store.append("c1", "q", "a")
+    assert store._writer.is_alive()
+    store.close()
+    reopened = SQLiteConversationStore(str(tmp_path / "c.db"), ttl=60)
+    assert reopened.get("c1") == [{"user": "q", "assistant": "a"}]
+
+
+def test_sqlite_store_retries_a_failed_write(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "c.db"), ttl=60, flush_interval=0.01)
+    write, failures = store._write, []
+
+    def flaky_write(conn, batch):
+        if len(failures) < 2:
+            failures.append(len(batch))
+            raise sqlite3.OperationalError("database is locked")
+        write(conn, batch)
+
+    store._write = flaky_write
+    store.append("c1", "q", "a")
+    # Still queued while the writes fail
+    assert store.get("c1") == [{"user": "q", "assistant": "a"}]
+    assert store.flush(timeout=5)
+    assert failures == [1, 1]
+    store.close()
+
+    reopened = SQLiteConversationStore(str(tmp_path / "c.db"), ttl=60)
+    assert reopened.get("c1") == [{"user": "q", "assistant": "a"}]
+    reopened.close()
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "c.db")
+    writer = SQLiteConversationStore(path, ttl=60, flush_interval=0.01)
+    reader = SQLiteConversationStore(path, ttl=60, flush_interval=0.01)
+    writer.append("c1", "q", "a")
+    writer.close()
+    assert reader.get("c1") == [{"user": "q", "assistant": "a"}]
+    reader.close()
+
+
+def test_sqlite_store_works_in_a_forked_worker(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "c.db"), ttl=60, flush_interval=0.01)
+    store.append("c1", "before fork", "a")
+    assert store.flush(timeout=5)
+    pid = os.fork()
+    if pid == 0:  # the worker: its writes must be committed by its own writer thread
+        try:
+            store.append("c1", "in worker", "b")
+            store.close()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert [e["user"] for e in store.get("c1")] == ["before fork", "in worker"]
+    store.close()
+
+
+def _summarize(summary, exchange):
+    return (summary + " " + exchange["user"]).strip()
+
+
+def test_dropped_exchanges_are_folded_into_the_summary(tmp_path):
+    stores = [
+        MemoryConversationStore(max_conversations=10, ttl=60, max_bytes=1 << 20, max_exchanges=2,
+                                summarize=_summarize),
+        SQLiteConversationStore(str(tmp_path / "c.db"), ttl=60, max_exchanges=2,
+                                flush_interval=0.01, summarize=_summarize),
+    ]
+    for store in stores:
+        for i in range(4):
+            store.append("c1", f"q{i}", f"a{i}")
+        assert store.load("c1") == ("q0 q1", [{"user": "q2", "assistant": "a2"},
+                                              {"user": "q3", "assistant": "a3"}])
+        store.close()
+    # Committed state matches what was served from the write queue
+    reopened = SQLiteConversationStore(str(tmp_path / "c.db"), ttl=60, max_exchanges=2)
+    assert reopened.load("c1")[0] == "q0 q1"
+    reopened.close()
+
+
+def test_trimming_several_exchanges_at_once(tmp_path):
+    stores = [
+        MemoryConversationStore(max_conversations=10, ttl=60, max_bytes=1 << 20, max_exchanges=4,
+                                trim_to=2),
+        SQLiteConversationStore(str(tmp_path / "c.db"), ttl=60, max_exchanges=4,
+                                flush_interval=0.01, trim_to=2),
+    ]
+    for store in stores:
+        lengths = []
+        for i in range(7):
+            store.append("c1", f"q{i}", f"a{i}", message=f"m{i}")
+            lengths.append(len(store.get("c1")))
+        assert lengths == [1, 2, 3, 4, 2, 3, 4]
+        assert store.get("c1")[-1] == {"user": "q6", "assistant": "a6", "message": "m6"}
+        store.close()
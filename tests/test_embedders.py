@@ -0,0 +1,69 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "dataset")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "benchmarks")))
+
+import vector_database
+from corpus import build_synthetic_index
+from embedders import drift_report, load_embedder
+from stub_embedder import StubEmbeddings
+
+
+class NoisyEmbeddings(StubEmbeddings):
+    """The stub plus Gaussian noise, standing in for a backend whose vectors drift."""
+
+    def __init__(self, noise, **kwargs):
+        super().__init__(**kwargs)
+        self.noise = noise
+        self.rng = np.random.default_rng(0)
+
+    def embed_documents(self, texts):
+        vectors = np.asarray(super().embed_documents(texts))
+        return (vectors + self.noise * self.rng.standard_normal(vectors.shape)).tolist()
+
+
+def test_drift_report_flags_vectors_that_moved():
+    rng = np.random.default_rng(1)
+    reference = rng.standard_normal((200, 32))
+    same = drift_report(reference, reference * 2)  # scale does not matter, vectors are normalized
+    assert same["cosine_mean"] == 1.0 and same["overlap@10"] == 1.0 and not same["reembed_required"]
+
+    close = drift_report(reference, reference + 0.01 * rng.standard_normal(reference.shape))
+    assert close["cosine_min"] > 0.99 and not close["reembed_required"]
+    far = drift_report(reference, reference + 0.5 * rng.standard_normal(reference.shape))
+    assert far["cosine_mean"] < 0.99 and far["reembed_required"]
+
+
+def test_check_drift_against_the_stored_vectors(tmp_path, monkeypatch):
+    build_synthetic_index(str(tmp_path), StubEmbeddings(dim=64), sections=20)
+    index_dir = str(tmp_path / "index")
+    for name, file in [("CHROMA_DB_PATH", ""), ("FLAT_INDEX_PATH", "flat"),
+                       ("INDEX_VERSION_FILE", "index_version"), ("EMBEDDER_FILE", "embedder.json"),
+                       ("EMBEDDING_DRIFT_FILE", "embedding_drift.json"),
+                       ("SNAPSHOTS_PATH", "snapshots"), ("CURRENT_SNAPSHOT_FILE", "CURRENT")]:
+        monkeypatch.setattr(vector_database, name, os.path.join(index_dir, file))
+    monkeypatch.setattr(vector_database, "_snapshot", None)
+
+    report = vector_database.check_embedding_drift("int8", sample=100,
+                                                   embeddings=StubEmbeddings(dim=64))
+    assert report["texts"] == 100 and report["cosine_min"] > 0.999
+    assert not report["reembed_required"]
+    assert report["corpus_embedder"]["backend"] == "torch"  # no embedder.json: the original model
+
+    report = vector_database.check_embedding_drift("onnx", sample=100,
+                                                   embeddings=NoisyEmbeddings(0.2, dim=64))
+    assert report["reembed_required"]
+    with open(os.path.join(index_dir, "embedding_drift.json"), "r", encoding="utf-8") as f:
+        assert set(json.load(f)) == {"int8", "onnx"}
+
+
+def test_backend_errors_are_explicit(tmp_path):
+    with pytest.raises(FileNotFoundError, match="No ONNX export"):
+        load_embedder("onnx", "model", onnx_dir=str(tmp_path))
+    with pytest.raises(ValueError, match="Unknown embedding backend"):
+        load_embedder("tensorrt", "model")
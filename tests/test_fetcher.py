@@ -0,0 +1,85 @@
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "dataset")))
+
+from fetcher import Checkpoint, Fetcher, HostRateLimiter
+
+PAGES = {"/law/1": b"<div class='akn-section'>1. Short title.</div>"}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Local stand-in for a legal source that supports ETag revalidation"""
+    requests_seen = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        StandInHandler.requests_seen.append((self.path, self.headers.get("If-None-Match")))
+        body = PAGES.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = f'"{len(body)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    StandInHandler.requests_seen = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+def test_conditional_get_reuses_cached_body(server, tmp_path):
+    fetcher = Fetcher(str(tmp_path / "cache"), min_interval=0)
+    first = fetcher.fetch(server + "/law/1")
+    second = fetcher.fetch(server + "/law/1")
+
+    assert not first.not_modified and second.not_modified
+    assert second.content() == PAGES["/law/1"]
+    assert StandInHandler.requests_seen[0][1] is None
+    assert StandInHandler.requests_seen[1][1] == f'"{len(PAGES["/law/1"])}"'
+
+
+def test_errors_are_raised(server, tmp_path):
+    fetcher = Fetcher(str(tmp_path / "cache"), min_interval=0)
+    with pytest.raises(Exception):
+        fetcher.fetch(server + "/missing")
+
+
+def test_rate_limit_is_per_host():
+    limiter = HostRateLimiter(min_interval=0.05)
+    start = time.monotonic()
+    for _ in range(3):
+        limiter.wait("a.example")
+    limiter.wait("b.example")
+    elapsed = time.monotonic() - start
+    assert 0.09 <= elapsed < 0.2
+
+
+def test_checkpoint_round_trip(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint"))
+    assert "Indian Penal Code" not in checkpoint
+    checkpoint.set("Indian Penal Code", "420. Cheating.")
+    assert "Indian Penal Code" in checkpoint
+    assert Checkpoint(str(tmp_path / "checkpoint")).get("Indian Penal Code") == "420. Cheating."
@@ -0,0 +1,64 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "dataset")))
+
+from flat_index import FlatIndex, write_flat_index
+
+COUNT, DIM = 500, 32
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(42)
+    matrix = rng.normal(size=(COUNT, DIM)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def _export(vectors, path, dtype, keep_full_precision=True, acts=None):
+    records = ((f"id{row}", vectors[row], f"chunk {row}", acts[row] if acts else None)
+               for row in range(COUNT))
+    write_flat_index(records, COUNT, DIM, path, dtype=dtype,
+                     keep_full_precision=keep_full_precision)
+    return FlatIndex(path)
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_top_k_matches_brute_force(vectors, tmp_path, dtype):
+    index = _export(vectors, str(tmp_path / "flat"), dtype)
+    rng = np.random.default_rng(7)
+    for _ in range(20):
+        query = vectors[rng.integers(COUNT)] + 0.1 * rng.normal(size=DIM).astype(np.float32)
+        expected = [f"id{row}" for row in np.argsort(-(vectors @ query))[:5]]
+        assert [id_ for id_, _, _ in index.search(query, k=5)] == expected
+    index.close()
+
+
+def test_quantized_scan_without_rescoring_is_close(vectors, tmp_path):
+    index = _export(vectors, str(tmp_path / "flat"), "int8", keep_full_precision=False)
+    query = vectors[3]
+    results = index.search(query, k=1)
+    assert results[0][0] == "id3" and results[0][1] == "chunk 3"
+    assert results[0][2] == pytest.approx(1.0, abs=0.02)
+
+
+def test_texts_by_id(vectors, tmp_path):
+    index = _export(vectors, str(tmp_path / "flat"), "float16")
+    assert index.texts_for_ids(["id10", "missing", "id2"]) == ["chunk 10", "chunk 2"]
+
+
+@pytest.mark.parametrize("rescore", [True, False])
+def test_act_filter_scans_only_that_acts_rows(vectors, tmp_path, rescore):
+    acts = ["ipc" if row % 3 else "crpc" for row in range(COUNT)]
+    index = _export(vectors, str(tmp_path / "flat"), "int8", acts=acts)
+    assert len(index.rows_for_acts(["crpc"])) == (COUNT + 2) // 3
+    query = vectors[4]  # an "ipc" row
+    crpc_rows = [row for row in range(COUNT) if acts[row] == "crpc"]
+    expected = [f"id{crpc_rows[i]}" for i in np.argsort(-(vectors[crpc_rows] @ query))[:3]]
+    results = index.search(query, k=3, rescore=rescore, acts=["crpc"])
+    assert [id_ for id_, _, _ in results] == expected
+    assert index.search(query, k=1, rescore=rescore)[0][0] == "id4"
+    index.close()
@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from glossary import GlossaryIndex, load_glossary
+
+DEFINITIONS_DIR = os.path.join(os.path.dirname(__file__), "..", "dataset", "legal_definitions")
+
+
+def test_multi_word_terms_case_and_plurals():
+    index = GlossaryIndex({
+        "GIFT CAUSA MORTIS": "A gift made in contemplation of death.",
+        "LUCID INTERVAL": "A period of sanity between periods of insanity.",
+    })
+    found = [term for term, _ in index.find("Are gifts causa mortis valid during lucid intervals?")]
+    assert found == ["GIFT CAUSA MORTIS", "LUCID INTERVAL"]
+
+
+def test_longest_match_wins_and_aliases():
+    index = GlossaryIndex({
+        "TRUST": "A fiduciary relationship.",
+        "TRUST PRECATORY": "A trust created by words of request.",
+        "Anti-Lock Brake System (ABS)": "Onboard braking assistance.",
+    }, max_terms=5)
+    assert [term for term, _ in index.find("is a trust precatory binding")] == ["TRUST PRECATORY"]
+    found = [term for term, _ in index.find("does my car have ABS")]
+    assert found == ["Anti-Lock Brake System (ABS)"]
+
+
+def test_common_words_are_not_matched():
+    index = GlossaryIndex({"USE": "The right to enjoy property.",
+                           "BLACKMAIL": "Extortion by threats."})
+    assert [term for term, _ in index.find("can I use blackmail evidence")] == ["BLACKMAIL"]
+
+
+def test_loads_scraped_definitions():
+    index = load_glossary(DEFINITIONS_DIR)
+    assert len(index) > 0
+    found = index.find("What is a memorandum of understanding?")
+    assert any(term == "MEMORANDUM OF UNDERSTANDING" for term, _ in found)
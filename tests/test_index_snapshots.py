@@ -0,0 +1,100 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "dataset")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "benchmarks")))
+
+import vector_database
+from answer_cache import AnswerCache
+from corpus import build_synthetic_index
+from stub_embedder import StubEmbeddings
+
+QUESTION = "punishment and fine for cheating"
+
+
+@pytest.fixture
+def snapshots(tmp_path, monkeypatch):
+    """Snapshots "a" and "b" of two different synthetic corpora; returns the chunk IDs of each."""
+    embeddings = StubEmbeddings(dim=64)
+    root = tmp_path / "chroma_db"
+    ids = {}
+    os.makedirs(root / "snapshots")
+    for name, seed in [("a", 0), ("b", 1)]:
+        os.makedirs(tmp_path / name)
+        records = build_synthetic_index(str(tmp_path / name), embeddings, sections=20, seed=seed)
+        os.replace(tmp_path / name / "index", root / "snapshots" / name)
+        ids[name] = {vector_database.chunk_id(record["text"]) for record in records}
+    for name, file in [("CHROMA_DB_PATH", ""), ("INDEX_VERSION_FILE", "index_version"),
+                       ("SNAPSHOTS_PATH", "snapshots"), ("CURRENT_SNAPSHOT_FILE", "CURRENT")]:
+        monkeypatch.setattr(vector_database, name, os.path.join(str(root), file))
+    monkeypatch.setattr(vector_database, "_snapshot", None)
+    monkeypatch.setattr(vector_database, "index_reloads", 0)
+    monkeypatch.setattr(vector_database, "VECTOR_BACKEND", "flat")
+    monkeypatch.setattr(vector_database, "_embeddings", None)
+    monkeypatch.setitem(vector_database._component_states, "embeddings", "not_loaded")
+    monkeypatch.setattr(vector_database.embedding_batcher, "window", 0)
+    vector_database.use_embeddings(embeddings)
+    vector_database.activate_snapshot("a")
+    yield ids
+    vector_database.query_cache.clear()
+
+
+def _served(ids):
+    found = {vector_database.chunk_id(text)
+             for text in vector_database.search_documents(QUESTION, k=5)}
+    return [name for name, chunks in ids.items() if found <= chunks]
+
+
+def test_new_snapshot_is_served_only_after_reload(snapshots):
+    assert _served(snapshots) == ["a"] and vector_database.index_version() == "a"
+    cache = AnswerCache(max_entries=10, ttl=60, max_bytes=1024,
+                        version_fn=vector_database.index_version)
+    cache.put("q", "answer from a")
+
+    vector_database.activate_snapshot("b")
+    assert _served(snapshots) == ["a"]  # until the switch
+    assert cache.get("q") == "answer from a"
+
+    assert vector_database.reload_index()
+    assert not vector_database.reload_index()  # already serving b
+    assert _served(snapshots) == ["b"]
+    assert cache.get("q") is None
+    assert vector_database.index_status() == {"snapshot": "b", "version": "b", "reloads": 1,
+                                              "snapshots": ["a", "b"]}
+
+    with pytest.raises(ValueError, match="No index snapshot"):
+        vector_database.activate_snapshot("../a")
+
+
+def test_failed_reload_keeps_serving_the_old_snapshot(snapshots):
+    assert _served(snapshots) == ["a"]
+    meta = os.path.join(vector_database.SNAPSHOTS_PATH, "b", "flat", "meta.json")
+    with open(meta, "w", encoding="utf-8") as f:
+        f.write("{")  # a broken export
+    vector_database.activate_snapshot("b")
+    with pytest.raises(ValueError):
+        vector_database.reload_index()
+    assert _served(snapshots) == ["a"] and vector_database.index_version() == "a"
+
+
+def test_prune_keeps_the_served_and_the_newest_snapshots(snapshots):
+    for name in ["c", "d", "e.tmp"]:
+        os.makedirs(os.path.join(vector_database.SNAPSHOTS_PATH, name))
+    vector_database.prune_snapshots(keep=1)
+    assert vector_database.list_snapshots() == ["a", "d"]
+
+
+def test_replaced_snapshot_is_closed_once_its_searches_are_done(snapshots):
+    assert _served(snapshots) == ["a"]
+    old = vector_database.current_snapshot()
+    flat = old.flat()
+    with vector_database.pinned_snapshot() as pinned:
+        vector_database.activate_snapshot("b")
+        assert vector_database.reload_index()
+        assert pinned is old and old.flat() is flat  # still open for the search in flight
+        assert vector_database.search_documents(QUESTION, k=5, snapshot=pinned)
+    assert flat.vectors is None and flat._texts.closed
+    assert _served(snapshots) == ["b"]
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import httpx
+import pytest
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "benchmarks")))
+
+import llm_pool
+from fake_ollama import FakeOllama
+from llm_pool import EndpointUnavailable, LLMPool
+
+
+def _dead_url():
+    """A local port nothing listens on."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+@pytest.fixture
+def ollama():
+    server = FakeOllama(tokens=3, token_ms=0, prefill_ms=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_least_outstanding_routing_within_limits():
+    pool = LLMPool(["http://a", "http://b"], limits="2,1", queue_timeout=0.1)
+    first, second = pool.acquire(), pool.acquire()
+    assert {first.url, second.url} == {"http://a", "http://b"}
+    third = pool.acquire()
+    assert third.url == "http://a"  # b is at its limit of 1
+    with pytest.raises(EndpointUnavailable):
+        pool.acquire()
+
+    waiter = threading.Thread(target=lambda: pool.release(pool.acquire(), True))
+    waiter.start()
+    time.sleep(0.02)
+    pool.release(second, True)  # frees b for the waiting thread
+    waiter.join(timeout=1)
+    assert not waiter.is_alive()
+    assert pool.stats()["rejected"] == 1
+
+
+def test_circuit_opens_then_lets_one_trial_through(monkeypatch):
+    monkeypatch.setattr(llm_pool, "CIRCUIT_FAILURES", 2)
+    monkeypatch.setattr(llm_pool, "CIRCUIT_COOLDOWN", 0.05)
+    pool = LLMPool(["http://a"], limits=4, queue_timeout=0)
+    for _ in range(2):
+        pool.release(pool.acquire(), False)
+    assert pool.stats()["endpoints"][0]["circuit"] == "open"
+    with pytest.raises(EndpointUnavailable, match="no healthy"):
+        pool.acquire()
+
+    time.sleep(0.06)
+    trial = pool.acquire()
+    with pytest.raises(EndpointUnavailable):
+        pool.acquire()  # only one request while half-open
+    pool.release(trial, True)
+    assert pool.stats()["endpoints"][0]["circuit"] == "closed"
+
+
+def test_fails_over_to_a_live_endpoint(ollama):
+    dead = _dead_url()
+    pool = LLMPool([dead, ollama.url], limits=1)
+    pool.endpoints[1].requests = 1  # make the dead endpoint the first choice
+    body = {"model": "llama3.2", "prompt": "hello", "stream": False}
+    with pool.request(requests.Session(), "/api/generate", json=body, timeout=5) as response:
+        assert response.json()["done"]
+    assert pool.stats()["retries"] == 1
+    assert [e["outstanding"] for e in pool.stats()["endpoints"]] == [0, 0]
+
+    pool.check_health()
+    assert [e["healthy"] for e in pool.stats()["endpoints"]] == [False, True]
+
+    pool = LLMPool([dead], limits=1)
+    with pytest.raises(EndpointUnavailable, match="tried"):
+        with pool.request(requests.Session(), "/api/generate", json=body, timeout=5):
+            pass
+
+
+def test_async_stream_holds_the_slot_until_read(ollama):
+    pool = LLMPool([_dead_url(), ollama.url], limits=1)
+    pool.endpoints[1].requests = 1
+    body = {"model": "llama3.2", "messages": [{"role": "user", "content": "hi"}], "stream": True}
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            async with pool.request_async(client, "/api/chat", stream=True, json=body) as response:
+                assert pool.endpoints[1].outstanding == 1
+                return [json.loads(line) async for line in response.aiter_lines() if line]
+
+    chunks = asyncio.run(run())
+    assert chunks[-1]["done"] and chunks[-1]["eval_count"] == 3
+    assert pool.endpoints[1].outstanding == 0 and pool.stats()["retries"] == 1
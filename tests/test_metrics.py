@@ -0,0 +1,69 @@
+import contextvars
+import os
+import sys
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+import metrics
+from metrics import Counter, Histogram
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test.", ["stage"], buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 3):
+        histogram.observe(value, stage="search")
+    lines = histogram.render()
+    assert 'test_seconds_bucket{stage="search",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="search",le="1"} 3' in lines
+    assert 'test_seconds_bucket{stage="search",le="+Inf"} 4' in lines
+    assert 'test_seconds_sum{stage="search"} 4.05' in lines
+    assert 'test_seconds_count{stage="search"} 4' in lines
+
+
+def test_counter_and_label_escaping():
+    counter = Counter("test_total", "Test.", ["kind"])
+    counter.inc(2, kind='a"b')
+    counter.inc(kind='a"b')
+    assert counter.render()[-1] == 'test_total{kind="a\\"b"} 3'
+
+
+def test_spans_are_collected_per_request():
+    def request(results, index):
+        timings = metrics.start_request()
+        with metrics.span("retrieval"):
+            pass
+        # Work handed to another thread in a copy of the context still counts for this request
+        worker = threading.Thread(target=contextvars.copy_context().run,
+                                  args=(metrics.observe_stage, "embedding", 0.25))
+        worker.start()
+        worker.join()
+        results[index] = timings
+
+    results = [None, None]
+    threads = [threading.Thread(target=request, args=(results, i)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for timings in results:
+        assert set(timings) == {"retrieval", "embedding"}
+        assert timings["embedding"] == 0.25
+
+    assert (metrics.server_timing({"embedding": 0.0123, "total": 0.5})
+            == "embedding;dur=12.3, total;dur=500.0")
+
+
+def _sample(name):
+    lines = [line for line in metrics.render().splitlines() if line.startswith(name + " ")]
+    return float(lines[0].split()[-1]) if lines else 0.0
+
+
+def test_ollama_token_rate():
+    count = _sample("legal_ai_llm_tokens_per_second_count")
+    total = _sample("legal_ai_llm_tokens_per_second_sum")
+    metrics.observe_ollama({"prompt_eval_count": 10, "eval_count": 50,
+                            "eval_duration": 2_000_000_000})
+    assert _sample("legal_ai_llm_tokens_per_second_count") == count + 1
+    assert _sample("legal_ai_llm_tokens_per_second_sum") == total + 25
+    assert _sample('legal_ai_llm_tokens_total{kind="prompt"}') >= 10
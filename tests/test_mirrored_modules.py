@@ -0,0 +1,18 @@
+import os
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# dataset/ holds the originals; the backend ships copies so it can run without the dataset package
+MIRRORED = ["act_index.py", "bm25_index.py", "citation_index.py", "embedders.py", "flat_index.py",
+            "query_embedding.py", "vector_database.py"]
+
+
+@pytest.mark.parametrize("name", MIRRORED)
+def test_backend_copy_matches_dataset(name):
+    with open(os.path.join(ROOT, "dataset", name), "rb") as f:
+        original = f.read()
+    with open(os.path.join(ROOT, "backend", name), "rb") as f:
+        copy = f.read()
+    assert copy == original, f"backend/{name} differs from dataset/{name}: copy it over"
@@ -0,0 +1,80 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from prompt_builder import (
+    build_chat_messages, build_history, build_prompt, build_turn_message, condense_query,
+    count_tokens, fold_into_summary
+)
+
+
+def test_short_query_is_unchanged():
+    assert condense_query("What is Section 420 of IPC?") == "What is Section 420 of IPC?"
+
+
+def test_oversized_query_is_condensed():
+    """tests/stressTest.py sends a 10,000-word query"""
+    condensed = condense_query("law " * 10000, max_tokens=64)
+    assert count_tokens(condensed) <= 64
+
+    repeated = "Explain Indian contract law. " * 500 + "What about minors?"
+    condensed = condense_query(repeated, max_tokens=64)
+    assert condensed == "Explain Indian contract law. What about minors?"
+
+
+def test_prompt_stays_within_budget():
+    chunks = ["Section %d. " % i + "text " * 400 for i in range(5)]
+    exchanges = [{"user": "question %d " % i * 50, "assistant": "answer %d. " % i * 200}
+                 for i in range(5)]
+    prompt = build_prompt("law " * 10000, chunks, [("Bail", "release " * 500)],
+                          "- Asked: x; answered: y", exchanges, budget=1536)
+    assert count_tokens(prompt) <= 1536
+    assert "Section 0." in prompt  # the best chunk is always kept
+
+
+def test_unused_history_budget_goes_to_context():
+    chunks = ["chunk %d " % i * 100 for i in range(3)]
+    prompt = build_prompt("q", chunks, budget=1000)
+    assert all(chunk in prompt for chunk in chunks)
+    assert "Previous conversation" not in prompt
+
+
+def test_history_keeps_recent_turns_and_summarizes_the_rest():
+    exchanges = [{"user": f"question {i}", "assistant": f"Answer {i}. More detail."}
+                 for i in range(5)]
+    history = build_history("", exchanges, max_tokens=40)
+    assert "question 4" in history
+    assert "Summary of earlier turns" in history
+    assert count_tokens(history) <= 40
+
+
+def test_summary_is_extended_incrementally_and_capped():
+    summary = ""
+    for i in range(100):
+        previous = summary
+        summary = fold_into_summary(summary, {"user": f"q{i}", "assistant": f"a{i}. rest"},
+                                    max_tokens=50)
+        assert summary.endswith(f"- Asked: q{i}; answered: a{i}.")
+        assert previous.splitlines()[-1:] == summary.splitlines()[-2:-1] or not previous
+    assert count_tokens(summary) <= 50
+
+
+def test_chat_messages_extend_the_previous_request():
+    exchanges = []
+    previous = None
+    for i in range(3):
+        message = build_turn_message(f"question {i}", ["Section %d text" % i])
+        messages = build_chat_messages(message, "", exchanges)
+        if previous is not None:
+            assert messages[:len(previous)] == previous  # the server can reuse its cached prefix
+        exchanges.append({"user": f"question {i}", "assistant": f"answer {i}", "message": message})
+        previous = messages + [{"role": "assistant", "content": f"answer {i}"}]
+    assert messages[0]["role"] == "system" and messages[-1]["content"] == message
+
+
+def test_chat_history_over_budget_moves_to_the_summary():
+    exchanges = [{"user": f"q{i}", "assistant": "a" * 400, "message": "m" * 400} for i in range(5)]
+    messages = build_chat_messages("new", "", exchanges, history_budget=450)
+    assert len(messages) == 1 + 2 * 2 + 1
+    assert "Asked: q2" in messages[0]["content"]
@@ -0,0 +1,112 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "dataset")))
+
+from query_embedding import EmbeddingBatcher, QueryEmbeddingCache, normalize_text
+
+
+def test_cache_is_bounded_lru():
+    cache = QueryEmbeddingCache(max_entries=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")
+    cache.put("c", [3.0])
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
+    assert normalize_text("  What is  Contract LAW ") == normalize_text("what is contract law")
+
+
+def test_concurrent_queries_share_one_forward_pass():
+    """Requests arriving within the batching window are embedded together, duplicates once"""
+    calls = []
+
+    def embed_fn(texts):
+        calls.append(list(texts))
+        time.sleep(0.01)
+        return [[float(len(text))] for text in texts]
+
+    batcher = EmbeddingBatcher(embed_fn, window=0.05, max_batch=16)
+    results = {}
+    threads = [
+        threading.Thread(target=lambda i=i: results.__setitem__(i, batcher.embed(f"query {i % 2}")))
+        for i in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(calls[0]) == ["query 0", "query 1"]
+    assert all(vector == [7.0] for vector in results.values())
+
+
+def test_errors_reach_every_caller():
+    def embed_fn(texts):
+        raise RuntimeError("model failed")
+
+    batcher = EmbeddingBatcher(embed_fn, window=0.01)
+    try:
+        batcher.embed("q")
+        assert False, "expected the embedding error to propagate"
+    except RuntimeError as e:
+        assert "model failed" in str(e)
+
+
+def test_callers_that_time_out_are_dropped_from_the_batch():
+    calls = []
+    started = threading.Event()
+
+    def embed_fn(texts):
+        calls.append(list(texts))
+        started.set()
+        time.sleep(0.1)
+        return [[1.0] for _ in texts]
+
+    batcher = EmbeddingBatcher(embed_fn, window=0.001)
+    first = threading.Thread(target=batcher.embed, args=("busy",))
+    first.start()
+    started.wait(1)
+    try:
+        batcher.embed("late", timeout=0.02)  # queued behind the running batch
+        assert False, "expected a timeout"
+    except TimeoutError:
+        pass
+    first.join()
+    assert batcher.embed("next") == [1.0]
+    assert calls == [["busy"], ["next"]]
+
+
+def test_timeout_before_the_batch_starts_skips_the_text():
+    calls = []
+
+    def slow_embed_fn(texts):
+        calls.append(list(texts))
+        time.sleep(0.05)
+        return [[1.0] for _ in texts]
+
+    batcher = EmbeddingBatcher(slow_embed_fn, window=0.2)
+    with pytest.raises(TimeoutError):  # the builtin, which the apps answer with a 504
+        batcher.embed("slow", timeout=0.01)
+    time.sleep(0.3)
+    assert calls == []  # cancelled while its batch was still being gathered
+    assert batcher.embed("next") == [1.0]
+
+
+def test_batcher_works_after_fork():
+    batcher = EmbeddingBatcher(lambda texts: [[float(len(t))] for t in texts], window=0.001)
+    assert batcher.embed("abc") == [3.0]  # the parent's worker thread is running now
+    pid = os.fork()
+    if pid == 0:
+        ok = False
+        try:
+            ok = batcher.embed("abcd", timeout=5) == [4.0]
+        finally:
+            os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
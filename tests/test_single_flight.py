@@ -0,0 +1,172 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from single_flight import (
+    AsyncSingleFlight, AsyncStreamSingleFlight, SingleFlight, StreamSingleFlight
+)
+
+
+def _run_concurrently(fn, count=8):
+    results = [None] * count
+
+    def run(i):
+        results[i] = fn()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_calls_share_one_computation():
+    flights = SingleFlight()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return "answer"
+
+    assert _run_concurrently(lambda: flights.do("q", compute)) == ["answer"] * 8
+    assert len(calls) == 1
+    assert flights.stats() == {"calls": 1, "shared": 7}
+    # Nothing is remembered afterwards
+    flights.do("q", compute)
+    assert len(calls) == 2
+
+
+def test_errors_reach_every_caller():
+    flights = SingleFlight()
+
+    def fail():
+        time.sleep(0.1)
+        raise ValueError("boom")
+
+    def call():
+        with pytest.raises(ValueError):
+            flights.do("q", fail)
+        return True
+
+    assert all(_run_concurrently(call, 4))
+
+
+def test_stream_fans_out_to_late_subscribers():
+    flights = StreamSingleFlight()
+    started = []
+
+    def source(result):
+        started.append(1)
+        result["meta"] = 42
+        for token in ["a", "b", "c"]:
+            time.sleep(0.05)
+            yield token
+
+    first, result = flights.subscribe("q", source)
+    assert next(first) == "a"
+    second, same_result = flights.subscribe("q", source)  # joins after "a" was produced
+    assert list(first) == ["b", "c"]
+    assert list(second) == ["a", "b", "c"]
+    assert result is same_result and result["meta"] == 42
+    assert len(started) == 1
+
+
+def test_stream_stops_when_every_subscriber_left():
+    flights = StreamSingleFlight()
+    produced = []
+    closed = threading.Event()
+
+    def source(result):
+        try:
+            for i in range(1000):
+                produced.append(i)
+                time.sleep(0.01)
+                yield i
+        finally:
+            closed.set()
+
+    tokens, _ = flights.subscribe("q", source)
+    next(tokens)
+    tokens.close()
+    assert closed.wait(2)
+    assert len(produced) < 1000
+
+
+def test_async_flights_share_results_and_streams():
+    async def main():
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        results = await asyncio.gather(*[flights.do("q", compute) for _ in range(5)])
+        assert results == ["answer"] * 5 and len(calls) == 1
+
+        streams = AsyncStreamSingleFlight()
+        started = []
+
+        async def source(result):
+            started.append(1)
+            result["meta"] = 1
+            for token in ["a", "b"]:
+                await asyncio.sleep(0.01)
+                yield token
+
+        async def consume():
+            tokens, result = streams.subscribe("q", source)
+            return [token async for token in tokens], result["meta"]
+
+        outputs = await asyncio.gather(*[consume() for _ in range(5)])
+        assert outputs == [(["a", "b"], 1)] * 5 and len(started) == 1
+
+    asyncio.run(main())
+
+
+def test_callers_wait_at_most_their_own_timeout():
+    flights = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=flights.do, args=("q", release.wait, 5))
+    leader.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        flights.do("q", release.wait, 5, timeout=0.1)
+    assert time.monotonic() - started < 1
+    release.set()
+    leader.join()
+
+
+def test_async_shared_task_is_cancelled_once_every_caller_left():
+    async def main():
+        flights = AsyncSingleFlight()
+        cancelled = asyncio.Event()
+
+        async def compute():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        patient = asyncio.ensure_future(flights.do("q", compute))
+        await asyncio.sleep(0.01)
+        with pytest.raises(TimeoutError):
+            await flights.do("q", compute, timeout=0.05)
+        assert not cancelled.is_set()  # the patient caller still waits for it
+
+        patient.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert flights._tasks == {}
+
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("langchain_community")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "dataset")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "benchmarks")))
+
+import vector_database
+from chunk_data import chunk_legal_texts
+from corpus import write_corpus
+from stub_embedder import StubEmbeddings
+
+
+class CountingEmbeddings(StubEmbeddings):
+    """The stub, recording every text it embeds and failing from the fail_after-th batch on."""
+
+    def __init__(self, fail_after=None, **kwargs):
+        super().__init__(**kwargs)
+        self.embedded = []
+        self.batches = 0
+        self.fail_after = fail_after
+
+    def embed_documents(self, texts):
+        self.batches += 1
+        if self.fail_after is not None and self.batches > self.fail_after:
+            raise RuntimeError("embedding model crashed")
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """An empty store in tmp_path/chroma_db; returns a function switching its embedding model."""
+    index_dir = str(tmp_path / "chroma_db")
+    for name, file in [("CHROMA_DB_PATH", ""), ("FLAT_INDEX_PATH", "flat"),
+                       ("INDEX_VERSION_FILE", "index_version"), ("BM25_PATH", "bm25"),
+                       ("CITATIONS_PATH", "citations.json"), ("ACTS_PATH", "acts"),
+                       ("CHECKPOINT_PATH", "ingest_checkpoint.json"),
+                       ("EMBEDDER_FILE", "embedder.json"),
+                       ("SNAPSHOTS_PATH", "snapshots"), ("CURRENT_SNAPSHOT_FILE", "CURRENT")]:
+        monkeypatch.setattr(vector_database, name, os.path.join(index_dir, file))
+    monkeypatch.setattr(vector_database, "_db", None)
+    monkeypatch.setattr(vector_database, "_snapshot", None)
+    monkeypatch.setattr(vector_database, "_embeddings", None)
+    monkeypatch.setitem(vector_database._component_states, "embeddings", "not_loaded")
+    monkeypatch.setitem(vector_database._component_states, "vector_store", "not_loaded")
+
+    def use(embeddings):
+        vector_database.use_embeddings(embeddings)
+        monkeypatch.setattr(vector_database, "_db", None)  # reopened with the new model
+        return embeddings
+
+    yield use
+    vector_database.query_cache.clear()
+
+
+@pytest.fixture
+def chunks_file(tmp_path):
+    records = list(chunk_legal_texts(write_corpus(str(tmp_path / "legal_texts.txt"), sections=10)))
+    path = str(tmp_path / "legal_chunks.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    return path, records
+
+
+def test_second_run_adds_nothing(store, chunks_file):
+    path, records = chunks_file
+    unique = {vector_database.chunk_id(record["text"]) for record in records}
+    embeddings = store(CountingEmbeddings(dim=32))
+    assert vector_database.store_documents(path, batch_size=16) == (len(unique), 0)
+    assert vector_database.get_collection().count() == len(unique)
+
+    embeddings = store(CountingEmbeddings(dim=32))
+    os.remove(vector_database.CHECKPOINT_PATH)  # not even the checkpoint: every chunk is looked up
+    assert vector_database.store_documents(path, batch_size=16) == (0, 0)
+    assert embeddings.embedded == []
+
+
+def test_crashed_run_resumes_from_the_checkpoint(store, chunks_file):
+    path, records = chunks_file
+    crashing = store(CountingEmbeddings(fail_after=2, dim=32))
+    with pytest.raises(RuntimeError, match="crashed"):
+        vector_database.store_documents(path, batch_size=16)
+    with open(vector_database.CHECKPOINT_PATH, "r", encoding="utf-8") as f:
+        done = json.load(f)["chunks_done"]
+    assert done == 32  # the two batches embedded before the crash were written
+
+    embeddings = store(CountingEmbeddings(dim=32))
+    added, _ = vector_database.store_documents(path, batch_size=16)
+    assert not set(embeddings.embedded) & set(crashing.embedded)  # nothing embedded twice
+    assert {record["text"] for record in records[done:]} <= set(embeddings.embedded)
+    unique = {vector_database.chunk_id(record["text"]) for record in records}
+    assert vector_database.get_collection().count() == len(unique)
+
+
+def test_legacy_text_chunks_keep_their_lines(store, tmp_path):
+    chunks = ["Section 1. Title.\nThis Act may be called\nthe Example Act.",
+              "Section 2. Definitions.\nIn this Act"]
+    path = str(tmp_path / "legal_chunks.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(chunks) + "\n")
+    assert [record["text"] for record in vector_database.iter_chunks(path)] == chunks
+
+    store(StubEmbeddings(dim=32))
+    assert vector_database.store_documents(path) == (2, 0)
+    ids = [vector_database.chunk_id(text) for text in chunks]
+    stored = vector_database.get_collection().get(ids=ids)
+    assert sorted(stored["documents"]) == chunks
+
+
+def test_hnsw_params_apply_when_the_collection_is_created(store, monkeypatch, capsys):
+    monkeypatch.setattr(vector_database, "HNSW_PARAMS", {"hnsw:M": 32})
+    store(StubEmbeddings(dim=32))
+    assert vector_database.get_collection().metadata["hnsw:M"] == 32
+    assert "HNSW" not in capsys.readouterr().out
+
+    monkeypatch.setattr(vector_database, "HNSW_PARAMS", {"hnsw:M": 8, "hnsw:search_ef": 50})
+    store(StubEmbeddings(dim=32))
+    assert vector_database.get_collection().metadata == {"hnsw:M": 32}  # unchanged, and said so
+    assert "hnsw:M: 32 instead of 8, hnsw:search_ef: None instead of 50" in capsys.readouterr().out
@@ -0,0 +1,18 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "dataset")))
+
+import vector_database
+
+
+def test_import_does_not_load_model_or_store():
+    assert vector_database._embeddings is None
+    assert vector_database._db is None
+    assert vector_database.component_status() == {"embeddings": "not_loaded",
+                                                  "vector_store": "not_loaded"}
+
+
+def test_chunk_id_is_content_hash():
+    assert vector_database.chunk_id("Section 1") == vector_database.chunk_id("Section 1")
+    assert vector_database.chunk_id("Section 1") != vector_database.chunk_id("Section 2")